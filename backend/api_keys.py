@@ -79,6 +79,12 @@ def create_api_key(name: str, description: str = "", custom_prompt: str = "", ou
         "custom_prompt": custom_prompt,
         "output_format": output_format,
         "provider": provider,
+        "hedge_provider": "",  # Fallback provider for slow/failing requests (empty = no hedging)
+        "hedge_budget_per_hour": None,  # Pages sent to hedge_provider per hour (None = server default)
+        "priority": "interactive",  # OCR queue class: "interactive" or "bulk"
+        "weight": 1,  # Share of OCR slots relative to other keys of the same class
+        "max_concurrent": None,  # OCR tasks running at once (None = server default)
+        "max_pages": None,  # PDF pages OCR'd per document (None = server default, 0 = no limit)
         "request_count": 0  # Usage tracking
     }
     
@@ -134,6 +140,12 @@ def list_api_keys() -> List[Dict[str, Any]]:
             "custom_prompt": key.get("custom_prompt", ""),
             "output_format": key.get("output_format", "text"),
             "provider": key.get("provider", ""),
+            "hedge_provider": key.get("hedge_provider", ""),
+            "hedge_budget_per_hour": key.get("hedge_budget_per_hour"),
+            "priority": key.get("priority", "interactive"),
+            "weight": key.get("weight", 1),
+            "max_concurrent": key.get("max_concurrent"),
+            "max_pages": key.get("max_pages"),
             "request_count": key.get("request_count", 0)
         })
     return keys
@@ -155,6 +167,12 @@ def get_api_key_by_id(key_id: str) -> Optional[Dict[str, Any]]:
                 "custom_prompt": key.get("custom_prompt", ""),
                 "output_format": key.get("output_format", "text"),
                 "provider": key.get("provider", ""),
+                "hedge_provider": key.get("hedge_provider", ""),
+                "hedge_budget_per_hour": key.get("hedge_budget_per_hour"),
+                "priority": key.get("priority", "interactive"),
+                "weight": key.get("weight", 1),
+                "max_concurrent": key.get("max_concurrent"),
+                "max_pages": key.get("max_pages"),
                 "request_count": key.get("request_count", 0)
             }
     return None
@@ -162,7 +180,8 @@ def get_api_key_by_id(key_id: str) -> Optional[Dict[str, Any]]:
 
 def update_api_key(key_id: str, updates: Dict[str, Any]) -> bool:
     """
-    Update an API key's settings (custom_prompt, output_format, description, provider)
+    Update an API key's settings (custom_prompt, output_format, description, provider,
+    hedge_provider, hedge_budget_per_hour, priority, weight, max_concurrent, max_pages)
     """
     data = _load_api_keys()
     for key in data.get("keys", []):
@@ -176,6 +195,18 @@ def update_api_key(key_id: str, updates: Dict[str, Any]) -> bool:
                 key["description"] = updates["description"]
             if "provider" in updates:
                 key["provider"] = updates["provider"]
+            if "hedge_provider" in updates:
+                key["hedge_provider"] = updates["hedge_provider"]
+            if "hedge_budget_per_hour" in updates:
+                key["hedge_budget_per_hour"] = updates["hedge_budget_per_hour"]
+            if "priority" in updates:
+                key["priority"] = updates["priority"]
+            if "weight" in updates:
+                key["weight"] = updates["weight"]
+            if "max_concurrent" in updates:
+                key["max_concurrent"] = updates["max_concurrent"]
+            if "max_pages" in updates:
+                key["max_pages"] = updates["max_pages"]
             return _save_api_keys(data)
     return False
 
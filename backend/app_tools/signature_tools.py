@@ -2,7 +2,9 @@
 Signature Tools - Add signature images to PDF documents
 """
 import io
+import os
 import logging
+from typing import Union
 from PIL import Image
 
 logger = logging.getLogger(__name__)
@@ -108,28 +110,28 @@ def add_signature(
     return output.read()
 
 
-def get_pdf_page_count(pdf_bytes: bytes) -> int:
+def get_pdf_page_count(pdf_bytes: Union[bytes, str, os.PathLike]) -> int:
     """
     Get the number of pages in a PDF.
     
     Args:
-        pdf_bytes: PDF file content
+        pdf_bytes: PDF file content, or its path
         
     Returns:
         Number of pages
     """
     import pikepdf
     
-    pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes))
+    pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes) if isinstance(pdf_bytes, bytes) else pdf_bytes)
     return len(pdf.pages)
 
 
-def get_pdf_page_dimensions(pdf_bytes: bytes, page_number: int = 1) -> dict:
+def get_pdf_page_dimensions(pdf_bytes: Union[bytes, str, os.PathLike], page_number: int = 1) -> dict:
     """
     Get dimensions of a specific page.
     
     Args:
-        pdf_bytes: PDF file content
+        pdf_bytes: PDF file content, or its path (opened without reading it into memory)
         page_number: Page number (1-indexed)
         
     Returns:
@@ -137,7 +139,7 @@ def get_pdf_page_dimensions(pdf_bytes: bytes, page_number: int = 1) -> dict:
     """
     import pikepdf
     
-    pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes))
+    pdf = pikepdf.Pdf.open(io.BytesIO(pdf_bytes) if isinstance(pdf_bytes, bytes) else pdf_bytes)
     
     if page_number < 1 or page_number > len(pdf.pages):
         raise ValueError(f"Page number must be between 1 and {len(pdf.pages)}")
@@ -151,22 +153,27 @@ def get_pdf_page_dimensions(pdf_bytes: bytes, page_number: int = 1) -> dict:
     }
 
 
-def render_pdf_page_preview(pdf_bytes: bytes, page_number: int = 1, max_width: int = 800) -> bytes:
+def render_pdf_page_preview(
+    pdf_bytes: Union[bytes, str, os.PathLike],
+    page_number: int = 1,
+    max_width: int = 800
+) -> bytes:
     """
     Render a PDF page as a JPEG image for preview.
     
     Args:
-        pdf_bytes: PDF file content
+        pdf_bytes: PDF file content, or its path
         page_number: Page number (1-indexed)
         max_width: Maximum width of output image
         
     Returns:
         JPEG image as bytes
     """
-    from pdf2image import convert_from_bytes
+    from pdf2image import convert_from_bytes, convert_from_path
     
     # Convert specific page to image
-    images = convert_from_bytes(
+    convert = convert_from_bytes if isinstance(pdf_bytes, bytes) else convert_from_path
+    images = convert(
         pdf_bytes,
         first_page=page_number,
         last_page=page_number,
@@ -1,20 +1,29 @@
 """
 OCR Service API - FastAPI Application with API Key Authentication
 """
+import io
 import uuid
+import json
+import asyncio
 import logging
-from typing import Dict, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query, Header, Depends, Request, Form
+from concurrent.futures import Future
+from dataclasses import replace
+from typing import Dict, List, Optional
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Header, Depends, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 
-from providers import get_provider, list_providers, get_provider_names
+from providers import get_provider, list_providers, get_provider_names, process_with_routing, get_provider_stats
+from providers.base import OCRResult
+from providers.routing import HedgePolicy
+from providers.http_client import close_http_client
 from config import (
     load_config, save_config, get_active_provider,
     get_provider_config, set_active_provider, update_provider_config
@@ -27,6 +36,16 @@ from api_keys import (
 from auth_tokens import generate_frontend_token, verify_frontend_token
 from sso_auth import sso_login, generate_jwt_token, verify_jwt_token
 from database import init_db
+from task_store import get_task_store
+from ocr_pipeline import split_result_pages, page_limit_for, MAX_DOCUMENT_PAGES
+from utils.packing import OUTPUT_MODES, BLOCK_FIELDS, ResultQuery, shape_result
+from ocr_scheduler import QueuePolicy, PRIORITIES, get_scheduler
+from providers.cancellation import CancelToken, TaskCancelledError, cancel_scope
+from ocr_workers import get_worker_pool
+from ocr_cache import get_result_cache, get_page_cache, make_cache_key, hash_page
+from upload_spool import (
+    SpooledUpload, UploadSizeLimitMiddleware, spool_upload, sweep_stale_uploads, MAX_BATCH_BYTES
+)
 from routers.whiteboard import router as whiteboard_router
 from routers.project import router as project_router
 
@@ -85,6 +104,12 @@ app = FastAPI(title="OCR Service API", version="2.2.0")
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Request body size limits, checked before multipart parsing (inside CORS so 413s carry CORS headers)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_limits={"/api/v1/ocr/batch": MAX_BATCH_BYTES}
+)
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -97,8 +122,19 @@ app.add_middleware(
 # API Key Security
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-# In-memory storage for tasks (Replace with Redis/Database for production)
-tasks_db: Dict[str, dict] = {}
+# Shared OCR task storage (SQLite by default, visible to all workers)
+task_store = get_task_store()
+
+# Batch uploads: maximum files per request (files are queued per API key, see ocr_scheduler)
+MAX_BATCH_FILES = 100
+
+# OCR tasks of this process: scheduler jobs (until finished) and cancel tokens (while running)
+_queued_jobs: Dict[str, Future] = {}
+_cancel_tokens: Dict[str, CancelToken] = {}
+
+# Progress stream: how often the store is checked and keep-alives are sent (seconds)
+STREAM_POLL_INTERVAL = 0.5
+STREAM_HEARTBEAT_INTERVAL = 15
 
 
 # ============== Startup Events ==============
@@ -118,17 +154,33 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to initialise database: {e}")
 
-    # OCR model warm-up
+    # Spooled uploads left behind by a crashed process
+    sweep_stale_uploads()
+
+    # OCR model warm-up (in the worker processes when the pool is enabled)
     logger.info("Pre-loading PaddleOCR model...")
     try:
-        from providers import get_provider
-        paddle_provider = get_provider("paddle_ocr")
-        paddle_provider._get_engine({"lang": "latin"})
+        pool = get_worker_pool()
+        if pool:
+            pool.warm()
+        else:
+            from providers import get_provider
+            paddle_provider = get_provider("paddle_ocr")
+            paddle_provider.preload(paddle_provider.preload_configs(get_provider_config("paddle_ocr")))
         logger.info("PaddleOCR model pre-loaded successfully!")
     except Exception as e:
         logger.warning(f"Failed to pre-load PaddleOCR: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop OCR worker processes and close the cloud provider HTTP client."""
+    pool = get_worker_pool()
+    if pool:
+        pool.shutdown()
+    close_http_client()
+
+
 # ============== Models ==============
 
 class TaskResponse(BaseModel):
@@ -151,6 +203,12 @@ class APIKeyUpdate(BaseModel):
     output_format: Optional[str] = None
     description: Optional[str] = None
     provider: Optional[str] = None
+    hedge_provider: Optional[str] = None
+    hedge_budget_per_hour: Optional[int] = None
+    priority: Optional[str] = None
+    weight: Optional[int] = None
+    max_concurrent: Optional[int] = None
+    max_pages: Optional[int] = None
 
 
 # ============== Auth Dependency ==============
@@ -207,6 +265,27 @@ async def verify_api_key(
     return key_data
 
 
+async def verify_stream_api_key(
+    token: Optional[str] = Query(None, description="API key ID or frontend token (for EventSource clients)"),
+    x_api_key: Optional[str] = Header(None, alias="X-API-Key"),
+    x_api_key_id: Optional[str] = Header(None, alias="X-API-Key-ID")
+):
+    """
+    Verify API key for streaming endpoints
+    Same as verify_api_key, but also accepts a key ID or frontend token as
+    ?token= because the browser EventSource API cannot set request headers.
+    Secret API keys are refused there: query strings end up in access logs.
+    """
+    if token and not x_api_key and not x_api_key_id:
+        if token.startswith("sk-"):
+            raise HTTPException(
+                status_code=400,
+                detail="Secret API keys must be passed in the X-API-Key header, not in the URL."
+            )
+        x_api_key_id = token
+    return await verify_api_key(x_api_key=x_api_key, x_api_key_id=x_api_key_id)
+
+
 # ============== Root ==============
 
 @app.get("/")
@@ -346,6 +425,30 @@ def update_existing_api_key(key_id: str, data: APIKeyUpdate):
         updates["description"] = data.description
     if data.provider is not None:
         updates["provider"] = data.provider
+    if data.hedge_provider is not None:
+        if data.hedge_provider and data.hedge_provider not in get_provider_names():
+            raise HTTPException(status_code=400, detail=f"Unknown provider: {data.hedge_provider}")
+        updates["hedge_provider"] = data.hedge_provider
+    if data.hedge_budget_per_hour is not None:
+        if data.hedge_budget_per_hour < 0:
+            raise HTTPException(status_code=400, detail="hedge_budget_per_hour must be >= 0")
+        updates["hedge_budget_per_hour"] = data.hedge_budget_per_hour
+    if data.priority is not None:
+        if data.priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
+        updates["priority"] = data.priority
+    if data.weight is not None:
+        if data.weight < 1:
+            raise HTTPException(status_code=400, detail="weight must be >= 1")
+        updates["weight"] = data.weight
+    if data.max_concurrent is not None:
+        if data.max_concurrent < 1:
+            raise HTTPException(status_code=400, detail="max_concurrent must be >= 1")
+        updates["max_concurrent"] = data.max_concurrent
+    if data.max_pages is not None:
+        if data.max_pages < 0:
+            raise HTTPException(status_code=400, detail="max_pages must be >= 0 (0 = no limit)")
+        updates["max_pages"] = data.max_pages
     
     if update_api_key(key_id, updates):
         return {"message": "API key updated", "key": get_api_key_by_id(key_id)}
@@ -388,20 +491,106 @@ def update_settings(settings: SettingsUpdate):
         raise HTTPException(status_code=500, detail="Failed to save configuration")
 
 
+@app.get("/api/v1/settings/cache")
+def get_cache_stats():
+    """Get OCR result cache hit/miss counters (this worker) and sizes"""
+    return {
+        "cache": get_result_cache().stats(),
+        "page_cache": get_page_cache().stats()
+    }
+
+
+@app.delete("/api/v1/settings/cache")
+def clear_cache():
+    """Clear the OCR result cache"""
+    removed = get_result_cache().clear() + get_page_cache().clear()
+    return {"message": "OCR result cache cleared", "removed": removed}
+
+
 @app.get("/api/v1/providers")
 def list_available_providers():
     """List all available OCR providers"""
     return {"providers": list_providers()}
 
 
+@app.get("/api/v1/providers/stats")
+def provider_stats():
+    """Rolling latency percentiles (seconds per page) and error rates per provider"""
+    return {"providers": get_provider_stats()}
+
+
+@app.get("/api/v1/ocr/queue")
+def ocr_queue_stats():
+    """Running and queued OCR tasks per API key"""
+    return get_scheduler().stats()
+
+
 # ============== OCR API (Protected) ==============
 
-def process_ocr_task(task_id: str, file_bytes: bytes, provider_name: str, custom_prompt: str = ""):
-    """Background task for OCR processing with multi-page PDF support"""
-    from utils.image import is_pdf, load_pdf_pages, load_image_from_bytes, preprocess_for_ocr
-    import cv2
+def publish_task_event(task_id: str, event_type: str, status: Optional[str] = None, **data):
+    """Update task status (if given) and publish a progress event to stream subscribers"""
+    if "processed" in data:
+        # Page counters let batch status aggregate progress without reading events
+        task_store.update(task_id, status=status, processed_pages=data["processed"], total_pages=data.get("total"))
+    elif status:
+        task_store.update(task_id, status=status)
+    task_store.add_event(task_id, {"type": event_type, "status": status, **data})
+
+
+def _cancel_requested(task_id: str) -> bool:
+    """Whether a task was cancelled (by any API worker) or has expired from the store"""
+    task = task_store.get(task_id)
+    return task is None or bool(task.get("cancel_requested"))
+
+
+def process_ocr_task(
+    task_id: str,
+    upload: SpooledUpload,
+    provider_name: str,
+    custom_prompt: str = "",
+    use_cache: bool = True,
+    hedge_policy: Optional[HedgePolicy] = None,
+    page_limit: int = MAX_DOCUMENT_PAGES
+):
+    """
+    Background task for OCR processing, cancellable via DELETE /api/v1/ocr/tasks/{task_id}
+    
+    The task owns the spooled upload and removes it when done. PDFs are OCR'd
+    up to page_limit pages (the API key's quota, 0 = no limit).
+    """
+    token = CancelToken(lambda: _cancel_requested(task_id))
+    try:
+        if token.cancelled:
+            # Cancelled while queued
+            return
+        _cancel_tokens[task_id] = token
+        with cancel_scope(token):
+            _run_ocr_task(task_id, upload, provider_name, custom_prompt, use_cache, hedge_policy, page_limit)
+    finally:
+        _cancel_tokens.pop(task_id, None)
+        upload.discard()
+
+
+def _run_ocr_task(
+    task_id: str,
+    upload: SpooledUpload,
+    provider_name: str,
+    custom_prompt: str,
+    use_cache: bool,
+    hedge_policy: Optional[HedgePolicy],
+    page_limit: int
+):
+    """OCR processing with multi-page PDF support (reads the spooled upload from disk)"""
+    from utils.image import get_pdf_page_count, get_image_size, load_image, MAX_RENDER_SIDE
+    from utils.pdf_text import TEXT_LAYER_PROVIDER
+    from ocr_pipeline import (
+        iter_document_pages, run_page_pipeline, run_on_page_workers, page_windows,
+        combine_page_results, to_reference_dpi, PIPELINE_WORKERS, ADAPTIVE_DPI, USE_TEXT_LAYER,
+        PAGE_BATCH_SIZE, ASYNC_PAGE_BATCH_SIZE, PAGE_WINDOW
+    )
+    from ocr_tiling import needs_tiling, process_tiled
     
-    tasks_db[task_id]["status"] = "processing"
+    publish_task_event(task_id, "status", status="processing")
     try:
         provider = get_provider(provider_name)
         provider_config = get_provider_config(provider_name).copy()
@@ -410,73 +599,238 @@ def process_ocr_task(task_id: str, file_bytes: bytes, provider_name: str, custom
         if custom_prompt:
             provider_config["prompt"] = custom_prompt
         
+        # Content-addressed result cache (same file + same settings = same result)
+        cache = get_result_cache()
+        pipeline = {"text_layer": USE_TEXT_LAYER, "adaptive_dpi": ADAPTIVE_DPI} if upload.is_pdf else None
+        cache_key = make_cache_key(upload.sha256, provider_name, provider_config, pipeline)
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None and page_limit and (cached.get("page_count") or 1) > page_limit:
+                # Cached from a key with a larger page quota
+                cached = None
+            if cached is not None:
+                task_store.update(task_id, cache_hit=True)
+                task_store.set_result(task_id, cached)
+                publish_task_event(task_id, "completed", status="completed", cache_hit=True)
+                logger.info(f"Task {task_id}: Served from OCR result cache")
+                return
+        else:
+            cache.record_bypass()
+        
+        # PaddleOCR runs on the worker process pool (None = run in this process)
+        pool = get_worker_pool(provider_name)
+        
+        # Configs of providers this task may be routed to (loaded once per task)
+        configs = {provider_name: provider_config}
+        
+        def config_for(name):
+            if name not in configs:
+                configs[name] = get_provider_config(name).copy()
+                if custom_prompt:
+                    configs[name]["prompt"] = custom_prompt
+            return configs[name]
+        
         # Check if file is a multi-page PDF
-        if is_pdf(file_bytes):
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-            
+        if upload.is_pdf:
             logger.info(f"Task {task_id}: Processing multi-page PDF...")
-            pages = load_pdf_pages(file_bytes, dpi=200)
-            total_pages = len(pages)
+            document_pages = get_pdf_page_count(upload.path)
+            total_pages = min(document_pages, page_limit) if page_limit else document_pages
+            if total_pages < document_pages:
+                logger.warning(f"Task {task_id}: PDF has {document_pages} pages, page quota allows {total_pages}")
+                task_store.update(task_id, document_pages=document_pages, page_limit=page_limit)
+            
+            publish_task_event(
+                task_id, "progress", status=f"processing {total_pages} pages in parallel",
+                processed=0, total=total_pages, document_pages=document_pages
+            )
             
-            tasks_db[task_id]["status"] = f"processing {total_pages} pages in parallel"
+            # Rendered pages are already sized for the recognizer; don't shrink them again
+            def page_config_for(name):
+                page_config = config_for(name).copy()
+                if ADAPTIVE_DPI:
+                    page_config["max_image_side"] = MAX_RENDER_SIDE
+                return page_config
             
-            # Function to process a single page
-            def process_single_page(page_data):
-                page_num, page_img = page_data
-                _, buffer = cv2.imencode('.png', page_img)
-                page_bytes = buffer.tobytes()
-                result = provider.process(page_bytes, provider_config)
-                return page_num, result
+            page_config = page_config_for(provider_name)
             
-            # Process pages in parallel (max 4 workers to avoid memory overload)
-            all_results = [None] * total_pages
-            max_workers = min(4, total_pages)
+            # Recognise rendered pages on the named provider (pool or in-process);
+            # pages are handed over decoded, never re-encoded for the provider
+            def recognize_pages(name, images):
+                name_pool = get_worker_pool(name)
+                if name_pool:
+                    return name_pool.recognize_batch(images, page_config_for(name))
+                return get_provider(name).process_batch(images, page_config_for(name))
             
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(process_single_page, (i, page_img)): i
-                    for i, page_img in enumerate(pages)
-                }
+            # Unchanged pages (same pixels, same settings) are served from the page cache
+            page_cache = get_page_cache()
+            cached_pages = []
+            served_by_fallback = set()
+            
+            # Render DPI and size of each page; boxes are brought to one reference DPI
+            # (that of the text layer), so coordinates line up across pages
+            page_geometry = {}
+            
+            # Process a batch of pages, recognising only those not in the page cache
+            def process_page_batch(batch):
+                results = {}
+                misses = []
+                for page_num, page_img in batch:
+                    page_key = make_cache_key(hash_page(page_img), provider_name, page_config)
+                    cached_page = page_cache.get(page_key) if use_cache else None
+                    if cached_page is not None:
+                        cached_pages.append(page_num)
+                        results[page_num] = OCRResult.from_dict(cached_page)
+                    else:
+                        misses.append((page_num, page_img, page_key))
+                
+                if misses:
+                    images = [img for _, img, _ in misses]
+                    fresh, served_by = process_with_routing(
+                        provider_name, lambda name: recognize_pages(name, images), hedge_policy, config_for, len(images)
+                    )
+                    served_by_fallback.update(page_num for page_num, _, _ in misses if served_by != provider_name)
+                    for (page_num, _, page_key), result in zip(misses, fresh):
+                        # The page cache is keyed by the requested provider; keep fallback answers out
+                        if served_by == provider_name:
+                            page_cache.put(page_key, result.to_dict())
+                        results[page_num] = result
                 
-                completed = 0
-                for future in as_completed(futures):
-                    page_num, result = future.result()
-                    all_results[page_num] = result
-                    completed += 1
-                    tasks_db[task_id]["status"] = f"processed {completed}/{total_pages} pages"
-                    logger.info(f"Task {task_id}: Completed page {page_num + 1}")
+                return [to_reference_dpi(results[page_num], page_geometry.get(page_num)) for page_num, _ in batch]
             
-            # Combine all results in order
-            all_text = []
-            all_details = []
-            for i, result in enumerate(all_results):
-                if result and result.raw_text:
-                    all_text.append(f"--- Page {i+1} ---\n{result.raw_text}")
-                if result:
-                    all_details.extend(result.details)
+            # Pages finished in earlier windows
+            completed_before = [0]
             
-            # Combine all results
-            combined_result = {
-                "status": "success",
-                "raw_text": "\n\n".join(all_text),
-                "details": [d.to_dict() if hasattr(d, 'to_dict') else d for d in all_details],
-                "provider": provider_name,
-                "page_count": total_pages
-            }
+            def on_page_done(page_num, result, completed):
+                completed += completed_before[0]
+                # Stored before the event goes out, so subscribers can fetch the page right away
+                task_store.set_page_result(task_id, page_num + 1, {**result.to_dict(), **page_geometry.get(page_num, {})})
+                publish_task_event(
+                    task_id, "page", status=f"processed {completed}/{total_pages} pages",
+                    page=page_num + 1, processed=completed, total=total_pages
+                )
+                logger.info(f"Task {task_id}: Completed page {page_num + 1}")
             
-            tasks_db[task_id]["status"] = "completed"
-            tasks_db[task_id]["result"] = combined_result
-            logger.info(f"Task {task_id}: Completed {total_pages} pages (parallel)")
+            # Digital pages are read from the text layer; the rest are rendered
+            # one at a time and OCR'd in small batches as soon as they are ready.
+            # Long documents go through in fixed-size page windows, so render
+            # and parser memory depend on the window, not the document length;
+            # finished pages stay readable (page mode) if a later window fails.
+            all_results = {}
+            for window_start, window_end in page_windows(total_pages):
+                if total_pages > PAGE_WINDOW:
+                    publish_task_event(
+                        task_id, "window", status=f"processing pages {window_start + 1}-{window_end} of {total_pages}",
+                        first_page=window_start + 1, last_page=window_end, total=total_pages
+                    )
+                completed_before[0] = len(all_results)
+                all_results.update(run_page_pipeline(
+                    iter_document_pages(upload.path, window_end, dpi=200, start=window_start, page_geometry=page_geometry),
+                    on_page_done=on_page_done,
+                    max_workers=pool.size if pool else PIPELINE_WORKERS,
+                    process_batch=process_page_batch,
+                    batch_size=ASYNC_PAGE_BATCH_SIZE if provider.supports_async else PAGE_BATCH_SIZE
+                ))
+            
+            combined_result = combine_page_results(all_results, provider_name, total_pages, page_geometry)
+            if total_pages < document_pages:
+                combined_result["document_pages"] = document_pages
+            text_layer_pages = sum(1 for r in all_results.values() if r.provider == TEXT_LAYER_PROVIDER)
+            task_store.update(task_id, cached_pages=len(cached_pages), text_layer_pages=text_layer_pages)
+            task_store.set_result(task_id, combined_result)
+            publish_task_event(task_id, "completed", status="completed", total=total_pages)
+            if combined_result["failed_pages"]:
+                # Failed pages would be served to every later upload of this file
+                logger.warning(f"Task {task_id}: {len(combined_result['failed_pages'])} page(s) failed, result not cached")
+            elif served_by_fallback:
+                logger.info(f"Task {task_id}: {len(served_by_fallback)} page(s) served by fallback provider")
+            elif total_pages == document_pages:
+                # Results cut short by a page quota are not cached for other keys
+                cache.put(cache_key, combined_result)
+            logger.info(
+                f"Task {task_id}: Completed {total_pages} pages "
+                f"({text_layer_pages} from text layer, {len(cached_pages)} from page cache)"
+            )
         else:
-            # Single image processing (original behavior)
-            result = provider.process(file_bytes, provider_config)
-            tasks_db[task_id]["status"] = "completed"
-            tasks_db[task_id]["result"] = result.to_dict()
+            # Very large images are read as full-resolution tiles by providers that return boxes
+            image_size = get_image_size(upload.path)
+            tile_image = image_size is not None and needs_tiling(*image_size)
             
+            def recognize_image(name):
+                name_pool = get_worker_pool(name)
+                name_provider = get_provider(name)
+                if tile_image and name_provider.supports_tiling and config_for(name).get("tiled", True):
+                    recognize_batch = name_pool.recognize_batch if name_pool else name_provider.process_batch
+                    workers = name_pool.size if name_pool else PIPELINE_WORKERS
+                    return process_tiled(load_image(upload.path), config_for(name), recognize_batch, workers, name)
+                # Single image processing (within the shared page worker budget); providers
+                # and pool workers get the spooled path and decode from a memory map
+                recognize = name_pool.recognize if name_pool else name_provider.process
+                return run_on_page_workers(recognize, upload.path, config_for(name))
+            
+            result, served_by = process_with_routing(provider_name, recognize_image, hedge_policy, config_for)
+            result_dict = result.to_dict()
+            task_store.set_result(task_id, result_dict)
+            publish_task_event(task_id, "completed", status="completed")
+            if served_by == provider_name:
+                cache.put(cache_key, result_dict)
+            
+    except TaskCancelledError:
+        # Status and the "cancelled" event were written by the cancel request
+        logger.info(f"Task {task_id}: Cancelled")
     except Exception as e:
         logger.error(f"OCR Task Error: {str(e)}")
-        tasks_db[task_id]["status"] = "failed"
-        tasks_db[task_id]["error"] = str(e)
+        task_store.update(task_id, error=str(e))
+        publish_task_event(task_id, "failed", status="failed", error=str(e))
+
+
+def _queue_ocr_task(queue_policy: QueuePolicy, task_id: str, upload: SpooledUpload, *args) -> Future:
+    """Queue process_ocr_task on the scheduler, keeping the job cancellable until it finishes"""
+    future = get_scheduler().submit(queue_policy, process_ocr_task, task_id, upload, *args)
+    _queued_jobs[task_id] = future
+    
+    def on_done(job: Future):
+        _queued_jobs.pop(task_id, None)
+        if job.cancelled():
+            # Never started, so the task never took ownership of its upload
+            upload.discard()
+    
+    future.add_done_callback(on_done)
+    return future
+
+
+@app.delete("/api/v1/ocr/tasks/{task_id}")
+def cancel_task(task_id: str, api_key: dict = Depends(verify_api_key)):
+    """
+    Cancel an OCR task (Requires API Key)
+    
+    A queued task never starts. A running task stops within about a second:
+    pages not yet recognised are dropped and in-flight cloud requests are
+    aborted. Pages finished before the cancel stay readable through the
+    page mode of the result endpoint.
+    """
+    task = task_store.get(task_id)
+    if task is None or task.get("type") == "batch":
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task["status"] in ("completed", "failed"):
+        raise HTTPException(status_code=409, detail=f"Task already {task['status']}")
+    
+    if task["status"] != "cancelled":
+        # The cancel flag is a column of its own, so it reaches tasks running in other
+        # API workers even while they write progress; local ones are signalled directly
+        if not task_store.request_cancel(task_id):
+            # Finished between the read above and the cancel
+            task = task_store.get(task_id) or {"status": "expired"}
+            raise HTTPException(status_code=409, detail=f"Task already {task['status']}")
+        job = _queued_jobs.get(task_id)
+        if job is not None:
+            job.cancel()
+        token = _cancel_tokens.get(task_id)
+        if token is not None:
+            token.cancel()
+        publish_task_event(task_id, "cancelled", status="cancelled")
+        logger.info(f"Task {task_id}: Cancellation requested by API key: {api_key.get('name', 'unknown')}")
+    
+    return {"task_id": task_id, "status": "cancelled"}
 
 
 @app.post("/api/v1/ocr/upload", response_model=TaskResponse)
@@ -484,8 +838,8 @@ def process_ocr_task(task_id: str, file_bytes: bytes, provider_name: str, custom
 async def upload_file(
     request: Request,
     file: UploadFile = File(...), 
-    background_tasks: BackgroundTasks = None,
     provider: Optional[str] = Query(None, description="Override active provider"),
+    no_cache: bool = Query(False, description="Bypass the OCR result cache and re-run the provider"),
     api_key: dict = Depends(verify_api_key)  # Protected!
 ):
     """
@@ -494,6 +848,7 @@ async def upload_file(
     Args:
         file: The file to process (JPEG, PNG, or PDF)
         provider: Optional provider override (uses active provider if not specified)
+        no_cache: Skip the result cache lookup (the fresh result is still cached)
     """
     if file.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
         raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and PDF are supported.")
@@ -510,26 +865,29 @@ async def upload_file(
     if provider_name not in get_provider_names():
         raise HTTPException(status_code=400, detail=f"Unknown provider: {provider_name}")
     
-    # Read file content
-    content = await file.read()
+    # Spool the upload to disk (size-capped while streaming)
+    upload = await spool_upload(file)
     
     # Generate Task ID
     task_id = str(uuid.uuid4())
     
     # Init task status
-    tasks_db[task_id] = {
-        "status": "pending",
+    task_store.create(task_id, {
         "filename": file.filename,
         "provider": provider_name,
         "api_key_name": api_key.get("name", "unknown"),
         "custom_prompt": api_key.get("custom_prompt", "")
-    }
+    })
     
     # Get custom prompt from API key
     custom_prompt = api_key.get("custom_prompt", "")
     
-    # Trigger background processing with custom prompt
-    background_tasks.add_task(process_ocr_task, task_id, content, provider_name, custom_prompt)
+    # Queue for processing with custom prompt (fair-shared across API keys)
+    _queue_ocr_task(
+        QueuePolicy.from_api_key(api_key),
+        task_id, upload, provider_name, custom_prompt, not no_cache,
+        HedgePolicy.from_api_key(api_key), page_limit_for(api_key)
+    )
     
     logger.info(f"OCR task {task_id} created by API key: {api_key.get('name', 'unknown')} with custom_prompt: {bool(custom_prompt)}")
     
@@ -539,41 +897,385 @@ async def upload_file(
 @app.get("/api/v1/ocr/status/{task_id}")
 def get_status(task_id: str, api_key: dict = Depends(verify_api_key)):
     """Check OCR task status (Requires API Key)"""
-    if task_id not in tasks_db:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = tasks_db[task_id]
-    return {
+    status = {
         "task_id": task_id, 
         "status": task["status"],
         "provider": task.get("provider", "unknown")
     }
+    if task.get("total_pages"):
+        status["processed_pages"] = task.get("processed_pages", 0)
+        status["total_pages"] = task["total_pages"]
+    if task.get("document_pages"):
+        # The PDF is longer than the API key's page quota
+        status["document_pages"] = task["document_pages"]
+        status["page_limit"] = task.get("page_limit")
+    return status
+
+
+@app.get("/api/v1/ocr/stream/{task_id}")
+async def stream_status(
+    task_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    api_key: dict = Depends(verify_stream_api_key)
+):
+    """
+    Stream OCR task progress as Server-Sent Events (Requires API Key)
+    
+    Authenticates once, then pushes "status", "progress", "window" (long
+    PDFs, one per page window), "page", "completed", "failed" and
+    "cancelled" events as the task produces them. Page events carry the
+    page number only; fetch its text with the result endpoint's page mode
+    (start_page=end_page=page).
+    EventSource clients can pass the key ID or frontend token as ?token=
+    since browsers cannot set headers on EventSource requests; secret API
+    keys must be sent in the X-API-Key header.
+    """
+    if await run_in_threadpool(task_store.get, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    
+    async def event_stream():
+        nonlocal after
+        idle = 0.0
+        while not await request.is_disconnected():
+            events = await run_in_threadpool(task_store.get_events, task_id, after)
+            for event in events:
+                after = event["seq"]
+                yield f"id: {after}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] in ("completed", "failed", "cancelled"):
+                    return
+            
+            if events:
+                idle = 0.0
+            else:
+                idle += STREAM_POLL_INTERVAL
+                if idle >= STREAM_HEARTBEAT_INTERVAL:
+                    idle = 0.0
+                    # Stop if the task has expired from the store
+                    if await run_in_threadpool(task_store.get, task_id) is None:
+                        return
+                    yield ": keep-alive\n\n"
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/v1/ocr/result/{task_id}")
-def get_result(task_id: str, api_key: dict = Depends(verify_api_key)):
-    """Get OCR result (Requires API Key)"""
-    if task_id not in tasks_db:
+def get_result(
+    task_id: str,
+    start_page: Optional[int] = Query(None, ge=1, description="First page to return (enables page mode)"),
+    end_page: Optional[int] = Query(None, ge=1, description="Last page to return (enables page mode)"),
+    mode: str = Query("full", description="Result shape: text, lines, full or boxes"),
+    min_confidence: Optional[float] = Query(None, ge=0, le=1, description="Only blocks at or above this confidence"),
+    region: Optional[str] = Query(None, description="Only blocks whose box intersects x0,y0,x1,y1 (pixels; PDF pages at their page dpi)"),
+    fields: Optional[str] = Query(None, description="Block fields to return, comma-separated: text,confidence,box,page"),
+    api_key: dict = Depends(verify_api_key)
+):
+    """
+    Get OCR result (Requires API Key)
+    
+    With start_page/end_page, returns the pages in that range that are
+    finished so far, even while the task is still processing. Poll again
+    with start_page=next_page to continue from the first missing page.
+    
+    mode picks the result shape:
+      - text: raw text and metadata only (no blocks)
+      - lines: text and confidence per block, no boxes
+      - full: every block with its box (default)
+      - boxes: blocks as packed little-endian arrays (base64), for bulk consumers
+    
+    min_confidence, region and fields narrow the blocks returned. Page ranges
+    keep each page's own text; with min_confidence or region, raw_text is
+    rebuilt from the matching blocks and marked text_source="blocks".
+    Filtering runs on the stored columns, so fetching one page of a large
+    document never loads the others.
+    """
+    if mode not in OUTPUT_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode. Must be one of: {', '.join(OUTPUT_MODES)}")
+    query = _parse_result_query(min_confidence, region, fields)
+    
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = tasks_db[task_id]
+    if start_page is not None or end_page is not None:
+        start = start_page or 1
+        if task["status"] == "completed":
+            # Slice the stored result to the page range before splitting it into pages
+            selection = replace(query or ResultQuery(), start_page=start, end_page=end_page, fields=None)
+            selected = task_store.get_result(task_id, "full", selection)
+            page_query = ResultQuery(fields=query.fields) if query and query.fields else None
+            pages = split_result_pages(selected or {}, start, end_page)
+            pages = {page: shape_result(result, mode, page_query) for page, result in pages.items()}
+        else:
+            pages = task_store.get_page_results(task_id, start, end_page, mode, query)
+        
+        total = task.get("total_pages") or (1 if task["status"] == "completed" else None)
+        last = min(end_page, total) if end_page and total else (end_page or total)
+        missing = [p for p in range(start, last + 1) if p not in pages] if last else [start]
+        return {
+            "task_id": task_id,
+            "status": task["status"],
+            "processed_pages": task.get("processed_pages", len(pages)),
+            "total_pages": total,
+            "pages": [{"page": page, **result} for page, result in pages.items()],
+            "next_page": missing[0] if missing and task["status"] not in ("completed", "failed", "cancelled") else None
+        }
+    
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="Task is not completed yet")
     
     return {
         "task_id": task_id,
         "status": "completed",
-        "data": task.get("result")
+        "data": task_store.get_result(task_id, mode, query)
     }
 
 
+def _parse_result_query(
+    min_confidence: Optional[float],
+    region: Optional[str],
+    fields: Optional[str]
+) -> Optional[ResultQuery]:
+    """Build a ResultQuery from result endpoint parameters (None when nothing is filtered)"""
+    if min_confidence is None and not region and not fields:
+        return None
+    
+    bounds = None
+    if region:
+        try:
+            bounds = tuple(float(v) for v in region.split(","))
+        except ValueError:
+            bounds = ()
+        if len(bounds) != 4 or bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+            raise HTTPException(status_code=400, detail="region must be x0,y0,x1,y1 with x0 <= x1 and y0 <= y1")
+    
+    selected_fields = None
+    if fields:
+        selected_fields = tuple(f.strip() for f in fields.split(",") if f.strip())
+        invalid = [f for f in selected_fields if f not in BLOCK_FIELDS]
+        if invalid or not selected_fields:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid fields: {', '.join(invalid) or fields}. Must be from: {', '.join(BLOCK_FIELDS)}"
+            )
+    
+    return ResultQuery(min_confidence=min_confidence, region=bounds, fields=selected_fields)
+
+
+def process_ocr_batch(
+    batch_id: str,
+    items: List[tuple],
+    provider_name: str,
+    custom_prompt: str = "",
+    use_cache: bool = True,
+    hedge_policy: Optional[HedgePolicy] = None,
+    queue_policy: Optional[QueuePolicy] = None,
+    page_limit: int = MAX_DOCUMENT_PAGES
+):
+    """
+    Queue the files of a batch as OCR jobs of the batch's API key.
+    Files run up to the key's concurrency cap; their pages all share the page
+    worker budget. The batch is marked completed when its last file finishes.
+    """
+    import threading
+    
+    remaining = [len(items)]
+    lock = threading.Lock()
+    
+    def on_file_done(_future):
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            task_store.update(batch_id, status="completed")
+            logger.info(f"Batch {batch_id}: Finished {len(items)} file(s)")
+    
+    task_store.update(batch_id, status="processing")
+    for task_id, upload in items:
+        future = _queue_ocr_task(
+            queue_policy or QueuePolicy(),
+            task_id, upload, provider_name, custom_prompt, use_cache, hedge_policy, page_limit
+        )
+        future.add_done_callback(on_file_done)
+
+
+def _get_batch(batch_id: str) -> dict:
+    """Load a batch record or raise 404"""
+    batch = task_store.get(batch_id)
+    if batch is None or batch.get("type") != "batch":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@app.post("/api/v1/ocr/batch")
+@limiter.limit("5/minute")
+async def upload_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    provider: Optional[str] = Query(None, description="Override active provider"),
+    no_cache: bool = Query(False, description="Bypass the OCR result cache and re-run the provider"),
+    api_key: dict = Depends(verify_api_key)  # Protected!
+):
+    """
+    Upload many files for OCR in one request (Requires API Key)
+    
+    Returns one batch ID plus a task ID per file. Pages from all files are
+    scheduled through the shared OCR worker budget.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="At least one file is required")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {MAX_BATCH_FILES} per batch.")
+    
+    for f in files:
+        if f.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type: {f.filename}. Only JPEG, PNG, and PDF are supported."
+            )
+    
+    api_key_provider = api_key.get("provider", "")
+    provider_name = provider or api_key_provider or get_active_provider()
+    
+    if api_key.get("id"):
+        increment_usage(api_key["id"])
+    
+    if provider_name not in get_provider_names():
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {provider_name}")
+    
+    custom_prompt = api_key.get("custom_prompt", "")
+    batch_id = str(uuid.uuid4())
+    
+    # Spool every file before creating any task, so an oversized file rejects the whole batch
+    uploads = []
+    try:
+        for f in files:
+            uploads.append(await spool_upload(f))
+    except BaseException:
+        for upload in uploads:
+            upload.discard()
+        raise
+    
+    items = []
+    tasks = []
+    for f, upload in zip(files, uploads):
+        task_id = str(uuid.uuid4())
+        task_store.create(task_id, {
+            "filename": f.filename,
+            "provider": provider_name,
+            "api_key_name": api_key.get("name", "unknown"),
+            "custom_prompt": custom_prompt,
+            "batch_id": batch_id
+        })
+        items.append((task_id, upload))
+        tasks.append({"task_id": task_id, "filename": f.filename})
+    
+    task_store.create(batch_id, {
+        "type": "batch",
+        "provider": provider_name,
+        "api_key_name": api_key.get("name", "unknown"),
+        "tasks": tasks
+    })
+    
+    process_ocr_batch(
+        batch_id, items, provider_name, custom_prompt, not no_cache,
+        HedgePolicy.from_api_key(api_key), QueuePolicy.from_api_key(api_key), page_limit_for(api_key)
+    )
+    
+    logger.info(f"OCR batch {batch_id} created with {len(tasks)} file(s) by API key: {api_key.get('name', 'unknown')}")
+    
+    return {"batch_id": batch_id, "status": "pending", "tasks": tasks}
+
+
+@app.get("/api/v1/ocr/batch/{batch_id}")
+def get_batch_status(batch_id: str, api_key: dict = Depends(verify_api_key)):
+    """Get aggregate and per-file progress of a batch (Requires API Key)"""
+    batch = _get_batch(batch_id)
+    
+    files = []
+    summary = {"completed": 0, "failed": 0, "cancelled": 0, "pending": 0, "processing": 0}
+    pages_processed = 0
+    pages_total = 0
+    for entry in batch.get("tasks", []):
+        task = task_store.get(entry["task_id"]) or {"status": "expired"}
+        status = task["status"]
+        if status in ("completed", "failed", "cancelled", "pending"):
+            summary[status] += 1
+        elif status != "expired":
+            summary["processing"] += 1
+        pages_processed += task.get("processed_pages") or (1 if status == "completed" else 0)
+        pages_total += task.get("total_pages") or 1
+        files.append({
+            "task_id": entry["task_id"],
+            "filename": entry["filename"],
+            "status": status,
+            "error": task.get("error")
+        })
+    
+    done = summary["completed"] + summary["failed"] + summary["cancelled"]
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if done == len(files) else batch["status"],
+        "provider": batch.get("provider", "unknown"),
+        "files_total": len(files),
+        "files": files,
+        "summary": summary,
+        "pages_processed": pages_processed,
+        "pages_total": pages_total
+    }
+
+
+@app.get("/api/v1/ocr/batch/{batch_id}/result")
+def get_batch_result(
+    batch_id: str,
+    format: str = Query("json", description="Download format: json or text"),
+    api_key: dict = Depends(verify_api_key)
+):
+    """Download the combined results of every file in a batch (Requires API Key)"""
+    batch = _get_batch(batch_id)
+    # The text download never needs the blocks
+    result_mode = "text" if format == "text" else "full"
+    
+    results = []
+    for entry in batch.get("tasks", []):
+        task = task_store.get(entry["task_id"]) or {"status": "expired"}
+        results.append({
+            "task_id": entry["task_id"],
+            "filename": entry["filename"],
+            "status": task["status"],
+            "error": task.get("error"),
+            "data": task_store.get_result(entry["task_id"], result_mode) if task["status"] == "completed" else None
+        })
+    
+    if format == "text":
+        sections = []
+        for r in results:
+            text = (r["data"] or {}).get("raw_text", "") if r["data"] else f"[{r['status']}]"
+            sections.append(f"===== {r['filename']} =====\n{text}")
+        return StreamingResponse(
+            io.BytesIO("\n\n".join(sections).encode("utf-8")),
+            media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="batch_{batch_id}.txt"'}
+        )
+    
+    return {"batch_id": batch_id, "results": results}
+
+
 # ==========================================
 # TOOLS API ENDPOINTS
 # ==========================================
 
-from fastapi.responses import StreamingResponse
-import io
-
 @app.post("/api/v1/tools/merge-pdf")
 async def merge_pdf_endpoint(files: list[UploadFile] = File(...)):
     """Merge multiple PDF files into one"""
@@ -1004,12 +1706,13 @@ async def pdf_info_endpoint(
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
+    # Read from a spooled copy; only the PDF's structure is loaded, not the whole file
+    upload = await spool_upload(file)
     try:
-        content = await file.read()
-        page_count = get_pdf_page_count(content)
+        page_count = get_pdf_page_count(upload.path)
         
         # Get dimensions for first page
-        dimensions = get_pdf_page_dimensions(content, 1)
+        dimensions = get_pdf_page_dimensions(upload.path, 1)
         
         return {
             "page_count": page_count,
@@ -1019,6 +1722,8 @@ async def pdf_info_endpoint(
     except Exception as e:
         logger.error(f"PDF info error: {e}")
         raise HTTPException(status_code=500, detail="Failed to get PDF info")
+    finally:
+        upload.discard()
 
 
 @app.post("/api/v1/tools/pdf-preview")
@@ -1034,11 +1739,11 @@ async def pdf_preview_endpoint(
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
+    upload = await spool_upload(file)
     try:
         from app_tools.signature_tools import render_pdf_page_preview
         
-        content = await file.read()
-        preview_image = render_pdf_page_preview(content, page_number=page)
+        preview_image = render_pdf_page_preview(upload.path, page_number=page)
         
         return StreamingResponse(
             io.BytesIO(preview_image),
@@ -1051,6 +1756,8 @@ async def pdf_preview_endpoint(
     except Exception as e:
         logger.error(f"PDF preview error: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate preview")
+    finally:
+        upload.discard()
 
 
 @app.post("/api/v1/tools/word-to-pdf")
@@ -0,0 +1,299 @@
+"""
+OCR Result Cache - Content-addressed cache of OCR results
+
+Results are keyed by a hash of the file bytes plus the provider name, the
+provider settings that affect output (model, language, prompt, ...) and, for
+PDFs, the pipeline settings that do (text layer, adaptive DPI), so a repeat
+upload of the same document is answered without calling a provider.
+
+A second instance caches individual PDF pages by pixel digest, so an edited
+PDF only re-runs OCR on the pages that changed.
+
+Two tiers:
+  - memory: per-process LRU bounded by total compressed size
+  - disk:   directory shared by all workers, bounded by size and TTL
+
+OCR_CACHE_MEMORY_MB and OCR_CACHE_DISK_MB are the totals for both caches;
+the page cache gets OCR_PAGE_CACHE_SHARE of each and the result cache the rest.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from utils.packing import pack_result, unpack_result
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.environ.get("OCR_CACHE_DIR", "./ocr_cache"))
+CACHE_MEMORY_BYTES = int(os.environ.get("OCR_CACHE_MEMORY_MB", 64)) * 1024 * 1024
+CACHE_DISK_BYTES = int(os.environ.get("OCR_CACHE_DISK_MB", 1024)) * 1024 * 1024
+CACHE_TTL_SECONDS = int(os.environ.get("OCR_CACHE_TTL", 7 * 24 * 3600))
+
+# Share of the memory and disk budgets given to the page cache
+PAGE_CACHE_SHARE = min(1.0, max(0.0, float(os.environ.get("OCR_PAGE_CACHE_SHARE", 0.5))))
+
+# Minimum seconds between disk eviction sweeps
+DISK_SWEEP_INTERVAL = 300
+
+# Provider config fields that never change the OCR output
+IGNORED_CONFIG_FIELDS = {"api_key", "enabled", "preload_langs"}
+
+
+def make_cache_key(
+    file_hash: str,
+    provider_name: str,
+    provider_config: Dict[str, Any],
+    pipeline: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Build a cache key from a content hash and the effective provider settings.
+
+    provider_config should already include the API key's custom prompt
+    (merged as "prompt"), so different prompts never share an entry.
+    pipeline holds server settings outside the provider config that change
+    the result (e.g. text-layer extraction and adaptive DPI for PDFs).
+    """
+    relevant = {
+        k: v for k, v in sorted(provider_config.items())
+        if k not in IGNORED_CONFIG_FIELDS
+    }
+    material = {"file": file_hash, "provider": provider_name, "config": relevant}
+    if pipeline:
+        material["pipeline"] = pipeline
+    material = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 hex digest of file content"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_page(img) -> str:
+    """
+    Exact pixel digest of a rendered page (numpy array).
+
+    Rendering is deterministic for a given page and DPI, so unchanged pages
+    of an edited or re-sent PDF produce the same digest.
+    """
+    digest = hashlib.sha256(f"{img.shape}:{img.dtype}".encode())
+    digest.update(memoryview(img if img.flags["C_CONTIGUOUS"] else img.copy()))
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """Two-tier (memory + disk) cache of OCR result dicts"""
+
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_DIR,
+        memory_bytes: int = CACHE_MEMORY_BYTES,
+        disk_bytes: int = CACHE_DISK_BYTES,
+        ttl_seconds: int = CACHE_TTL_SECONDS
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, blob)
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+        if self.disk_bytes > 0:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.cache_dir / key[:2] / f"{key}.json.z"
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            stored_at, blob = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                self._memory.pop(key)
+                self._memory_size -= len(blob)
+                return None
+            self._memory.move_to_end(key)
+            return blob
+
+    def _memory_put(self, key: str, blob: bytes, stored_at: float):
+        if len(blob) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old:
+                self._memory_size -= len(old[1])
+            self._memory[key] = (stored_at, blob)
+            self._memory_size += len(blob)
+            while self._memory_size > self.memory_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    # ---------- disk tier ----------
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        if self.disk_bytes <= 0:
+            return None
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            blob = path.read_bytes()
+            # Touch access time so eviction favours recently used entries
+            os.utime(path, (time.time(), stat.st_mtime))
+            return stat.st_mtime, blob
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, key: str, blob: bytes):
+        if self.disk_bytes <= 0:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers in other workers never see partial files
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(blob)
+        os.replace(tmp, path)
+        self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < DISK_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        try:
+            self.sweep()
+        except Exception as e:
+            logger.error(f"OCR cache sweep error: {e}")
+
+    def sweep(self) -> int:
+        """Evict expired disk entries, then least recently used until under the size cap"""
+        now = time.time()
+        entries = []
+        removed = 0
+        for path in self.cache_dir.glob("*/*.json.z"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+        if removed:
+            logger.info(f"OCR cache evicted {removed} disk entr(y/ies)")
+        return removed
+
+    # ---------- public API ----------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result (memory first, then disk)"""
+        blob = self._memory_get(key)
+        if blob is not None:
+            self._count("memory_hits")
+            return unpack_result(blob)
+
+        entry = self._disk_get(key)
+        if entry is not None:
+            stored_at, blob = entry
+            self._memory_put(key, blob, stored_at)
+            self._count("disk_hits")
+            return unpack_result(blob)
+
+        self._count("misses")
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a successful result in both tiers"""
+        if result.get("status") != "success":
+            return
+        blob = pack_result(result)
+        self._memory_put(key, blob, time.time())
+        try:
+            self._disk_put(key, blob)
+        except OSError as e:
+            logger.error(f"OCR cache write error: {e}")
+        self._count("stores")
+
+    def record_bypass(self):
+        self._count("bypassed")
+
+    def clear(self) -> int:
+        """Remove every cached entry. Returns number of disk entries removed."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        removed = 0
+        if self.disk_bytes > 0:
+            for path in self.cache_dir.glob("*/*.json.z"):
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters (this process) and tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[OCRResultCache] = None
+_page_cache: Optional[OCRResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> OCRResultCache:
+    """Get the process-wide OCR result cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRResultCache(
+                memory_bytes=int(CACHE_MEMORY_BYTES * (1 - PAGE_CACHE_SHARE)),
+                disk_bytes=int(CACHE_DISK_BYTES * (1 - PAGE_CACHE_SHARE))
+            )
+    return _cache
+
+
+def get_page_cache() -> OCRResultCache:
+    """Get the process-wide per-page cache (PDF pages, keyed by pixel digest)"""
+    global _page_cache
+    with _cache_lock:
+        if _page_cache is None:
+            _page_cache = OCRResultCache(
+                cache_dir=CACHE_DIR / "pages",
+                memory_bytes=int(CACHE_MEMORY_BYTES * PAGE_CACHE_SHARE),
+                disk_bytes=int(CACHE_DISK_BYTES * PAGE_CACHE_SHARE)
+            )
+    return _page_cache
@@ -0,0 +1,409 @@
+"""
+OCR Page Pipeline - Streams PDF pages from the renderer to OCR workers
+
+Pages are rendered one at a time and handed to a worker pool as soon as they
+are ready. A semaphore bounds the number of rendered-but-unfinished pages
+(independent of the batch size), so peak memory is a few pages and rendering
+overlaps with recognition.
+
+All tasks (single uploads and batches) share one page executor, so the total
+number of pages being recognised is bounded by one worker budget. Work runs
+under the submitting task's cancel token (providers.cancellation): once the
+task is cancelled, rendering stops and queued pages are dropped.
+"""
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union, Any
+
+import numpy as np
+
+from providers.base import OCRResult, OCRTextBlock
+from providers.cancellation import WAIT_STEP, current_token, submit_in_context, wait_cancellable
+from utils.image import PDFSource, spooled_pdf, render_pdf_page, render_pdf_page_adaptive
+from utils.packing import join_page_texts
+from utils.pdf_text import open_pdf, extract_text_layer
+
+logger = logging.getLogger(__name__)
+
+# Shared budget: pages recognised concurrently across all tasks
+PAGE_WORKERS = int(os.environ.get("OCR_PAGE_WORKERS", max(4, os.cpu_count() or 1)))
+
+# Pages of a single task in flight at once
+PIPELINE_WORKERS = int(os.environ.get("OCR_PIPELINE_WORKERS", 4))
+
+# Extra pages the renderer may run ahead of the workers
+PIPELINE_PREFETCH = int(os.environ.get("OCR_PIPELINE_PREFETCH", 2))
+
+# Pages handed to a worker together when the provider supports batched inference
+PAGE_BATCH_SIZE = int(os.environ.get("OCR_PAGE_BATCH_SIZE", 4))
+
+# Pages per batch for async (cloud) providers: their requests run concurrently
+# on the shared HTTP client, so a batch costs one waiting thread, not one per page.
+# Batches never hold more than the pipeline's page budget (workers + prefetch).
+ASYNC_PAGE_BATCH_SIZE = int(os.environ.get("OCR_ASYNC_PAGE_BATCH_SIZE", PIPELINE_WORKERS + PIPELINE_PREFETCH))
+
+# Read the native text layer of digital PDF pages instead of OCR'ing them
+USE_TEXT_LAYER = os.environ.get("OCR_PDF_TEXT_LAYER", "true").lower() != "false"
+
+# Render each PDF page at a DPI chosen for its text size instead of a fixed DPI
+ADAPTIVE_DPI = os.environ.get("OCR_ADAPTIVE_DPI", "true").lower() != "false"
+
+# Long documents are processed in windows of this many pages; the PDF is
+# reopened per window, so parser state does not grow with document length
+PAGE_WINDOW = max(1, int(os.environ.get("OCR_PAGE_WINDOW", 50)))
+
+# Pages OCR'd per document unless an API key sets its own max_pages (0 = no limit)
+MAX_DOCUMENT_PAGES = int(os.environ.get("OCR_MAX_PDF_PAGES", 2000))
+
+
+# Per-page geometry recorded on page results: boxes are in pixels at "dpi"
+PAGE_GEOMETRY_FIELDS = ("dpi", "render_dpi", "width", "height")
+
+
+_page_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_page_executor() -> ThreadPoolExecutor:
+    """Get the page executor shared by every OCR task"""
+    global _page_executor
+    with _executor_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(max_workers=PAGE_WORKERS, thread_name_prefix="ocr-page")
+    return _page_executor
+
+
+def run_on_page_workers(fn: Callable[..., Any], *args) -> Any:
+    """Run one unit of OCR work (e.g. a single image) within the shared budget and wait for it"""
+    return wait_cancellable(submit_in_context(get_page_executor(), fn, *args))
+
+
+def page_limit_for(api_key: Dict[str, Any]) -> int:
+    """Pages an API key may have OCR'd per document (0 = no limit)"""
+    max_pages = (api_key or {}).get("max_pages")
+    return MAX_DOCUMENT_PAGES if max_pages is None else max(0, int(max_pages))
+
+
+def page_windows(total_pages: int, window: int = PAGE_WINDOW) -> Iterator[Tuple[int, int]]:
+    """0-based [start, end) page ranges covering a document"""
+    for start in range(0, total_pages, max(1, window)):
+        yield start, min(total_pages, start + window)
+
+
+def iter_document_pages(
+    file_bytes: PDFSource,
+    total_pages: int,
+    dpi: int = 200,
+    use_text_layer: bool = USE_TEXT_LAYER,
+    adaptive_dpi: bool = ADAPTIVE_DPI,
+    start: int = 0,
+    page_geometry: Optional[Dict[int, Dict[str, Any]]] = None
+) -> Iterator[Tuple[int, Union[np.ndarray, OCRResult]]]:
+    """
+    Stream the pages of a PDF for OCR, from page index `start` up to (not
+    including) `total_pages`.
+
+    Pages with an extractable text layer are yielded as ready OCRResults and
+    never rasterised; image-only pages are rendered one at a time, either at
+    `dpi` or (adaptive_dpi) at a per-page DPI chosen for their text size.
+
+    If page_geometry is given, it is filled (before each page is yielded)
+    with the page's render_dpi and its width/height in pixels at `dpi`, the
+    reference DPI; see to_reference_dpi for bringing boxes onto that scale.
+
+    Yields:
+        (page_index, OCRResult) or (page_index, BGR image)
+    """
+    with spooled_pdf(file_bytes) as pdf_path:
+        pdf = open_pdf(pdf_path) if use_text_layer else None
+        try:
+            for page_index in range(start, total_pages):
+                if pdf is not None:
+                    text_result = extract_text_layer(pdf, page_index, dpi)
+                    if text_result is not None:
+                        if page_geometry is not None:
+                            page = pdf.pages[page_index]
+                            page_geometry[page_index] = _geometry(page.width * dpi / 72.0, page.height * dpi / 72.0, dpi, dpi)
+                        yield page_index, text_result
+                        continue
+                if adaptive_dpi:
+                    img, render_dpi = render_pdf_page_adaptive(pdf_path, page_index)
+                else:
+                    img, render_dpi = render_pdf_page(pdf_path, page_index, dpi), dpi
+                if img is not None:
+                    if page_geometry is not None:
+                        scale = dpi / render_dpi
+                        page_geometry[page_index] = _geometry(img.shape[1] * scale, img.shape[0] * scale, dpi, render_dpi)
+                    yield page_index, img
+        finally:
+            if pdf is not None:
+                pdf.close()
+
+
+def _geometry(width: float, height: float, dpi: int, render_dpi: int) -> Dict[str, Any]:
+    return {"dpi": dpi, "render_dpi": render_dpi, "width": int(round(width)), "height": int(round(height))}
+
+
+def to_reference_dpi(result: OCRResult, geometry: Optional[Dict[str, Any]]) -> OCRResult:
+    """
+    Scale a page result's boxes from its render DPI to the reference DPI of
+    its page geometry, so the boxes of every page of a document share one scale
+    """
+    if not geometry or geometry["render_dpi"] == geometry["dpi"]:
+        return result
+    scale = geometry["dpi"] / geometry["render_dpi"]
+    return OCRResult(
+        status=result.status,
+        raw_text=result.raw_text,
+        details=[
+            OCRTextBlock(
+                text=d.text,
+                confidence=d.confidence,
+                box=[[round(float(x) * scale, 1), round(float(y) * scale, 1)] for x, y in d.box] if d.box else d.box
+            )
+            for d in result.details
+        ],
+        provider=result.provider,
+        error=result.error
+    )
+
+
+def run_page_pipeline(
+    pages: Iterable[Tuple[int, Union[np.ndarray, OCRResult]]],
+    process_page: Optional[Callable[[int, np.ndarray], OCRResult]] = None,
+    on_page_done: Optional[Callable[[int, OCRResult, int], None]] = None,
+    max_workers: int = PIPELINE_WORKERS,
+    prefetch: int = PIPELINE_PREFETCH,
+    process_batch: Optional[Callable[[List[Tuple[int, np.ndarray]]], List[OCRResult]]] = None,
+    batch_size: int = PAGE_BATCH_SIZE
+) -> Dict[int, OCRResult]:
+    """
+    Run OCR over a stream of pages with bounded memory.
+
+    At most max_workers + prefetch rendered pages are waiting or being
+    recognised at any time, whatever the batch size. Pages are batched only
+    while every worker is busy: a partial batch goes out as soon as a worker
+    is free, so recognition starts with the first rendered page.
+
+    Args:
+        pages: Iterable of (page_index, image or ready OCRResult), typically iter_document_pages()
+        process_page: Called in a worker thread for each page image, returns its OCRResult
+        on_page_done: Optional callback (page_index, result, completed_count)
+        max_workers: Page batches of this document recognised concurrently
+        prefetch: Pages the renderer may run ahead of the workers
+        process_batch: Used instead of process_page when given; called with up
+            to batch_size (page_index, image) pairs, returns their OCRResults in order
+        batch_size: Most pages per process_batch call
+
+    Returns:
+        Dict of page_index -> OCRResult
+
+    Raises:
+        TaskCancelledError: if the current task is cancelled meanwhile
+    """
+    if process_batch is None:
+        process_batch = lambda batch: [process_page(i, img) for i, img in batch]
+        batch_size = 1
+    batch_size = max(1, batch_size)
+    max_workers = max(1, max_workers)
+
+    token = current_token()
+    cancelled = lambda: token is not None and token.cancelled
+    results: Dict[int, OCRResult] = {}
+    errors: List[BaseException] = []
+    lock = threading.Lock()
+    # Signalled whenever a batch finishes
+    batch_done = threading.Condition(lock)
+    # One slot per rendered page that is not yet recognised
+    slots = threading.Semaphore(max_workers + max(0, prefetch))
+    executor = get_page_executor()
+    # Rendered pages not yet handed to a worker, and batches being recognised
+    pending: List[Tuple[int, np.ndarray]] = []
+    running = [0]
+
+    def _record(page_index: int, result: OCRResult) -> None:
+        with lock:
+            results[page_index] = result
+            completed = len(results)
+        if on_page_done:
+            on_page_done(page_index, result, completed)
+
+    def _dispatch() -> None:
+        """Hand the pending pages to a worker (lock held)"""
+        batch = pending[:batch_size]
+        del pending[:batch_size]
+        running[0] += 1
+        submit_in_context(executor, _run, batch)
+
+    def _drop_pending() -> None:
+        """Release the slots of pages that will never be recognised (lock held)"""
+        for _ in pending:
+            slots.release()
+        pending.clear()
+
+    def _acquire_slot() -> bool:
+        """Wait for a page slot; False (holding none) once the run fails or is cancelled"""
+        while not slots.acquire(timeout=WAIT_STEP):
+            if errors or cancelled():
+                return False
+        if errors or cancelled():
+            slots.release()
+            return False
+        return True
+
+    def _run(batch: List[Tuple[int, np.ndarray]]) -> None:
+        try:
+            # Pages queued behind a failure or a cancellation are dropped
+            if errors or cancelled():
+                return
+            for (page_index, _), result in zip(batch, process_batch(batch)):
+                _record(page_index, result)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            for _ in batch:
+                slots.release()
+            with lock:
+                running[0] -= 1
+                # This worker is free: take whatever the renderer has queued meanwhile
+                if errors or cancelled():
+                    _drop_pending()
+                elif pending:
+                    _dispatch()
+                batch_done.notify_all()
+
+    for page_index, page in pages:
+        # Checked for every page, text-layer pages included, so a cancel is
+        # noticed within one page's extraction or render
+        if errors or cancelled():
+            break
+        if isinstance(page, OCRResult):
+            # Already resolved (e.g. native text layer): nothing to dispatch
+            _record(page_index, page)
+            continue
+        # Block the renderer until a slot frees up
+        if not _acquire_slot():
+            break
+        with lock:
+            pending.append((page_index, page))
+            if len(pending) >= batch_size or running[0] < max_workers:
+                _dispatch()
+        # Drop our reference so the page is freed once recognised
+        del page
+
+    with lock:
+        if errors or cancelled():
+            _drop_pending()
+        while pending and running[0] < max_workers:
+            _dispatch()
+        while running[0] or pending:
+            batch_done.wait()
+
+    if token is not None:
+        token.raise_if_cancelled()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def combine_page_results(
+    page_results: Dict[int, OCRResult],
+    provider_name: str,
+    total_pages: int,
+    page_geometry: Optional[Dict[int, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Combine per-page results into a single result dict, in page order.
+
+    Pages that failed (or never produced a result) are listed in failed_pages;
+    the combined status is "partial" if some pages failed, "failed" if all did.
+    page_info keeps each page's status, error and the span of its own text
+    within raw_text, so pages can be served with the provider's text later,
+    plus its geometry (see iter_document_pages) when given.
+    """
+    all_details = []
+    failed_pages = []
+    page_info = []
+    for i in range(total_pages):
+        result = page_results.get(i)
+        if result is None or result.status != "success":
+            failed_pages.append(i + 1)
+        if result:
+            all_details.extend((i + 1, d) for d in result.details)
+        page_info.append({
+            "page": i + 1,
+            "status": result.status if result else "failed",
+            "error": result.error if result else "Page could not be rendered",
+            **(page_geometry or {}).get(i, {})
+        })
+
+    raw_text, spans = join_page_texts(
+        (i + 1, page_results[i].raw_text) for i in range(total_pages) if i in page_results
+    )
+    for entry in page_info:
+        entry["text_span"] = spans.get(entry["page"])
+
+    if not failed_pages:
+        status = "success"
+    else:
+        status = "failed" if len(failed_pages) == total_pages else "partial"
+    return {
+        "status": status,
+        "raw_text": raw_text,
+        "details": [
+            {"text": d.text, "confidence": d.confidence, "box": d.box, "page": page}
+            for page, d in all_details
+        ],
+        "provider": provider_name,
+        "page_count": total_pages,
+        "failed_pages": failed_pages,
+        "page_info": page_info
+    }
+
+
+def split_result_pages(result: Dict[str, Any], start: int = 1, end: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Per-page results (1-based, within [start, end]) from a finished task result.
+
+    Multi-page results are split by the page number on each detail; each
+    page's raw_text, status and error come from page_info, i.e. the text the
+    provider returned for that page (or, for results narrowed by a confidence
+    or region filter, the matching blocks). A single-image result is page 1.
+    """
+    page_count = result.get("page_count")
+    if page_count is None:
+        return {1: result} if start <= 1 and (end is None or end >= 1) else {}
+
+    last = page_count if end is None else min(end, page_count)
+    pages = {
+        page: {"status": "success", "raw_text": "", "details": [], "provider": result.get("provider"), "error": None}
+        for page in range(max(1, start), last + 1)
+    }
+    if "text_source" in result:
+        for page in pages.values():
+            page["text_source"] = result["text_source"]
+    for detail in result.get("details", []):
+        page = pages.get(detail.get("page"))
+        if page is not None:
+            page["details"].append(detail)
+
+    page_info = result.get("page_info")
+    if page_info is None:
+        # Stored before page_info existed: rebuild each page's text from its blocks
+        for page in pages.values():
+            page["raw_text"] = "\n".join(d["text"] for d in page["details"] if d.get("text"))
+        return pages
+
+    raw_text = result.get("raw_text") or ""
+    for entry in page_info:
+        page = pages.get(entry["page"])
+        if page is None:
+            continue
+        span = entry.get("text_span")
+        page["raw_text"] = raw_text[span[0]:span[1]] if span else ""
+        page["status"] = entry.get("status", "success")
+        page["error"] = entry.get("error")
+        page.update({key: entry[key] for key in PAGE_GEOMETRY_FIELDS if key in entry})
+    return pages
@@ -0,0 +1,198 @@
+"""
+OCR Job Scheduler - Fair-share, priority-aware queueing of OCR tasks
+
+Every OCR task (single upload or batch file) is queued per API key instead
+of running in FIFO order, and a fixed number of job slots run them:
+  - "interactive" keys are always served before "bulk" keys, and bulk jobs
+    never take the last few slots, so interactive latency stays flat while
+    bulk work soaks up the spare capacity
+  - within a priority class keys share slots by weight (stride scheduling):
+    a key with weight 2 gets twice the slots of a key with weight 1 when both
+    have work queued, however many jobs each has submitted
+  - each key runs at most max_concurrent jobs at once
+
+Priority, weight and max_concurrent are set per key in api_keys.json.
+"""
+import os
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "bulk")
+DEFAULT_PRIORITY = "interactive"
+
+# OCR tasks running at once across all keys
+SCHEDULER_SLOTS = int(os.environ.get("OCR_SCHEDULER_SLOTS", 8))
+
+# Slots bulk jobs may never occupy (kept free for interactive arrivals)
+INTERACTIVE_RESERVED_SLOTS = int(os.environ.get("OCR_INTERACTIVE_RESERVED_SLOTS", 2))
+
+# Default per-key limit on running jobs
+DEFAULT_KEY_CONCURRENCY = int(os.environ.get("OCR_KEY_MAX_CONCURRENT", 4))
+
+
+@dataclass
+class QueuePolicy:
+    """Per-API-key scheduling policy"""
+    key_id: str = ""
+    priority: str = DEFAULT_PRIORITY
+    weight: int = 1
+    max_concurrent: int = DEFAULT_KEY_CONCURRENCY
+
+    @classmethod
+    def from_api_key(cls, api_key: Dict[str, Any]) -> "QueuePolicy":
+        """Policy from an API key record (missing fields use the server defaults)"""
+        api_key = api_key or {}
+        priority = api_key.get("priority") or DEFAULT_PRIORITY
+        return cls(
+            key_id=api_key.get("id", "") or "",
+            priority=priority if priority in PRIORITIES else DEFAULT_PRIORITY,
+            weight=max(1, int(api_key.get("weight") or 1)),
+            max_concurrent=max(1, int(api_key.get("max_concurrent") or DEFAULT_KEY_CONCURRENCY))
+        )
+
+
+Job = Tuple[Callable[..., Any], tuple, Future]
+
+
+class _KeyQueue:
+    """Queued and running jobs of one API key"""
+
+    def __init__(self, policy: QueuePolicy):
+        self.policy = policy
+        self.jobs: Deque[Job] = deque()
+        self.running = 0
+        # Stride scheduling pass value: the key with the lowest pass runs next
+        self.pass_value = 0.0
+
+
+class OCRScheduler:
+    """Runs queued OCR jobs on a fixed number of slots, fairly across API keys"""
+
+    def __init__(
+        self,
+        slots: int = SCHEDULER_SLOTS,
+        reserved: int = INTERACTIVE_RESERVED_SLOTS
+    ):
+        self.slots = max(1, slots)
+        self.bulk_slots = max(1, self.slots - reserved)
+        self._queues: Dict[str, _KeyQueue] = {}
+        self._running = 0
+        self._running_bulk = 0
+        # Pass value of the last job dispatched per class; idle keys rejoin here
+        self._class_pass = {priority: 0.0 for priority in PRIORITIES}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="ocr-job")
+
+    def submit(self, policy: QueuePolicy, fn: Callable[..., Any], *args) -> Future:
+        """
+        Queue fn(*args) for the policy's API key.
+
+        Returns a Future for the job; cancelling it before the job starts
+        removes it from the queue.
+        """
+        future: Future = Future()
+        with self._lock:
+            queue = self._queues.get(policy.key_id)
+            if queue is None:
+                queue = self._queues[policy.key_id] = _KeyQueue(policy)
+            queue.policy = policy
+            if not queue.jobs and not queue.running:
+                # A key that was idle starts level with the others, not with saved-up credit
+                queue.pass_value = max(queue.pass_value, self._class_pass[policy.priority])
+            queue.jobs.append((fn, args, future))
+            self._dispatch()
+        return future
+
+    def _pick(self) -> Optional[_KeyQueue]:
+        """Next key to run a job for (lock held)"""
+        for priority in PRIORITIES:
+            if priority == "bulk" and self._running_bulk >= self.bulk_slots:
+                continue
+            ready = [
+                q for q in self._queues.values()
+                if q.policy.priority == priority and q.jobs and q.running < q.policy.max_concurrent
+            ]
+            if ready:
+                return min(ready, key=lambda q: q.pass_value)
+        return None
+
+    def _dispatch(self):
+        """Start jobs while slots are free (lock held)"""
+        while self._running < self.slots:
+            queue = self._pick()
+            if queue is None:
+                return
+            job = queue.jobs.popleft()
+            if job[2].cancelled():
+                self._forget_if_idle(queue)
+                continue
+            # A later submit may change the key's policy; the job keeps the class it was admitted under
+            priority = queue.policy.priority
+            queue.running += 1
+            self._running += 1
+            if priority == "bulk":
+                self._running_bulk += 1
+            self._class_pass[priority] = queue.pass_value
+            queue.pass_value += 1.0 / queue.policy.weight
+            self._executor.submit(self._run, queue, job, priority)
+
+    def _run(self, queue: _KeyQueue, job: Job, priority: str):
+        fn, args, future = job
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    logger.error(f"OCR job failed: {e}")
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                queue.running -= 1
+                self._running -= 1
+                if priority == "bulk":
+                    self._running_bulk -= 1
+                self._forget_if_idle(queue)
+                self._dispatch()
+
+    def _forget_if_idle(self, queue: _KeyQueue):
+        """Drop a key's queue once it has nothing queued or running (lock held)"""
+        if not queue.jobs and not queue.running and self._queues.get(queue.policy.key_id) is queue:
+            del self._queues[queue.policy.key_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Running and queued jobs, overall and per API key"""
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "running": self._running,
+                "running_bulk": self._running_bulk,
+                "queued": sum(len(q.jobs) for q in self._queues.values()),
+                "keys": {
+                    key_id or "anonymous": {
+                        "priority": q.policy.priority,
+                        "weight": q.policy.weight,
+                        "running": q.running,
+                        "queued": len(q.jobs)
+                    }
+                    for key_id, q in self._queues.items()
+                }
+            }
+
+
+_scheduler: Optional[OCRScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> OCRScheduler:
+    """Get the process-wide OCR job scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = OCRScheduler()
+    return _scheduler
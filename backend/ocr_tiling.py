@@ -0,0 +1,227 @@
+"""
+Tiled OCR - Recognise very large images as overlapping tiles
+
+Providers shrink images to about 1800px before recognition, which makes the
+small text on engineering drawings, posters and long receipts unreadable.
+In tiled mode a large image is cut into overlapping tiles at full
+resolution, the tiles are recognised in parallel (on the shared page
+workers, spread over the OCR worker pool), and their boxes are shifted back into image coordinates with
+the duplicates read twice along tile seams removed.
+"""
+import os
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from providers.base import OCRResult, OCRTextBlock
+from providers.cancellation import submit_in_context, wait_cancellable
+from ocr_pipeline import get_page_executor
+
+logger = logging.getLogger(__name__)
+
+# Tile side in pixels (recognised without downscaling) and overlap between tiles;
+# the overlap should be larger than the longest text line that may straddle a seam
+TILE_SIZE = int(os.environ.get("OCR_TILE_SIZE", 1600))
+TILE_OVERLAP = int(os.environ.get("OCR_TILE_OVERLAP", 200))
+
+# Images are tiled only when a side exceeds this; smaller ones are recognised whole
+TILE_THRESHOLD = int(os.environ.get("OCR_TILE_THRESHOLD", 2400))
+
+# Boxes sharing more than this fraction of the smaller box are the same text
+DUPLICATE_OVERLAP = 0.5
+
+# A box this close to a tile edge inside the image was probably cut by the seam
+EDGE_MARGIN = 4
+
+Bounds = Tuple[float, float, float, float]
+Tile = Tuple[int, int, np.ndarray]
+
+
+def needs_tiling(width: int, height: int, threshold: int = TILE_THRESHOLD) -> bool:
+    """Whether an image is large enough to be recognised in tiles"""
+    return max(width, height) > threshold
+
+
+def _tile_starts(length: int, tile_size: int, stride: int) -> List[int]:
+    """Tile offsets along one axis; the last tile is aligned to the edge"""
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def split_tiles(img: np.ndarray, tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP) -> List[Tile]:
+    """
+    Cut an image into overlapping tiles.
+
+    Returns:
+        (x, y, tile) per tile, where tile is a view into img (no copy)
+    """
+    height, width = img.shape[:2]
+    stride = max(1, tile_size - overlap)
+    return [
+        (x, y, img[y:y + tile_size, x:x + tile_size])
+        for y in _tile_starts(height, tile_size, stride)
+        for x in _tile_starts(width, tile_size, stride)
+    ]
+
+
+def _bounds(box: List[List[float]]) -> Bounds:
+    xs = [p[0] for p in box]
+    ys = [p[1] for p in box]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _area(b: Bounds) -> float:
+    return max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
+
+
+def _is_duplicate(a: Bounds, b: Bounds) -> bool:
+    """Whether two boxes cover mostly the same text"""
+    inter = _area((max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])))
+    smaller = min(_area(a), _area(b))
+    return smaller > 0 and inter / smaller > DUPLICATE_OVERLAP
+
+
+def _reading_order(blocks: List[Tuple[OCRTextBlock, Bounds]]) -> List[OCRTextBlock]:
+    """Sort blocks into lines (top to bottom), each line left to right"""
+    if not blocks:
+        return []
+    heights = [b[3] - b[1] for _, b in blocks]
+    line_gap = max(1.0, float(np.median(heights)) / 2)
+
+    lines: List[List[Tuple[OCRTextBlock, Bounds]]] = []
+    for block in sorted(blocks, key=lambda item: (item[1][1] + item[1][3]) / 2):
+        center = (block[1][1] + block[1][3]) / 2
+        if lines:
+            last = lines[-1][-1][1]
+            if abs(center - (last[1] + last[3]) / 2) <= line_gap:
+                lines[-1].append(block)
+                continue
+        lines.append([block])
+
+    return [block for line in lines for block, _ in sorted(line, key=lambda item: item[1][0])]
+
+
+def _touches_seam(bounds: Bounds, tile: Tile, image_size: Tuple[int, int]) -> bool:
+    """Whether a box (tile coordinates) touches a tile edge that lies inside the image"""
+    x, y, arr = tile
+    tile_h, tile_w = arr.shape[:2]
+    width, height = image_size
+    return (
+        (x > 0 and bounds[0] <= EDGE_MARGIN)
+        or (y > 0 and bounds[1] <= EDGE_MARGIN)
+        or (x + tile_w < width and bounds[2] >= tile_w - EDGE_MARGIN)
+        or (y + tile_h < height and bounds[3] >= tile_h - EDGE_MARGIN)
+    )
+
+
+def merge_tile_results(
+    tiles: List[Tile],
+    results: List[OCRResult],
+    image_size: Tuple[int, int],
+    provider_name: str
+) -> OCRResult:
+    """
+    Merge per-tile results into one result in image coordinates.
+
+    Boxes are shifted by their tile offset. Where tiles overlap the same text
+    is read twice, possibly cut by one tile's edge, so of overlapping boxes
+    the one clear of any seam is kept, then the largest, then the most
+    confident.
+
+    Args:
+        tiles: Tiles from split_tiles
+        results: One result per tile
+        image_size: (width, height) of the whole image
+        provider_name: Provider reported on the merged result
+    """
+    failed = [r for r in results if r.status != "success"]
+    if failed:
+        return OCRResult(
+            status="failed",
+            raw_text="",
+            details=[],
+            provider=provider_name,
+            error=f"{len(failed)}/{len(results)} tile(s) failed: {failed[0].error}"
+        )
+
+    # (block, bounds in image coordinates, clear of seams)
+    candidates: List[Tuple[OCRTextBlock, Optional[Bounds], bool]] = []
+    for tile, result in zip(tiles, results):
+        x, y, _ = tile
+        for block in result.details:
+            if block.box is None:
+                candidates.append((block, None, True))
+                continue
+            clear = not _touches_seam(_bounds(block.box), tile, image_size)
+            box = [[float(p[0]) + x, float(p[1]) + y] for p in block.box]
+            candidates.append((OCRTextBlock(text=block.text, confidence=block.confidence, box=box), _bounds(box), clear))
+
+    kept: List[Tuple[OCRTextBlock, Bounds]] = []
+    unplaced: List[OCRTextBlock] = []
+    for block, bounds, _ in sorted(
+        candidates,
+        key=lambda item: (item[2], _area(item[1]) if item[1] else 0.0, item[0].confidence),
+        reverse=True
+    ):
+        if bounds is None:
+            unplaced.append(block)
+        elif not any(_is_duplicate(bounds, other) for _, other in kept):
+            kept.append((block, bounds))
+
+    details = _reading_order(kept) + unplaced
+    return OCRResult(
+        status="success",
+        raw_text="\n".join(block.text for block in details),
+        details=details,
+        provider=provider_name
+    )
+
+
+def process_tiled(
+    img: np.ndarray,
+    config: Dict[str, Any],
+    recognize_batch: Callable[[List[np.ndarray], Dict[str, Any]], List[OCRResult]],
+    workers: int,
+    provider_name: str
+) -> OCRResult:
+    """
+    Recognise a large image as overlapping tiles.
+
+    Tiles are dealt round-robin into one batch per worker and the batches run
+    on the shared page executor, so a large image counts against the same
+    concurrency budget as PDF pages instead of adding threads of its own.
+
+    Args:
+        img: Decoded BGR image
+        config: Provider configuration
+        recognize_batch: Batched recognition (worker pool or provider), called once per worker
+        workers: Number of batches to run concurrently
+        provider_name: Provider reported on the merged result
+    """
+    tiles = split_tiles(img)
+    # Tiles are already at recognition size; don't let the provider shrink them
+    tile_config = {**config, "max_image_side": max(TILE_SIZE, config.get("max_image_side", 0))}
+
+    groups = [list(range(i, len(tiles), max(1, workers))) for i in range(min(max(1, workers), len(tiles)))]
+    logger.info(f"Tiled OCR: {img.shape[1]}x{img.shape[0]} image as {len(tiles)} tile(s) on {len(groups)} worker(s)")
+
+    executor = get_page_executor()
+    futures = [
+        (submit_in_context(executor, recognize_batch, [tiles[pos][2] for pos in group], tile_config), group)
+        for group in groups
+    ]
+    results: List[Optional[OCRResult]] = [None] * len(tiles)
+    try:
+        for future, group in futures:
+            for pos, result in zip(group, wait_cancellable(future)):
+                results[pos] = result
+    finally:
+        # On failure or cancellation, tile batches still queued are dropped
+        for future, _ in futures:
+            future.cancel()
+
+    return merge_tile_results(tiles, results, (img.shape[1], img.shape[0]), provider_name)
@@ -0,0 +1,22 @@
+"""
+OCR Worker Init - Process initializer for the PaddleOCR worker pool
+
+Kept free of provider imports on purpose: each spawned worker imports this
+module to run the initializer, and the math-library thread caps have to be
+in the environment before PaddlePaddle (and the OpenMP/MKL runtimes it
+loads) is imported, since those read them once, at load time.
+"""
+import os
+
+# Thread caps read by OpenMP, MKL and OpenBLAS when they are loaded
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def init_worker(threads: int, warm_config: dict):
+    """Process initializer: cap math-library threads, then load and warm the engine"""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+
+    # Imported only now, so the libraries see the caps above when they load
+    import ocr_workers
+    ocr_workers.load_worker_provider(threads, warm_config)
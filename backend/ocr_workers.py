@@ -0,0 +1,149 @@
+"""
+OCR Worker Pool - Runs PaddleOCR in dedicated worker processes
+
+Each worker process holds its own warmed PaddleOCR engine, so recognition
+runs outside the API process (no GIL contention, no shared engine across
+threads). Intra-op threads per process are capped so that
+processes x threads does not oversubscribe the available cores; the caps
+are set by ocr_worker_init before the worker imports any provider.
+
+Configure with:
+  OCR_WORKER_PROCESSES  number of worker processes (0 = run in-process)
+  OCR_WORKER_THREADS    intra-op threads per worker process
+"""
+import os
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+
+from ocr_worker_init import init_worker
+from providers.base import OCRResult
+from providers.cancellation import wait_cancellable
+
+logger = logging.getLogger(__name__)
+
+WORKER_THREADS = max(1, int(os.environ.get("OCR_WORKER_THREADS", 2)))
+WORKER_PROCESSES = int(os.environ.get(
+    "OCR_WORKER_PROCESSES",
+    max(1, (os.cpu_count() or 1) // WORKER_THREADS)
+))
+
+# Provider whose work is dispatched to the pool
+POOL_PROVIDER = "paddle_ocr"
+
+
+# ============== Worker process side ==============
+
+_worker_provider = None
+
+
+def load_worker_provider(threads: int, warm_config: Dict[str, Any]):
+    """Create and warm this worker's engine (called by ocr_worker_init.init_worker)"""
+    global _worker_provider
+    from providers.paddle_ocr import PaddleOCRProvider
+    _worker_provider = PaddleOCRProvider(cpu_threads=threads)
+    try:
+        _worker_provider.preload(PaddleOCRProvider.preload_configs(warm_config))
+    except Exception as e:
+        logger.warning(f"OCR worker {os.getpid()}: engine warm-up failed: {e}")
+
+
+def _recognize(image: Union[bytes, np.ndarray], config: Dict[str, Any]) -> OCRResult:
+    """Run OCR in the worker process on encoded bytes or a decoded BGR image"""
+    if isinstance(image, np.ndarray):
+        return _worker_provider.process_image(image, config)
+    return _worker_provider.process(image, config)
+
+
+def _recognize_batch(images: List[Union[bytes, np.ndarray]], config: Dict[str, Any]) -> List[OCRResult]:
+    """Run batched OCR over several pages in the worker process"""
+    return _worker_provider.process_batch(images, config)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ============== API process side ==============
+
+class OCRWorkerPool:
+    """Pool of PaddleOCR worker processes"""
+
+    def __init__(self, processes: int = WORKER_PROCESSES, threads: int = WORKER_THREADS):
+        self.size = processes
+        self.threads = threads
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                from config import get_provider_config
+                warm_config = get_provider_config(POOL_PROVIDER)
+                # spawn: PaddlePaddle is not fork-safe and the API process is threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(self.threads, warm_config)
+                )
+                logger.info(f"Started OCR worker pool: {self.size} process(es) x {self.threads} thread(s)")
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        """Drop a broken executor so the next call starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, fn, *args):
+        """Run fn on a worker process and wait for the result (withdrawn if the task is cancelled)"""
+        executor = self._get_executor()
+        try:
+            return wait_cancellable(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); restart the pool and retry once
+            logger.error("OCR worker pool broken, restarting...")
+            self._reset(executor)
+            return wait_cancellable(self._get_executor().submit(fn, *args))
+
+    def recognize(self, image: Union[bytes, np.ndarray], config: Dict[str, Any]) -> OCRResult:
+        """Run OCR on a worker process and wait for the result"""
+        return self._call(_recognize, image, config)
+
+    def recognize_batch(self, images: List[Union[bytes, np.ndarray]], config: Dict[str, Any]) -> List[OCRResult]:
+        """Run batched OCR over several pages on one worker process"""
+        return self._call(_recognize_batch, images, config)
+
+    def warm(self):
+        """Start every worker process and load its engine"""
+        executor = self._get_executor()
+        pids = {f.result() for f in [executor.submit(_ping) for _ in range(self.size * 2)]}
+        logger.info(f"OCR worker pool warm ({len(pids)} process(es) ready)")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[OCRWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(provider_name: str = POOL_PROVIDER) -> Optional[OCRWorkerPool]:
+    """Get the shared worker pool for a provider, or None if it runs in-process"""
+    global _pool
+    if provider_name != POOL_PROVIDER or WORKER_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRWorkerPool()
+    return _pool
@@ -1,8 +1,9 @@
 """
 Provider Registry - Manages available OCR providers
 """
-from typing import Dict, Type, List
+from typing import Any, Callable, Dict, Type, List, Optional, Tuple
 from .base import BaseOCRProvider
+from .routing import HedgePolicy, get_router
 from .paddle_ocr import PaddleOCRProvider
 from .google_vision import GoogleVisionProvider
 from .mistral_ocr import MistralOCRProvider
@@ -45,6 +46,37 @@ def get_provider_names() -> List[str]:
     return list(_instances.keys())
 
 
+def process_with_routing(
+    primary: str,
+    call: Callable[[str], Any],
+    policy: Optional[HedgePolicy] = None,
+    get_config: Optional[Callable[[str], Dict[str, Any]]] = None,
+    pages: int = 1
+) -> Tuple[Any, str]:
+    """
+    Run call(provider_name) through the router: timed per provider, routed
+    around an unhealthy primary and hedged to the policy's fallback when slow.
+    
+    get_config(name) returns a provider's configuration; a fallback is only
+    used if that configuration is valid (e.g. it has an API key). pages is
+    the number of pages the call recognises (latency and fallback budget are per page).
+    
+    Returns:
+        (result, name of the provider that produced it)
+    """
+    def is_available(name: str) -> bool:
+        if name not in _instances:
+            return False
+        return get_config is None or _instances[name].validate_config(get_config(name))
+    
+    return get_router().run(primary, call, policy, is_available, pages)
+
+
+def get_provider_stats() -> Dict[str, Dict[str, Any]]:
+    """Rolling latency percentiles and error rates per provider"""
+    return get_router().stats()
+
+
 # Auto-register all built-in providers
 register_provider(PaddleOCRProvider)
 register_provider(GoogleVisionProvider)
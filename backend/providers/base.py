@@ -1,12 +1,15 @@
 """
 Base OCR Provider - Abstract class for all OCR providers
 """
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 
+from utils.image import ImageInput
 
-@dataclass
+
+@dataclass(slots=True)
 class OCRTextBlock:
     """Represents a single detected text block"""
     text: str
@@ -14,7 +17,7 @@ class OCRTextBlock:
     box: Optional[List[List[float]]] = None  # Bounding box coordinates
 
 
-@dataclass
+@dataclass(slots=True)
 class OCRResult:
     """Standardized OCR result across all providers"""
     status: str  # "success" or "failed"
@@ -35,6 +38,20 @@ class OCRResult:
             "error": self.error
         }
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "OCRResult":
+        """Rebuild an OCRResult from to_dict() output"""
+        return cls(
+            status=data.get("status", "success"),
+            raw_text=data.get("raw_text", ""),
+            details=[
+                OCRTextBlock(text=d.get("text", ""), confidence=d.get("confidence", 0.0), box=d.get("box"))
+                for d in data.get("details", [])
+            ],
+            provider=data.get("provider", ""),
+            error=data.get("error")
+        )
+
 
 class BaseOCRProvider(ABC):
     """Abstract base class for OCR providers"""
@@ -63,12 +80,13 @@ class BaseOCRProvider(ABC):
         pass
     
     @abstractmethod
-    def process(self, file_bytes: bytes, config: Dict[str, Any] = None) -> OCRResult:
+    def process(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
         """
-        Process image/PDF bytes and return OCR result
+        Process an image/PDF and return OCR result
         
         Args:
-            file_bytes: Raw bytes of the file (image or PDF)
+            file_bytes: Raw bytes of the file (image or PDF), or an
+                already-decoded BGR image (e.g. a rendered PDF page)
             config: Provider-specific configuration options
             
         Returns:
@@ -76,6 +94,45 @@ class BaseOCRProvider(ABC):
         """
         pass
     
+    def process_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """
+        Process several images (e.g. the pages of a PDF) in one call
+        
+        The default implementation processes each item on its own. Providers
+        that can share inference work across images override this.
+        
+        Args:
+            pages: Raw bytes or decoded BGR image of each page
+            config: Provider-specific configuration options
+            
+        Returns:
+            One OCRResult per input, in the same order
+        """
+        return [self.process(page, config) for page in pages]
+    
+    @property
+    def supports_tiling(self) -> bool:
+        """Whether results carry boxes, so large images can be recognised as tiles (see ocr_tiling)"""
+        return False
+    
+    @property
+    def supports_async(self) -> bool:
+        """Whether aprocess is natively async (I/O bound, no thread per request)"""
+        return False
+    
+    async def aprocess(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
+        """
+        Async variant of process
+        
+        The default implementation runs process in a worker thread; cloud
+        providers override it with non-blocking HTTP.
+        """
+        return await asyncio.to_thread(self.process, file_bytes, config)
+    
+    async def aprocess_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """Async variant of process_batch: all items run concurrently"""
+        return list(await asyncio.gather(*(self.aprocess(page, config) for page in pages)))
+    
     @abstractmethod
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """Validate provider configuration (e.g., API key)"""
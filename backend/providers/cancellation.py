@@ -0,0 +1,101 @@
+"""
+Task Cancellation - Cooperative cancellation of OCR work
+
+An OCR task runs inside a cancel scope holding its CancelToken. The token
+travels with the task's context (contextvars) into page workers, so
+long-running steps can check it without extra parameters:
+  - the page pipeline stops rendering and drops queued pages
+  - cloud requests waiting in run_sync are cancelled on the HTTP loop
+  - jobs still queued on the PaddleOCR worker pool are withdrawn
+
+Tokens can also watch shared state (e.g. a flag in the task store set by
+another API worker process), checked at most every CHECK_INTERVAL seconds.
+"""
+import time
+import threading
+import contextvars
+from concurrent.futures import Executor, Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+# Seconds between checks of a token's external flag, and the polling step of blocking waits
+CHECK_INTERVAL = 0.5
+WAIT_STEP = 0.25
+
+
+class TaskCancelledError(Exception):
+    """Raised inside an OCR task once it has been cancelled"""
+    pass
+
+
+class CancelToken:
+    """Cancellation flag for one OCR task"""
+
+    def __init__(self, external_check: Optional[Callable[[], bool]] = None):
+        self._event = threading.Event()
+        self._external_check = external_check
+        self._last_check = 0.0
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._external_check is not None:
+            now = time.monotonic()
+            if now - self._last_check >= CHECK_INTERVAL:
+                self._last_check = now
+                try:
+                    if self._external_check():
+                        self._event.set()
+                except Exception:
+                    pass
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise TaskCancelledError("Task cancelled")
+
+
+_current: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("ocr_cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    """The cancel token of the task running in this context, if any"""
+    return _current.get()
+
+
+@contextmanager
+def cancel_scope(token: CancelToken) -> Iterator[CancelToken]:
+    """Run a block (and work it submits via submit_in_context) under a cancel token"""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def submit_in_context(executor: Executor, fn: Callable[..., Any], *args) -> Future:
+    """Submit to an executor so the job sees the caller's cancel token"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def wait_cancellable(future: Future) -> Any:
+    """
+    Wait for a future, giving up if the current task is cancelled.
+
+    On cancellation the future is cancelled too (queued work is dropped) and
+    TaskCancelledError is raised.
+    """
+    token = current_token()
+    if token is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=WAIT_STEP)
+        except FutureTimeoutError:
+            if token.cancelled:
+                future.cancel()
+                raise TaskCancelledError("Task cancelled")
@@ -1,29 +1,24 @@
 """
 Google Vision API Provider - Cloud-based OCR using Google Cloud Vision
 """
-import base64
+import os
+import asyncio
 import logging
-import requests
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from .base import BaseOCRProvider, OCRResult, OCRTextBlock
-from utils.image import load_image_from_bytes, resize_for_ocr
+from .http_client import post_json, run_sync
+from utils.image import ImageInput, encode_base64_for_api
 
 logger = logging.getLogger(__name__)
 
-GOOGLE_VISION_API_URL = "https://vision.googleapis.com/v1/images:annotate"
+# Overridable so a local mock server can stand in for the API
+GOOGLE_VISION_API_URL = os.environ.get("GOOGLE_VISION_API_URL", "https://vision.googleapis.com/v1/images:annotate")
 
-# Connection pooling for faster repeated requests
-_session: requests.Session = None
-
-def _get_session() -> requests.Session:
-    """Get or create a reusable session for connection pooling."""
-    global _session
-    if _session is None:
-        _session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(pool_connections=5, pool_maxsize=10)
-        _session.mount('https://', adapter)
-    return _session
+# images:annotate accepts up to 16 images and ~10 MB of JSON per call
+MAX_IMAGES_PER_REQUEST = int(os.environ.get("GOOGLE_VISION_BATCH_IMAGES", 16))
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+REQUEST_OVERHEAD_BYTES = 256  # Per-entry JSON around the base64 image
 
 
 class GoogleVisionProvider(BaseOCRProvider):
@@ -62,92 +57,155 @@ class GoogleVisionProvider(BaseOCRProvider):
             "required": ["api_key"]
         }
     
-    def process(self, file_bytes: bytes, config: Dict[str, Any] = None) -> OCRResult:
+    @property
+    def supports_async(self) -> bool:
+        return True
+    
+    def process(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
         """Process image using Google Vision API"""
+        return run_sync(self.aprocess(file_bytes, config))
+    
+    def process_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """Process several images with concurrent API requests"""
+        return run_sync(self.aprocess_batch(pages, config))
+    
+    async def aprocess(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
+        """Process image using Google Vision API (non-blocking)"""
+        return (await self.aprocess_batch([file_bytes], config))[0]
+    
+    async def aprocess_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """
+        Process several images with batched images:annotate calls
+        
+        Images are packed into as few requests as the API allows (by image
+        count and payload size), the requests run concurrently, and each
+        response entry is mapped back to its page.
+        """
         config = config or {}
         api_key = config.get("api_key", "")
         
         if not api_key:
-            return OCRResult(
-                status="failed",
-                raw_text="",
-                details=[],
-                provider=self.name,
-                error="Google Vision API key is required"
-            )
+            return [self._failed("Google Vision API key is required") for _ in pages]
+        
+        results: List[Optional[OCRResult]] = [None] * len(pages)
         
+        # Decode, resize and JPEG-encode off the event loop
+        encoded = await asyncio.gather(
+            *(asyncio.to_thread(encode_base64_for_api, page) for page in pages),
+            return_exceptions=True
+        )
+        for pos, item in enumerate(encoded):
+            if isinstance(item, Exception):
+                logger.error(f"Google Vision Error: {str(item)}")
+                results[pos] = self._failed(str(item))
+        
+        # Pack pages into requests bounded by image count and payload size
+        chunks: List[List[int]] = []
+        chunk_bytes = 0
+        for pos, item in enumerate(encoded):
+            if results[pos] is not None:
+                continue
+            size = len(item) + REQUEST_OVERHEAD_BYTES
+            if not chunks or len(chunks[-1]) >= MAX_IMAGES_PER_REQUEST or chunk_bytes + size > MAX_REQUEST_BYTES:
+                chunks.append([])
+                chunk_bytes = 0
+            chunks[-1].append(pos)
+            chunk_bytes += size
+        
+        await asyncio.gather(*(
+            self._annotate(chunk, encoded, config, api_key, results) for chunk in chunks
+        ))
+        return results
+    
+    async def _annotate(
+        self,
+        chunk: List[int],
+        encoded: List[str],
+        config: Dict[str, Any],
+        api_key: str,
+        results: List[Optional[OCRResult]]
+    ):
+        """Send one batched images:annotate request and fill in its pages' results"""
         try:
-            # Load and resize image for faster transmission
-            img = load_image_from_bytes(file_bytes)
-            img = resize_for_ocr(img, max_width=1600, max_height=1600)
-            
-            # Use JPEG encoding for smaller file size
-            import cv2
-            _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            image_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            # Prepare request
+            # Prepare request: one entry per page, in order
             payload = {
                 "requests": [{
-                    "image": {"content": image_base64},
+                    "image": {"content": encoded[pos]},
                     "features": [{"type": "TEXT_DETECTION"}],
                     "imageContext": {
                         "languageHints": config.get("language_hints", ["id", "en"])
                     }
-                }]
+                } for pos in chunk]
             }
             
-            # Use connection pooling for faster repeated requests
-            session = _get_session()
-            response = session.post(
+            # Shared HTTP/2 client, within this provider's in-flight limit
+            response = await post_json(
+                self.name,
                 f"{GOOGLE_VISION_API_URL}?key={api_key}",
                 json=payload,
-                timeout=30
+                timeout=30 + 5 * (len(chunk) - 1),
+                api_key=api_key
             )
             
             if response.status_code != 200:
                 error_msg = response.json().get("error", {}).get("message", "Unknown error")
                 raise Exception(f"Google Vision API error: {error_msg}")
             
-            result = response.json()
-            
-            # Parse response
-            details: List[OCRTextBlock] = []
-            full_text = ""
-            
-            if "responses" in result and result["responses"]:
-                annotations = result["responses"][0].get("textAnnotations", [])
-                
-                if annotations:
-                    # First annotation is the full text
-                    full_text = annotations[0].get("description", "")
-                    
-                    # Rest are individual words/blocks
-                    for ann in annotations[1:]:
-                        vertices = ann.get("boundingPoly", {}).get("vertices", [])
-                        box = [[v.get("x", 0), v.get("y", 0)] for v in vertices]
-                        details.append(OCRTextBlock(
-                            text=ann.get("description", ""),
-                            confidence=0.95,  # Google Vision doesn't return confidence per word
-                            box=box
-                        ))
-            
-            return OCRResult(
-                status="success",
-                raw_text=full_text,
-                details=details,
-                provider=self.name
-            )
+            responses = response.json().get("responses", [])
+            for idx, pos in enumerate(chunk):
+                if idx >= len(responses):
+                    # An empty entry ({}) is a page without text; a missing one is no answer at all
+                    results[pos] = self._failed(
+                        f"Google Vision API error: no response for image {idx + 1} of {len(chunk)}"
+                    )
+                    continue
+                entry = responses[idx]
+                if "error" in entry:
+                    error_msg = entry["error"].get("message", "Unknown error")
+                    results[pos] = self._failed(f"Google Vision API error: {error_msg}")
+                else:
+                    results[pos] = self._parse_response(entry)
             
         except Exception as e:
             logger.error(f"Google Vision Error: {str(e)}")
-            return OCRResult(
-                status="failed",
-                raw_text="",
-                details=[],
-                provider=self.name,
-                error=str(e)
-            )
+            for pos in chunk:
+                results[pos] = self._failed(str(e))
+    
+    def _parse_response(self, entry: Dict[str, Any]) -> OCRResult:
+        """Build the OCRResult for one image's annotate response"""
+        details: List[OCRTextBlock] = []
+        full_text = ""
+        
+        annotations = entry.get("textAnnotations", [])
+        if annotations:
+            # First annotation is the full text
+            full_text = annotations[0].get("description", "")
+            
+            # Rest are individual words/blocks
+            for ann in annotations[1:]:
+                vertices = ann.get("boundingPoly", {}).get("vertices", [])
+                box = [[v.get("x", 0), v.get("y", 0)] for v in vertices]
+                details.append(OCRTextBlock(
+                    text=ann.get("description", ""),
+                    confidence=0.95,  # Google Vision doesn't return confidence per word
+                    box=box
+                ))
+        
+        return OCRResult(
+            status="success",
+            raw_text=full_text,
+            details=details,
+            provider=self.name
+        )
+    
+    def _failed(self, error: str) -> OCRResult:
+        return OCRResult(
+            status="failed",
+            raw_text="",
+            details=[],
+            provider=self.name,
+            error=error
+        )
     
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """Validate API key is present"""
@@ -0,0 +1,155 @@
+"""
+Async HTTP Client - Shared HTTP/2 client for cloud OCR providers
+
+All cloud provider requests go through one httpx.AsyncClient (HTTP/2,
+keep-alive) that lives on a dedicated event loop thread, so hundreds of
+requests can be in flight without tying up a thread each. Each provider has
+its own in-flight limit, so one slow vendor cannot starve the others.
+
+Requests are throttled, retried and circuit-broken by providers.resilience.
+Synchronous callers (background tasks, page workers) use run_sync();
+coroutines running on any event loop can await post_json() directly.
+"""
+import os
+import asyncio
+import threading
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+import httpx
+
+from .resilience import send_with_resilience
+from .cancellation import wait_cancellable
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HTTP2_ENABLED = os.environ.get("OCR_HTTP2", "true").lower() != "false"
+MAX_CONNECTIONS = int(os.environ.get("OCR_HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OCR_HTTP_MAX_KEEPALIVE", 20))
+KEEPALIVE_EXPIRY = 60
+
+# Default in-flight requests per provider; override per provider with
+# OCR_MAX_INFLIGHT_<PROVIDER> (e.g. OCR_MAX_INFLIGHT_GROQ_VISION=8)
+DEFAULT_MAX_INFLIGHT = int(os.environ.get("OCR_MAX_INFLIGHT", 32))
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[httpx.AsyncClient] = None
+_slots: Dict[str, asyncio.Semaphore] = {}
+_loop_lock = threading.Lock()
+
+
+def get_inflight_limit(provider_name: str) -> int:
+    """Maximum concurrent requests to a provider"""
+    return int(os.environ.get(f"OCR_MAX_INFLIGHT_{provider_name.upper()}", DEFAULT_MAX_INFLIGHT))
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get the event loop thread that owns the shared client (started on first use)"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="ocr-http-loop", daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Get the shared client (must be called on the client loop)"""
+    global _client
+    if _client is None:
+        http2 = HTTP2_ENABLED
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 not installed, cloud OCR requests fall back to HTTP/1.1")
+                http2 = False
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+
+@asynccontextmanager
+async def provider_slot(provider_name: str):
+    """Hold one of a provider's in-flight slots (must be used on the client loop)"""
+    slot = _slots.get(provider_name)
+    if slot is None:
+        slot = _slots[provider_name] = asyncio.Semaphore(get_inflight_limit(provider_name))
+    async with slot:
+        yield
+
+
+async def _post(
+    provider_name: str,
+    url: str,
+    json: Any,
+    headers: Optional[Dict[str, str]],
+    timeout: float,
+    api_key: Optional[str]
+) -> httpx.Response:
+    async def send() -> httpx.Response:
+        # Hold an in-flight slot only while the request is on the wire, not during backoff
+        async with provider_slot(provider_name):
+            return await _get_client().post(url, json=json, headers=headers, timeout=timeout)
+
+    return await send_with_resilience(provider_name, api_key, send)
+
+
+async def post_json(
+    provider_name: str,
+    url: str,
+    json: Any,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 60,
+    api_key: Optional[str] = None
+) -> httpx.Response:
+    """
+    POST a JSON body through the shared client, within the provider's in-flight limit.
+
+    api_key selects the rate-limit bucket (each vendor key is throttled on its own).
+    Safe to await from any event loop; the request itself always runs on the
+    client loop.
+    """
+    coro = _post(provider_name, url, json, headers, timeout, api_key)
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine on the client loop from synchronous code and wait for it.
+    
+    If the calling task is cancelled meanwhile, the coroutine (and any request
+    it has in flight) is cancelled and TaskCancelledError is raised.
+    """
+    return wait_cancellable(asyncio.run_coroutine_threadsafe(coro, _get_loop()))
+
+
+def close_http_client():
+    """Close the shared client (application shutdown)"""
+    global _client
+    if _loop is None or _client is None:
+        return
+    client, _client = _client, None
+    try:
+        run_sync(client.aclose())
+    except Exception as e:
+        logger.warning(f"Error closing HTTP client: {e}")
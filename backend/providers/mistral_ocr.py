@@ -1,34 +1,32 @@
 """
 Mistral OCR Provider - AI-powered OCR using Mistral's Pixtral vision model
 """
-import base64
+import os
+import asyncio
 import logging
-import requests
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
-from .base import BaseOCRProvider, OCRResult, OCRTextBlock
-from utils.image import load_image_from_bytes, resize_for_ocr
+from .base import BaseOCRProvider, OCRResult
+from .http_client import post_json, run_sync
+from .multipage import MultiPagePromptMixin, TRUNCATED
+from utils.image import ImageInput, encode_base64_for_api
 
 logger = logging.getLogger(__name__)
 
-MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+# Overridable so a local mock server can stand in for the API
+MISTRAL_API_URL = os.environ.get("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/completions")
 
-# Connection pooling for faster repeated requests
-_session: requests.Session = None
+DEFAULT_PROMPT = "Extract all text from this image. Return only the extracted text, preserving the original layout as much as possible. Do not add any explanations."
 
-def _get_session() -> requests.Session:
-    """Get or create a reusable session for connection pooling."""
-    global _session
-    if _session is None:
-        _session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(pool_connections=5, pool_maxsize=10)
-        _session.mount('https://', adapter)
-    return _session
 
-
-class MistralOCRProvider(BaseOCRProvider):
+class MistralOCRProvider(MultiPagePromptMixin, BaseOCRProvider):
     """Mistral Pixtral AI-powered OCR - Good for complex documents"""
     
+    # Pixtral accepts up to 8 images per request
+    max_images_per_prompt = 8
+    max_completion_tokens = 8192
+    default_prompt = DEFAULT_PROMPT
+    
     @property
     def name(self) -> str:
         return "mistral_ocr"
@@ -62,14 +60,32 @@ class MistralOCRProvider(BaseOCRProvider):
                     "type": "string",
                     "title": "Custom Prompt",
                     "description": "Custom instruction for text extraction",
-                    "default": "Extract all text from this image. Return only the extracted text, preserving the original layout as much as possible. Do not add any explanations."
+                    "default": DEFAULT_PROMPT
+                },
+                "multi_page": {
+                    "type": "boolean",
+                    "title": "Multi-page Prompts",
+                    "description": "Send several PDF pages per request (fewer round-trips); pages are re-sent one by one if the reply can't be split",
+                    "default": False
                 }
             },
             "required": ["api_key"]
         }
     
-    def process(self, file_bytes: bytes, config: Dict[str, Any] = None) -> OCRResult:
+    @property
+    def supports_async(self) -> bool:
+        return True
+    
+    def process(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
         """Process image using Mistral Pixtral API"""
+        return run_sync(self.aprocess(file_bytes, config))
+    
+    def process_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """Process several images with concurrent API requests"""
+        return run_sync(self.aprocess_batch(pages, config))
+    
+    async def aprocess(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
+        """Process image using Mistral Pixtral API (non-blocking)"""
         config = config or {}
         api_key = config.get("api_key", "")
         
@@ -83,76 +99,13 @@ class MistralOCRProvider(BaseOCRProvider):
             )
         
         try:
-            # Load and resize image for faster transmission
-            img = load_image_from_bytes(file_bytes)
-            img = resize_for_ocr(img, max_width=1600, max_height=1600)
-            
-            # Use JPEG encoding for smaller file size
-            import cv2
-            _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            image_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            model = config.get("model", "pixtral-12b-2409")
-            prompt = config.get("prompt", "Extract all text from this image. Return only the extracted text, preserving the original layout as much as possible. Do not add any explanations.")
-            
-            # Prepare request
-            payload = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 4096
-            }
-            
-            # Use connection pooling for faster repeated requests
-            session = _get_session()
-            response = session.post(
-                MISTRAL_API_URL,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code != 200:
-                error_msg = response.json().get("message", "Unknown error")
-                raise Exception(f"Mistral API error: {error_msg}")
-            
-            result = response.json()
-            
-            # Parse response
-            extracted_text = ""
-            if "choices" in result and result["choices"]:
-                message = result["choices"][0].get("message", {})
-                extracted_text = message.get("content", "")
-            
-            # Mistral returns full text, not individual blocks
-            details = [OCRTextBlock(
-                text=extracted_text,
-                confidence=0.9,
-                box=None
-            )] if extracted_text else []
-            
-            return OCRResult(
-                status="success",
-                raw_text=extracted_text,
-                details=details,
-                provider=self.name
-            )
+            # Decode, resize and JPEG-encode off the event loop
+            image_base64 = await asyncio.to_thread(encode_base64_for_api, file_bytes)
+            prompt = config.get("prompt", DEFAULT_PROMPT)
+            extracted_text, finish_reason = await self._complete([image_base64], prompt, config, max_tokens=4096)
+            if finish_reason == TRUNCATED:
+                logger.warning("Mistral reply hit the token limit, page text may be incomplete")
+            return self._text_result(extracted_text)
             
         except Exception as e:
             logger.error(f"Mistral OCR Error: {str(e)}")
@@ -164,6 +117,61 @@ class MistralOCRProvider(BaseOCRProvider):
                 error=str(e)
             )
     
+    async def _complete(
+        self, images: List[str], prompt: str, config: Dict[str, Any], max_tokens: int
+    ) -> Tuple[str, Optional[str]]:
+        """Send one chat completion with the prompt and base64 JPEG images, return the reply text and finish_reason"""
+        api_key = config.get("api_key", "")
+        model = config.get("model", "pixtral-12b-2409")
+        
+        # Prepare request
+        payload = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        }
+                    ] + [
+                        {
+                            "type": "image_url",
+                            "image_url": f"data:image/jpeg;base64,{image_base64}"
+                        }
+                        for image_base64 in images
+                    ]
+                }
+            ],
+            "max_tokens": max_tokens
+        }
+        
+        # Shared HTTP/2 client, within this provider's in-flight limit
+        response = await post_json(
+            self.name,
+            MISTRAL_API_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json=payload,
+            timeout=60 + 30 * (len(images) - 1),
+            api_key=api_key
+        )
+        
+        if response.status_code != 200:
+            error_msg = response.json().get("message", "Unknown error")
+            raise Exception(f"Mistral API error: {error_msg}")
+        
+        result = response.json()
+        
+        # Parse response
+        if "choices" in result and result["choices"]:
+            choice = result["choices"][0]
+            return choice.get("message", {}).get("content", ""), choice.get("finish_reason")
+        return "", None
+    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """Validate API key is present"""
         return bool(config.get("api_key"))
@@ -0,0 +1,151 @@
+"""
+Multi-Page Prompts - Pack several pages into one vision-LLM request
+
+Chat-style vision providers (Groq, Mistral) normally send one image per
+completion. With "multi_page" enabled in the provider config, consecutive
+pages are sent together (up to the model's image limit) with instructions to
+separate them with page markers, and the reply is split back into per-page
+results. Pages the reply cannot be cleanly attributed to, and the last page of
+a reply cut off by the token limit, are re-sent one per request.
+"""
+import re
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base import OCRResult, OCRTextBlock
+from utils.image import ImageInput, encode_base64_for_api
+
+logger = logging.getLogger(__name__)
+
+PAGE_MARKER = "=== PAGE {n} ==="
+_MARKER_RE = re.compile(r"^[ \t]*=+[ \t]*PAGE[ \t]+(\d+)[ \t]*=+[ \t]*$", re.MULTILINE | re.IGNORECASE)
+
+# Completion budget per page in a packed request
+TOKENS_PER_PAGE = 4096
+
+# finish_reason of a completion that stopped at max_tokens
+TRUNCATED = "length"
+
+
+def build_multipage_prompt(prompt: str, page_count: int) -> str:
+    """Wrap the single-page instruction with page-delimiting instructions"""
+    return (
+        f"The following {page_count} images are consecutive pages of one document. "
+        f"{prompt}\n\n"
+        f"Process every page in order. Before the text of each page, output a line "
+        f"containing only \"{PAGE_MARKER.format(n='N')}\" where N is the page number "
+        f"(1 to {page_count}). Output the marker even if a page has no text."
+    )
+
+
+def split_multipage_reply(reply: str, page_count: int) -> Optional[Dict[int, str]]:
+    """
+    Split a packed reply into per-page text.
+
+    Returns {page_number: text} (1-based) for the pages that were delimited,
+    which may be a prefix of the pages if the reply was truncated, or None if
+    the markers are ambiguous (out of order, repeated or out of range).
+    """
+    markers = list(_MARKER_RE.finditer(reply or ""))
+    numbers = [int(m.group(1)) for m in markers]
+    if not numbers or numbers != list(range(1, len(numbers) + 1)) or len(numbers) > page_count:
+        return None
+
+    pages = {}
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(reply)
+        pages[numbers[i]] = reply[marker.end():end].strip()
+    return pages
+
+
+class MultiPagePromptMixin(ABC):
+    """
+    Multi-page mode for chat-style vision providers
+
+    Providers set max_images_per_prompt and default_prompt, and implement
+    _complete(images, prompt, config, max_tokens) returning the reply text
+    and the completion's finish_reason.
+    """
+
+    # Images the model accepts in one message
+    max_images_per_prompt: int = 1
+    # Completion token ceiling for one request
+    max_completion_tokens: int = 4096
+    default_prompt: str = ""
+
+    @abstractmethod
+    async def _complete(
+        self, images: List[str], prompt: str, config: Dict[str, Any], max_tokens: int
+    ) -> Tuple[str, Optional[str]]:
+        """Send base64 JPEG images with a prompt, return the reply text and finish_reason"""
+        pass
+
+    def _text_result(self, text: str) -> OCRResult:
+        # Vision LLMs return full text, not individual blocks
+        details = [OCRTextBlock(
+            text=text,
+            confidence=0.9,
+            box=None
+        )] if text else []
+
+        return OCRResult(
+            status="success",
+            raw_text=text,
+            details=details,
+            provider=self.name
+        )
+
+    async def aprocess_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """Process pages, packing them into multi-image requests when multi_page is enabled"""
+        config = config or {}
+        group_size = self.max_images_per_prompt
+        if not config.get("multi_page") or not config.get("api_key") or len(pages) < 2 or group_size < 2:
+            return await super().aprocess_batch(pages, config)
+
+        results: List[Optional[OCRResult]] = [None] * len(pages)
+        groups = [list(range(i, min(i + group_size, len(pages)))) for i in range(0, len(pages), group_size)]
+        await asyncio.gather(*(self._process_group(group, pages, config, results) for group in groups))
+        return results
+
+    async def _process_group(
+        self,
+        group: List[int],
+        pages: List[ImageInput],
+        config: Dict[str, Any],
+        results: List[Optional[OCRResult]]
+    ):
+        """One packed request for a group of pages, with per-page fallback"""
+        split: Dict[int, str] = {}
+        if len(group) > 1:
+            try:
+                images = await asyncio.gather(
+                    *(asyncio.to_thread(encode_base64_for_api, pages[pos]) for pos in group)
+                )
+                prompt = build_multipage_prompt(config.get("prompt", self.default_prompt), len(group))
+                max_tokens = min(self.max_completion_tokens, TOKENS_PER_PAGE * len(group))
+                reply, finish_reason = await self._complete(images, prompt, config, max_tokens)
+                split = split_multipage_reply(reply, len(group)) or {}
+                if finish_reason == TRUNCATED and split:
+                    # The reply stopped at max_tokens, so the last delimited page may be cut off
+                    split.pop(max(split))
+                if len(split) < len(group):
+                    logger.warning(
+                        f"{self.display_name}: packed reply covered {len(split)}/{len(group)} pages, "
+                        f"re-sending the rest one per request"
+                    )
+            except Exception as e:
+                logger.warning(f"{self.display_name}: packed request failed ({e}), falling back to per-page requests")
+
+        fallback = []
+        for number, pos in enumerate(group, 1):
+            if number in split:
+                results[pos] = self._text_result(split[number])
+            else:
+                fallback.append(pos)
+
+        if fallback:
+            fresh = await asyncio.gather(*(self.aprocess(pages[pos], config) for pos in fallback))
+            for pos, result in zip(fallback, fresh):
+                results[pos] = result
@@ -1,22 +1,150 @@
 """
 PaddleOCR Provider - Local OCR using PaddlePaddle
 """
+import os
+import copy
 import logging
-from typing import Dict, Any, List
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
 from paddleocr import PaddleOCR
 
 from .base import BaseOCRProvider, OCRResult, OCRTextBlock
-from utils.image import load_image_from_bytes, preprocess_for_ocr, resize_for_ocr
+from utils.image import ImageInput, load_image, preprocess_for_ocr, resize_for_ocr
 
 logger = logging.getLogger(__name__)
 
+# Text-line crops per recognizer forward pass
+REC_BATCH_SIZE = int(os.environ.get("OCR_REC_BATCH_SIZE", 24))
+
+# process_batch runs recognition once this many crops (from any number of pages) are queued
+REC_FLUSH_CROPS = int(os.environ.get("OCR_REC_FLUSH_CROPS", 256))
+
+# Maximum PaddleOCR engines (idle + in use) held by one process
+ENGINE_POOL_SIZE = int(os.environ.get("OCR_ENGINE_POOL_SIZE", 2))
+
+
+class PaddleEnginePool:
+    """
+    Bounded pool of PaddleOCR engines keyed by (lang, use_angle_cls, use_gpu)
+    
+    Engines are checked out exclusively for one job and returned afterwards,
+    so concurrent jobs never share an engine or rebuild one mid-inference.
+    When the pool is full, an idle engine of the least recently used key is
+    evicted to make room; if every engine is in use, callers wait.
+    """
+    
+    def __init__(self, max_engines: int = ENGINE_POOL_SIZE, cpu_threads: Optional[int] = None):
+        self.max_engines = max(1, max_engines)
+        # Intra-op threads per engine (None = PaddleOCR default)
+        self._cpu_threads = cpu_threads
+        self._idle: "OrderedDict[tuple, List[PaddleOCR]]" = OrderedDict()  # LRU first
+        self._total = 0
+        self._cond = threading.Condition()
+    
+    @staticmethod
+    def engine_key(config: Dict[str, Any]) -> tuple:
+        """Engine settings that require a separate model instance"""
+        return (
+            config.get("lang", "latin"),
+            bool(config.get("use_angle_cls", True)),
+            bool(config.get("use_gpu", False))
+        )
+    
+    def _build(self, key: tuple) -> PaddleOCR:
+        lang, use_angle_cls, use_gpu = key
+        logger.info(f"Initializing PaddleOCR with lang='{lang}'...")
+        engine_kwargs = {"rec_batch_num": REC_BATCH_SIZE}
+        if self._cpu_threads:
+            engine_kwargs["cpu_threads"] = self._cpu_threads
+        engine = PaddleOCR(
+            use_angle_cls=use_angle_cls,
+            lang=lang,
+            show_log=False,
+            use_gpu=use_gpu,
+            **engine_kwargs
+        )
+        logger.info("PaddleOCR initialized successfully.")
+        return engine
+    
+    def _evict_idle(self) -> bool:
+        """Drop one idle engine of the least recently used key (lock held)"""
+        for key, engines in self._idle.items():
+            engines.pop()
+            if not engines:
+                del self._idle[key]
+            self._total -= 1
+            logger.info(f"Evicted PaddleOCR engine {key}")
+            return True
+        return False
+    
+    def _acquire(self, key: tuple) -> PaddleOCR:
+        with self._cond:
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    engine = idle.pop()
+                    if not idle:
+                        del self._idle[key]
+                    return engine
+                if self._total < self.max_engines or self._evict_idle():
+                    # Reserve the slot, then build outside the lock
+                    self._total += 1
+                    break
+                self._cond.wait()
+        
+        try:
+            return self._build(key)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify_all()
+            raise
+    
+    def _release(self, key: tuple, engine: PaddleOCR):
+        with self._cond:
+            self._idle.setdefault(key, []).append(engine)
+            self._idle.move_to_end(key)
+            self._cond.notify_all()
+    
+    @contextmanager
+    def checkout(self, config: Dict[str, Any]) -> Iterator[PaddleOCR]:
+        """Borrow an engine matching config for the duration of the block"""
+        key = self.engine_key(config)
+        engine = self._acquire(key)
+        try:
+            yield engine
+        finally:
+            self._release(key, engine)
+    
+    def preload(self, configs: List[Dict[str, Any]]):
+        """Build (or keep warm) an engine for each config"""
+        if len(configs) > self.max_engines:
+            logger.warning(
+                f"Preloading {len(configs)} PaddleOCR engines but the pool holds {self.max_engines} "
+                f"(raise OCR_ENGINE_POOL_SIZE)"
+            )
+        for config in configs:
+            with self.checkout(config):
+                pass
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "engines": self._total,
+                "idle": {"/".join(map(str, key)): len(engines) for key, engines in self._idle.items()},
+                "max_engines": self.max_engines
+            }
+
 
 class PaddleOCRProvider(BaseOCRProvider):
     """PaddleOCR implementation - Free, local OCR"""
     
-    def __init__(self):
-        self._ocr_engine = None
-        self._current_lang = None
+    def __init__(self, cpu_threads: Optional[int] = None):
+        self._engines = PaddleEnginePool(cpu_threads=cpu_threads)
     
     @property
     def name(self) -> str:
@@ -30,6 +158,10 @@ class PaddleOCRProvider(BaseOCRProvider):
     def requires_api_key(self) -> bool:
         return False
     
+    @property
+    def supports_tiling(self) -> bool:
+        return True
+    
     def get_config_schema(self) -> Dict[str, Any]:
         return {
             "type": "object",
@@ -52,44 +184,64 @@ class PaddleOCRProvider(BaseOCRProvider):
                     "title": "Use GPU",
                     "description": "Enable GPU acceleration",
                     "default": False
+                },
+                "tiled": {
+                    "type": "boolean",
+                    "title": "Tiled Mode",
+                    "description": "Read very large images (drawings, posters) as overlapping full-resolution tiles instead of downscaling them",
+                    "default": True
                 }
             }
         }
     
-    def _get_engine(self, config: Dict[str, Any]) -> PaddleOCR:
-        """Get or create PaddleOCR engine with specified config"""
-        lang = config.get("lang", "latin")
-        
-        # Reinitialize if language changed
-        if self._ocr_engine is None or self._current_lang != lang:
-            logger.info(f"Initializing PaddleOCR with lang='{lang}'...")
-            self._ocr_engine = PaddleOCR(
-                use_angle_cls=config.get("use_angle_cls", True),
-                lang=lang,
-                show_log=False,
-                use_gpu=config.get("use_gpu", False)
+    @staticmethod
+    def preload_configs(provider_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Engine configs to load at startup: the configured language plus any
+        extra languages listed under "preload_langs" in config.json
+        """
+        provider_config = provider_config or {"lang": "latin"}
+        configs = [provider_config]
+        for lang in provider_config.get("preload_langs", []):
+            configs.append({**provider_config, "lang": lang})
+        return configs
+    
+    def preload(self, configs: List[Dict[str, Any]]):
+        """Load engines ahead of the first request"""
+        self._engines.preload(configs)
+    
+    def process(self, file_bytes: ImageInput, config: Dict[str, Any] = None) -> OCRResult:
+        """Process image using PaddleOCR (decoded images skip the decode)"""
+        try:
+            img = load_image(file_bytes)
+        except Exception as e:
+            logger.error(f"PaddleOCR Error: {str(e)}")
+            return OCRResult(
+                status="failed",
+                raw_text="",
+                details=[],
+                provider=self.name,
+                error=str(e)
             )
-            self._current_lang = lang
-            logger.info("PaddleOCR initialized successfully.")
-        
-        return self._ocr_engine
+        return self.process_image(img, config)
     
-    def process(self, file_bytes: bytes, config: Dict[str, Any] = None) -> OCRResult:
-        """Process image using PaddleOCR"""
+    def process_image(self, img: np.ndarray, config: Dict[str, Any] = None) -> OCRResult:
+        """Process an already-decoded image (BGR) using PaddleOCR"""
         config = config or {}
         
         try:
-            # Load, resize, and preprocess image
-            img = load_image_from_bytes(file_bytes)
-            img = resize_for_ocr(img)  # Resize for faster processing
+            # Resize and preprocess image
+            # Resize for faster processing (pages rendered at an adaptive DPI
+            # are already sized for the recognizer and pass a larger limit)
+            max_side = config.get("max_image_side", 1800)
+            img = resize_for_ocr(img, max_width=max_side, max_height=max_side)
             img_processed = preprocess_for_ocr(img, grayscale=True)
             
-            # Get OCR engine
-            ocr = self._get_engine(config)
-            
-            # Run OCR - use angle classification from config (default False for speed)
+            # Run OCR on an engine borrowed from the pool
+            # Use angle classification from config (default False for speed)
             use_angle_cls = config.get("use_angle_cls", False)
-            result = ocr.ocr(img_processed, cls=use_angle_cls)
+            with self._engines.checkout(config) as ocr:
+                result = ocr.ocr(img_processed, cls=use_angle_cls)
             
             # Parse results
             details: List[OCRTextBlock] = []
@@ -123,6 +275,138 @@ class PaddleOCRProvider(BaseOCRProvider):
                 error=str(e)
             )
     
+    def _prepare_image(self, page: ImageInput, config: Dict[str, Any]) -> np.ndarray:
+        """Decode, resize and preprocess one page the same way process_image does"""
+        img = load_image(page)
+        max_side = config.get("max_image_side", 1800)
+        img = resize_for_ocr(img, max_width=max_side, max_height=max_side)
+        img = preprocess_for_ocr(img, grayscale=True)
+        # The detector and recognizer expect 3 channels
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return img
+    
+    def _detect(self, ocr: PaddleOCR, img: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Run text detection on one page, returning line boxes and their crops"""
+        from tools.infer.predict_system import sorted_boxes
+        from tools.infer.utility import get_rotate_crop_image, get_minarea_rect_crop
+        
+        dt_boxes, _ = ocr.text_detector(img)
+        if dt_boxes is None or len(dt_boxes) == 0:
+            return [], []
+        
+        boxes = sorted_boxes(dt_boxes)
+        crop = get_rotate_crop_image if getattr(ocr.args, "det_box_type", "quad") == "quad" else get_minarea_rect_crop
+        crops = [crop(img, copy.deepcopy(box)) for box in boxes]
+        return boxes, crops
+    
+    def _recognize_pending(
+        self,
+        ocr: PaddleOCR,
+        pending: List[Tuple[int, List[np.ndarray], List[np.ndarray]]],
+        results: List[Optional[OCRResult]],
+        use_angle_cls: bool
+    ):
+        """Recognize the queued crops of several pages in one batch and build their results"""
+        all_crops = [crop for _, _, crops in pending for crop in crops]
+        try:
+            rec_res = []
+            if all_crops:
+                if use_angle_cls and getattr(ocr, "text_classifier", None) is not None:
+                    all_crops, _, _ = ocr.text_classifier(all_crops)
+                rec_res, _ = ocr.text_recognizer(all_crops)
+        except Exception as e:
+            logger.error(f"PaddleOCR Error: {str(e)}")
+            for pos, _, _ in pending:
+                results[pos] = OCRResult(
+                    status="failed",
+                    raw_text="",
+                    details=[],
+                    provider=self.name,
+                    error=str(e)
+                )
+            return
+        
+        offset = 0
+        for pos, boxes, crops in pending:
+            details: List[OCRTextBlock] = []
+            full_text: List[str] = []
+            for box, (text, conf) in zip(boxes, rec_res[offset:offset + len(crops)]):
+                if conf < ocr.drop_score:
+                    continue
+                details.append(OCRTextBlock(
+                    text=text,
+                    confidence=float(conf),
+                    box=box.tolist()
+                ))
+                full_text.append(text)
+            offset += len(crops)
+            
+            results[pos] = OCRResult(
+                status="success",
+                raw_text="\n".join(full_text),
+                details=details,
+                provider=self.name
+            )
+    
+    def process_batch(self, pages: List[ImageInput], config: Dict[str, Any] = None) -> List[OCRResult]:
+        """
+        Process several pages, sharing recognizer batches across them
+        
+        Detection runs page by page and its line crops are queued; once
+        REC_FLUSH_CROPS crops are waiting they are recognized together, so
+        short pages do not leave the recognizer running tiny batches.
+        Pages may be encoded bytes or decoded BGR images.
+        """
+        config = config or {}
+        
+        try:
+            with self._engines.checkout(config) as ocr:
+                return self._process_batch_with(ocr, pages, config)
+        except Exception as e:
+            logger.error(f"PaddleOCR Error: {str(e)}")
+            return [
+                OCRResult(status="failed", raw_text="", details=[], provider=self.name, error=str(e))
+                for _ in pages
+            ]
+    
+    def _process_batch_with(
+        self,
+        ocr: PaddleOCR,
+        pages: List[ImageInput],
+        config: Dict[str, Any]
+    ) -> List[OCRResult]:
+        """process_batch on a checked-out engine"""
+        results: List[Optional[OCRResult]] = [None] * len(pages)
+        use_angle_cls = config.get("use_angle_cls", False)
+        pending: List[Tuple[int, List[np.ndarray], List[np.ndarray]]] = []
+        pending_crops = 0
+        
+        for pos, page in enumerate(pages):
+            try:
+                boxes, crops = self._detect(ocr, self._prepare_image(page, config))
+            except Exception as e:
+                logger.error(f"PaddleOCR Error: {str(e)}")
+                results[pos] = OCRResult(
+                    status="failed",
+                    raw_text="",
+                    details=[],
+                    provider=self.name,
+                    error=str(e)
+                )
+                continue
+            
+            pending.append((pos, boxes, crops))
+            pending_crops += len(crops)
+            if pending_crops >= REC_FLUSH_CROPS:
+                self._recognize_pending(ocr, pending, results, use_angle_cls)
+                pending, pending_crops = [], 0
+        
+        if pending:
+            self._recognize_pending(ocr, pending, results, use_angle_cls)
+        
+        return results
+    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """PaddleOCR doesn't require API key, always valid"""
         return True
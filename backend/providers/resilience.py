@@ -0,0 +1,252 @@
+"""
+Provider Resilience - Throttling, retries and circuit breaking for cloud OCR APIs
+
+Every cloud request passes through send_with_resilience():
+  - a token bucket per (provider, API key) paces requests; a 429 halves its
+    rate and pauses it for Retry-After, successes slowly raise it back, so
+    large batches settle at the vendor's sustained rate
+  - 429/5xx responses and transport errors are retried with jittered
+    exponential backoff, honouring Retry-After, within a total time budget;
+    read timeouts (the vendor took the request and stalled) are not retried
+  - a circuit breaker per provider fast-fails while a vendor is down
+
+Everything here runs on the shared HTTP client loop (see http_client), so
+no locking is needed.
+"""
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Requests per second per (provider, API key); override per provider with
+# OCR_RATE_LIMIT_<PROVIDER> (e.g. OCR_RATE_LIMIT_GROQ_VISION=0.5)
+DEFAULT_RATE_LIMIT = float(os.environ.get("OCR_RATE_LIMIT", 10))
+RATE_BURST_SECONDS = 2.0
+MIN_RATE = 0.1
+
+MAX_ATTEMPTS = int(os.environ.get("OCR_RETRY_ATTEMPTS", 4))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# No retry is started once this many seconds have gone into a request (attempts and backoff)
+RETRY_DEADLINE = float(os.environ.get("OCR_RETRY_DEADLINE", 90))
+
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = int(os.environ.get("OCR_BREAKER_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.environ.get("OCR_BREAKER_RESET", 30))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ProviderUnavailableError(Exception):
+    """Raised without calling the vendor while its circuit is open"""
+    pass
+
+
+def get_rate_limit(provider_name: str) -> float:
+    """Configured maximum requests per second for one API key of a provider"""
+    return float(os.environ.get(f"OCR_RATE_LIMIT_{provider_name.upper()}", DEFAULT_RATE_LIMIT))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (seconds or HTTP date) as seconds from now"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, BACKOFF_BASE)
+    return delay
+
+
+class TokenBucket:
+    """Adaptive token bucket (AIMD): halves on 429, creeps back up on success"""
+
+    def __init__(self, max_rate: float):
+        self.max_rate = max(MIN_RATE, max_rate)
+        self.rate = self.max_rate
+        self.capacity = max(1.0, self.max_rate * RATE_BURST_SECONDS)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_throttled = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait for a token"""
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self, retry_after: Optional[float]):
+        """The vendor rate-limited this key: slow down and pause"""
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        self.tokens = min(self.tokens, 0.0)
+        # Requests already in flight get 429s too; halve once per burst, not per response
+        if now - self._last_throttled < RATE_BURST_SECONDS:
+            return
+        self._last_throttled = now
+        self.rate = max(MIN_RATE, self.rate / 2)
+        logger.info(f"Rate limited, throttling to {self.rate:.2f} req/s")
+
+    def succeeded(self):
+        """Additive increase back towards the configured rate"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class CircuitBreaker:
+    """Per-provider breaker: closed -> open after repeated failures -> half-open trial"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now (half-open lets one trial through)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            # One trial at a time; a trial that never reported back is abandoned after reset_seconds
+            now = time.monotonic()
+            if self._trial_started is None or now - self._trial_started >= self.reset_seconds:
+                self._trial_started = now
+                return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_started is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit opened after {self.failures} consecutive failure(s)")
+            self.opened_at = time.monotonic()
+        self._trial_started = None
+
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_bucket(provider_name: str, api_key: Optional[str]) -> TokenBucket:
+    """Token bucket for one API key of a provider (keys are hashed, never stored)"""
+    key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    bucket = _buckets.get((provider_name, key_id))
+    if bucket is None:
+        bucket = _buckets[(provider_name, key_id)] = TokenBucket(get_rate_limit(provider_name))
+    return bucket
+
+
+def get_breaker(provider_name: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider_name)
+    if breaker is None:
+        breaker = _breakers[provider_name] = CircuitBreaker()
+    return breaker
+
+
+async def send_with_resilience(
+    provider_name: str,
+    api_key: Optional[str],
+    send: Callable[[], Awaitable[httpx.Response]]
+) -> httpx.Response:
+    """
+    Send a request with throttling, retries and circuit breaking.
+
+    Returns the final response (possibly still an error status once retries
+    are exhausted, so the provider reports the vendor's message). Raises
+    ProviderUnavailableError while the circuit is open, or the last transport
+    error if every attempt failed to connect, a read timed out, or the retry
+    deadline ran out.
+    """
+    breaker = get_breaker(provider_name)
+    bucket = get_bucket(provider_name, api_key)
+    deadline = time.monotonic() + RETRY_DEADLINE
+
+    def can_retry(attempt: int, delay: float) -> bool:
+        return attempt < MAX_ATTEMPTS - 1 and time.monotonic() + delay < deadline
+
+    for attempt in range(MAX_ATTEMPTS):
+        if not breaker.allow():
+            raise ProviderUnavailableError(f"{provider_name} is temporarily unavailable (circuit open)")
+        await bucket.acquire()
+
+        try:
+            response = await send()
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            breaker.record_failure()
+            delay = backoff_delay(attempt)
+            # A stalled read already cost a full timeout; leave it to hedging, don't repeat it
+            if isinstance(e, httpx.ReadTimeout) or not can_retry(attempt, delay):
+                raise
+            logger.warning(f"{provider_name} request failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code not in RETRY_STATUSES:
+            breaker.record_success()
+            bucket.succeeded()
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if response.status_code == 429:
+            # Rate limiting says nothing about vendor health
+            breaker.record_success()
+            bucket.throttled(retry_after)
+        else:
+            breaker.record_failure()
+        delay = backoff_delay(attempt, retry_after)
+        if not can_retry(attempt, delay):
+            return response
+
+        logger.warning(f"{provider_name} returned {response.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    return response
+
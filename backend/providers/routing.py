@@ -0,0 +1,289 @@
+"""
+Provider Routing - Latency/error-aware routing with hedged requests
+
+Every OCR call is timed per provider, keeping a rolling window of per-page
+latencies (call time / pages in the call) and outcomes. With a hedge policy
+(per API key: a fallback provider and an hourly budget of fallback pages):
+  - a primary that is failing most of its recent calls is skipped in favour
+    of the fallback
+  - a primary call still running after the provider's p95 latency (per page,
+    times the pages in the call) gets a duplicate sent to the fallback; the
+    first good answer wins and the losing call is cancelled
+  - a primary that fails outright is retried once on the fallback
+
+Every call sent to the fallback (reroute, hedge or failover) is charged to
+the budget in pages, so the budget bounds the extra cost routing can add for
+each key. Once it is spent, calls stay on the primary.
+"""
+import os
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from .cancellation import CancelToken, TaskCancelledError, cancel_scope, current_token, submit_in_context
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Rolling window per provider
+STATS_WINDOW_SECONDS = 600
+STATS_WINDOW_SIZE = 500
+
+# Samples needed before percentiles and error rates drive routing
+MIN_SAMPLES = 20
+
+HEDGE_PERCENTILE = 95
+MIN_HEDGE_DELAY = 0.5
+
+# A provider failing more than this share of recent calls is routed around
+UNHEALTHY_ERROR_RATE = 0.5
+
+# Pages sent to the fallback provider per API key per hour
+DEFAULT_HEDGE_BUDGET = int(os.environ.get("OCR_HEDGE_BUDGET_PER_HOUR", 60))
+HEDGE_WORKERS = int(os.environ.get("OCR_HEDGE_WORKERS", 32))
+
+
+@dataclass
+class HedgePolicy:
+    """Per-API-key hedging policy (budget_per_hour counts pages sent to the fallback)"""
+    fallback_provider: str
+    budget_per_hour: int = DEFAULT_HEDGE_BUDGET
+    key_id: str = ""
+
+    @classmethod
+    def from_api_key(cls, api_key: Dict[str, Any]) -> Optional["HedgePolicy"]:
+        """Policy from an API key record, or None if the key does not hedge"""
+        fallback = (api_key or {}).get("hedge_provider", "")
+        if not fallback:
+            return None
+        budget = api_key.get("hedge_budget_per_hour")
+        return cls(
+            fallback_provider=fallback,
+            budget_per_hour=DEFAULT_HEDGE_BUDGET if budget is None else int(budget),
+            key_id=api_key.get("id", "") or ""
+        )
+
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider"""
+
+    def __init__(self):
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=STATS_WINDOW_SIZE)  # (at, latency per page, ok)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._samples.append((time.time(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.time() - STATS_WINDOW_SECONDS
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = self._recent()
+        if not samples:
+            return {"count": 0, "error_rate": 0.0, "p50": None, "p95": None, "p99": None}
+        latencies = [latency for _, latency, ok in samples if ok]
+        errors = len(samples) - len(latencies)
+        snapshot = {"count": len(samples), "error_rate": round(errors / len(samples), 4)}
+        percentiles = np.percentile(latencies, [50, 95, 99]) if latencies else [None] * 3
+        for name, value in zip(("p50", "p95", "p99"), percentiles):
+            snapshot[name] = None if value is None else round(float(value), 3)
+        return snapshot
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latency percentile of successful calls, or None without enough samples"""
+        latencies = [latency for _, latency, ok in self._recent() if ok]
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return float(np.percentile(latencies, p))
+
+    def error_rate(self) -> Optional[float]:
+        samples = self._recent()
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return sum(1 for _, _, ok in samples if not ok) / len(samples)
+
+
+def _is_good(result: Any) -> bool:
+    """A successful OCRResult, or a list of them (batch)"""
+    if isinstance(result, list):
+        return bool(result) and all(_is_good(r) for r in result)
+    return getattr(result, "status", None) == "success"
+
+
+class ProviderRouter:
+    """Times provider calls and hedges slow ones"""
+
+    def __init__(self, max_workers: int = HEDGE_WORKERS):
+        self._stats: Dict[str, ProviderStats] = {}
+        self._hedges: Dict[str, Deque[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-hedge")
+
+    def _provider_stats(self, name: str) -> ProviderStats:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = ProviderStats()
+            return stats
+
+    def is_healthy(self, name: str) -> bool:
+        error_rate = self._provider_stats(name).error_rate()
+        return error_rate is None or error_rate <= UNHEALTHY_ERROR_RATE
+
+    def hedge_delay(self, name: str, pages: int = 1) -> Optional[float]:
+        """How long to wait for a call of `pages` pages before hedging (p95 per page), or None if unknown"""
+        p95 = self._provider_stats(name).percentile(HEDGE_PERCENTILE)
+        return None if p95 is None else max(MIN_HEDGE_DELAY, p95 * pages)
+
+    def _take_hedge_budget(self, policy: HedgePolicy, pages: int = 1) -> bool:
+        """Spend `pages` fallback pages from the key's hourly budget"""
+        now = time.time()
+        with self._lock:
+            used = self._hedges.setdefault(policy.key_id, deque())
+            while used and used[0][0] < now - 3600:
+                used.popleft()
+            if sum(count for _, count in used) + pages > policy.budget_per_hour:
+                return False
+            used.append((now, pages))
+            return True
+
+    def _timed(self, name: str, fn: Callable[[], T], pages: int = 1) -> T:
+        start = time.monotonic()
+        try:
+            result = fn()
+        except TaskCancelledError:
+            # Says nothing about the provider
+            raise
+        except Exception:
+            self._provider_stats(name).record((time.monotonic() - start) / pages, False)
+            raise
+        self._provider_stats(name).record((time.monotonic() - start) / pages, _is_good(result))
+        return result
+
+    def _cancellable(self, name: str, call: Callable[[str], T], pages: int) -> Tuple[Future, CancelToken]:
+        """Submit one hedged call under its own cancel token (also cancelled with the task)"""
+        parent = current_token()
+        token = CancelToken(lambda: parent is not None and parent.cancelled)
+
+        def run() -> T:
+            with cancel_scope(token):
+                return self._timed(name, lambda: call(name), pages)
+
+        return submit_in_context(self._executor, run), token
+
+    def run(
+        self,
+        primary: str,
+        call: Callable[[str], T],
+        policy: Optional[HedgePolicy] = None,
+        is_available: Callable[[str], bool] = lambda name: True,
+        pages: int = 1
+    ) -> Tuple[T, str]:
+        """
+        Run call(provider_name) on the primary provider, hedging per policy.
+
+        Args:
+            primary: Requested provider
+            call: Performs the OCR work on the named provider
+            policy: Hedge policy of the API key (None = no routing, just timing)
+            is_available: Whether a provider can serve the request (enabled, configured)
+            pages: Pages the call recognises (latency and fallback budget are per page)
+
+        Returns:
+            (result, name of the provider that produced it)
+        """
+        fallback = None
+        if policy and policy.fallback_provider != primary and is_available(policy.fallback_provider):
+            fallback = policy.fallback_provider
+
+        pages = max(1, pages)
+        if fallback is None:
+            return self._timed(primary, lambda: call(primary), pages), primary
+
+        # Route around a primary that is mostly failing (while the budget lasts)
+        if not self.is_healthy(primary) and self.is_healthy(fallback) and self._take_hedge_budget(policy, pages):
+            logger.warning(f"Routing around unhealthy provider {primary} to {fallback}")
+            return self._timed(fallback, lambda: call(fallback), pages), fallback
+
+        future, token = self._cancellable(primary, call, pages)
+        futures = {future: primary}
+        tokens = [token]
+        delay = self.hedge_delay(primary, pages)
+        done, _ = wait(futures, timeout=delay)
+        if not done and self._take_hedge_budget(policy, pages):
+            logger.info(f"{primary} slower than its p{HEDGE_PERCENTILE} ({delay:.1f}s), hedging to {fallback}")
+            future, token = self._cancellable(fallback, call, pages)
+            futures[future] = fallback
+            tokens.append(token)
+
+        # First good answer wins; otherwise prefer the primary's answer
+        answers: Dict[str, Any] = {}
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures[future]
+                    try:
+                        result = future.result()
+                    except TaskCancelledError:
+                        raise
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    if _is_good(result):
+                        return result, name
+                    answers[name] = result
+        finally:
+            # The losing call (if still running) stops instead of being paid for in full
+            for token in tokens:
+                token.cancel()
+
+        # Nothing good yet and the fallback was never tried: fail over (while the budget lasts)
+        if fallback not in futures.values() and self._take_hedge_budget(policy, pages):
+            try:
+                result = self._timed(fallback, lambda: call(fallback), pages)
+                if _is_good(result):
+                    return result, fallback
+                answers.setdefault(fallback, result)
+            except Exception as e:
+                error = error or e
+
+        if primary in answers:
+            return answers[primary], primary
+        if answers:
+            name, result = next(iter(answers.items()))
+            return result, name
+        raise error
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Rolling stats per provider"""
+        with self._lock:
+            names = list(self._stats)
+        return {name: self._provider_stats(name).snapshot() for name in names}
+
+
+_router: Optional[ProviderRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """Get the process-wide provider router"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter()
+    return _router
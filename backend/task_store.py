@@ -0,0 +1,512 @@
+"""
+OCR Task Store - Shared, bounded storage for OCR task state and results
+
+The default backend is a SQLite file in WAL mode, so every uvicorn worker
+sees the same tasks. Results are stored as zlib-compressed JSON and tasks
+are evicted by age (TTL) and by count, so memory does not grow with usage;
+only finished tasks are evicted, never ones that are still queued or running.
+Status and the cancel flag are columns written in single statements, so a
+cancel from one worker is never lost to a progress update from another.
+Pages of a multi-page task are stored as they finish, so clients can read
+them before the whole document is done.
+Select the backend with OCR_TASK_STORE ("sqlite" or "memory").
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from utils.packing import ResultQuery, pack_result, unpack_result
+
+logger = logging.getLogger(__name__)
+
+TASK_STORE_BACKEND = os.environ.get("OCR_TASK_STORE", "sqlite")
+TASK_DB_PATH = os.environ.get("OCR_TASK_DB", "./ocr_tasks.db")
+
+# Tasks older than this (seconds since last update) are evicted
+TASK_TTL_SECONDS = int(os.environ.get("OCR_TASK_TTL", 24 * 3600))
+
+# Hard cap on stored tasks; oldest are evicted first
+MAX_TASKS = int(os.environ.get("OCR_TASK_MAX", 5000))
+
+# Tasks left pending/processing this long (worker gone, e.g. after a restart) are evicted too
+ORPHAN_TTL_SECONDS = int(os.environ.get("OCR_TASK_ORPHAN_TTL", 7 * 24 * 3600))
+
+# Minimum seconds between opportunistic eviction sweeps
+EVICT_INTERVAL = 60
+
+# Tasks in these states are finished and may be evicted
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class BaseTaskStore(ABC):
+    """Abstract task store shared by the upload, status and result endpoints"""
+
+    def __init__(
+        self,
+        ttl_seconds: int = TASK_TTL_SECONDS,
+        max_tasks: int = MAX_TASKS,
+        orphan_ttl_seconds: int = ORPHAN_TTL_SECONDS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_tasks = max_tasks
+        self.orphan_ttl_seconds = max(orphan_ttl_seconds, ttl_seconds)
+        self._last_evict = 0.0
+
+    def _expired(self, status: str, updated_at: float) -> bool:
+        """Finished tasks expire after the TTL; unfinished ones only once orphaned"""
+        ttl = self.ttl_seconds if status in TERMINAL_STATUSES else self.orphan_ttl_seconds
+        return time.time() - updated_at > ttl
+
+    @abstractmethod
+    def create(self, task_id: str, meta: Dict[str, Any]) -> None:
+        """Create a task in "pending" state with the given metadata"""
+        pass
+
+    @abstractmethod
+    def update(self, task_id: str, **fields) -> None:
+        """
+        Atomically merge fields (status, error, metadata) into an existing task.
+        The status of a cancelled task is not changed.
+        """
+        pass
+
+    @abstractmethod
+    def request_cancel(self, task_id: str) -> bool:
+        """
+        Mark an unfinished task as cancelled (status and the cancel_requested flag,
+        in one write). Returns False if the task is missing or already finished.
+        """
+        pass
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get task metadata and status (without the result payload)"""
+        pass
+
+    @abstractmethod
+    def set_result(self, task_id: str, result: Dict[str, Any], status: str = "completed") -> None:
+        """Store the task result and mark the task with the given status, unless cancelled (drops partial pages)"""
+        pass
+
+    @abstractmethod
+    def set_page_result(self, task_id: str, page: int, result: Dict[str, Any]) -> None:
+        """Store the result of one finished page (1-based) of a running task"""
+        pass
+
+    @abstractmethod
+    def get_page_results(
+        self,
+        task_id: str,
+        start: int = 1,
+        end: Optional[int] = None,
+        mode: str = "full",
+        query: Optional[ResultQuery] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """Get the finished pages of a running task within [start, end], keyed by page number"""
+        pass
+
+    @abstractmethod
+    def get_result(
+        self, task_id: str, mode: str = "full", query: Optional[ResultQuery] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get the stored task result in an output mode (utils.packing.OUTPUT_MODES), optionally narrowed by a query"""
+        pass
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        """Delete a task and its result"""
+        pass
+
+    @abstractmethod
+    def add_event(self, task_id: str, event: Dict[str, Any]) -> int:
+        """Append a progress event for stream subscribers. Returns its sequence number."""
+        pass
+
+    @abstractmethod
+    def get_events(self, task_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Get events with sequence number greater than `after`, oldest first"""
+        pass
+
+    @abstractmethod
+    def evict(self) -> int:
+        """Evict expired tasks and enforce the size cap on finished ones. Returns number removed."""
+        pass
+
+    def _maybe_evict(self):
+        """Run an eviction sweep at most once per EVICT_INTERVAL"""
+        now = time.time()
+        if now - self._last_evict < EVICT_INTERVAL:
+            return
+        self._last_evict = now
+        try:
+            removed = self.evict()
+            if removed:
+                logger.info(f"Task store evicted {removed} task(s)")
+        except Exception as e:
+            logger.error(f"Task store eviction error: {e}")
+
+
+class SQLiteTaskStore(BaseTaskStore):
+    """SQLite-backed task store, safe to share across worker processes"""
+
+    def __init__(self, path: str = TASK_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                meta TEXT NOT NULL,
+                error TEXT,
+                result BLOB,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(ocr_tasks)")}
+        if "cancel_requested" not in columns:
+            # Databases created before cancellation became a column
+            conn.execute("ALTER TABLE ocr_tasks ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_tasks_updated ON ocr_tasks (updated_at)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_task_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_task_events_task ON ocr_task_events (task_id, seq)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_task_pages (
+                task_id TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                result BLOB NOT NULL,
+                PRIMARY KEY (task_id, page)
+            )
+            """
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def create(self, task_id: str, meta: Dict[str, Any]) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO ocr_tasks (task_id, status, meta, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (task_id, "pending", json.dumps(meta), now, now)
+        )
+        conn.commit()
+        self._maybe_evict()
+
+    def update(self, task_id: str, **fields) -> None:
+        status = fields.pop("status", None)
+        error = fields.pop("error", None)
+        conn = self._conn()
+        with conn:
+            # One statement, so concurrent writers (progress vs. cancel) cannot undo each other
+            conn.execute(
+                "UPDATE ocr_tasks SET meta = json_patch(meta, ?), "
+                "status = CASE WHEN cancel_requested THEN status ELSE COALESCE(?, status) END, "
+                "error = COALESCE(?, error), updated_at = ? WHERE task_id = ?",
+                (json.dumps(fields), status, error, time.time(), task_id)
+            )
+
+    def request_cancel(self, task_id: str) -> bool:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "UPDATE ocr_tasks SET cancel_requested = 1, status = 'cancelled', updated_at = ? "
+                "WHERE task_id = ? AND status NOT IN ('completed', 'failed')",
+                (time.time(), task_id)
+            )
+        return cur.rowcount > 0
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT status, cancel_requested, meta, error, created_at, updated_at FROM ocr_tasks WHERE task_id = ?",
+            (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, cancel_requested, meta, error, created_at, updated_at = row
+        if self._expired(status, updated_at):
+            return None
+        task = json.loads(meta)
+        task.update({
+            "status": status,
+            "cancel_requested": bool(cancel_requested),
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at
+        })
+        return task
+
+    def set_result(self, task_id: str, result: Dict[str, Any], status: str = "completed") -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE ocr_tasks SET status = CASE WHEN cancel_requested THEN status ELSE ? END, "
+                "result = ?, updated_at = ? WHERE task_id = ?",
+                (status, pack_result(result), time.time(), task_id)
+            )
+            conn.execute("DELETE FROM ocr_task_pages WHERE task_id = ?", (task_id,))
+
+    def set_page_result(self, task_id: str, page: int, result: Dict[str, Any]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_task_pages (task_id, page, result) VALUES (?, ?, ?)",
+                (task_id, page, pack_result(result))
+            )
+
+    def get_page_results(
+        self,
+        task_id: str,
+        start: int = 1,
+        end: Optional[int] = None,
+        mode: str = "full",
+        query: Optional[ResultQuery] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT page, result FROM ocr_task_pages WHERE task_id = ? AND page >= ? AND page <= ? ORDER BY page",
+            (task_id, start, end if end is not None else 2 ** 31)
+        ).fetchall()
+        return {page: unpack_result(blob, mode, query) for page, blob in rows}
+
+    def get_result(
+        self, task_id: str, mode: str = "full", query: Optional[ResultQuery] = None
+    ) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT result FROM ocr_tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return unpack_result(row[0], mode, query)
+
+    def delete(self, task_id: str) -> bool:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM ocr_tasks WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM ocr_task_events WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM ocr_task_pages WHERE task_id = ?", (task_id,))
+        return cur.rowcount > 0
+
+    def add_event(self, task_id: str, event: Dict[str, Any]) -> int:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO ocr_task_events (task_id, data) VALUES (?, ?)",
+                (task_id, json.dumps(event))
+            )
+        return cur.lastrowid
+
+    def get_events(self, task_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT seq, data FROM ocr_task_events WHERE task_id = ? AND seq > ? ORDER BY seq",
+            (task_id, after)
+        ).fetchall()
+        return [{**json.loads(data), "seq": seq} for seq, data in rows]
+
+    def evict(self) -> int:
+        conn = self._conn()
+        with conn:
+            # Pending and processing tasks are kept while they run (or until orphaned)
+            now = time.time()
+            expired = conn.execute(
+                "DELETE FROM ocr_tasks WHERE (status IN ('completed', 'failed', 'cancelled') AND updated_at < ?) "
+                "OR updated_at < ?",
+                (now - self.ttl_seconds, now - self.orphan_ttl_seconds)
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM ocr_tasks WHERE task_id IN ("
+                "SELECT task_id FROM ocr_tasks WHERE status IN ('completed', 'failed', 'cancelled') "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (max(0, self.max_tasks - self._count_unfinished(conn)),)
+            ).rowcount
+            if expired or overflow:
+                conn.execute(
+                    "DELETE FROM ocr_task_events WHERE task_id NOT IN (SELECT task_id FROM ocr_tasks)"
+                )
+                conn.execute(
+                    "DELETE FROM ocr_task_pages WHERE task_id NOT IN (SELECT task_id FROM ocr_tasks)"
+                )
+        return expired + overflow
+
+    @staticmethod
+    def _count_unfinished(conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COUNT(*) FROM ocr_tasks WHERE status NOT IN ('completed', 'failed', 'cancelled')"
+        ).fetchone()[0]
+
+
+class MemoryTaskStore(BaseTaskStore):
+    """In-process task store (single worker / development). Bounded like SQLite."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str, meta: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._tasks[task_id] = {
+                "meta": dict(meta), "status": "pending", "cancel_requested": False, "error": None,
+                "result": None, "events": [], "pages": {}, "created_at": now, "updated_at": now
+            }
+            self._tasks.move_to_end(task_id)
+        self._maybe_evict()
+
+    def update(self, task_id: str, **fields) -> None:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return
+            if fields.get("status") is not None and not entry["cancel_requested"]:
+                entry["status"] = fields["status"]
+            if fields.get("error") is not None:
+                entry["error"] = fields.pop("error")
+            fields.pop("status", None)
+            fields.pop("error", None)
+            entry["meta"].update(fields)
+            entry["updated_at"] = time.time()
+            self._tasks.move_to_end(task_id)
+
+    def request_cancel(self, task_id: str) -> bool:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None or entry["status"] in ("completed", "failed"):
+                return False
+            entry["cancel_requested"] = True
+            entry["status"] = "cancelled"
+            entry["updated_at"] = time.time()
+            self._tasks.move_to_end(task_id)
+            return True
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None or self._expired(entry["status"], entry["updated_at"]):
+                return None
+            task = dict(entry["meta"])
+            task.update({
+                "status": entry["status"],
+                "cancel_requested": entry["cancel_requested"],
+                "error": entry["error"],
+                "created_at": entry["created_at"],
+                "updated_at": entry["updated_at"]
+            })
+            return task
+
+    def set_result(self, task_id: str, result: Dict[str, Any], status: str = "completed") -> None:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return
+            entry["result"] = pack_result(result)
+            entry["pages"] = {}
+            if not entry["cancel_requested"]:
+                entry["status"] = status
+            entry["updated_at"] = time.time()
+            self._tasks.move_to_end(task_id)
+
+    def set_page_result(self, task_id: str, page: int, result: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is not None:
+                entry["pages"][page] = pack_result(result)
+
+    def get_page_results(
+        self,
+        task_id: str,
+        start: int = 1,
+        end: Optional[int] = None,
+        mode: str = "full",
+        query: Optional[ResultQuery] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            pages = dict(entry["pages"]) if entry else {}
+        return {
+            page: unpack_result(pages[page], mode, query) for page in sorted(pages)
+            if page >= start and (end is None or page <= end)
+        }
+
+    def get_result(
+        self, task_id: str, mode: str = "full", query: Optional[ResultQuery] = None
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            blob = entry["result"] if entry else None
+        return unpack_result(blob, mode, query)
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            return self._tasks.pop(task_id, None) is not None
+
+    def add_event(self, task_id: str, event: Dict[str, Any]) -> int:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return 0
+            entry["events"].append(dict(event))
+            return len(entry["events"])
+
+    def get_events(self, task_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            events = entry["events"][after:] if entry else []
+        return [{**event, "seq": after + i + 1} for i, event in enumerate(events)]
+
+    def evict(self) -> int:
+        removed = 0
+        with self._lock:
+            # Entries are kept in update order, so the oldest finished tasks go first
+            overflow = len(self._tasks) - self.max_tasks
+            for task_id, entry in list(self._tasks.items()):
+                terminal = entry["status"] in TERMINAL_STATUSES
+                if self._expired(entry["status"], entry["updated_at"]) or (terminal and overflow > 0):
+                    del self._tasks[task_id]
+                    removed += 1
+                    overflow -= 1
+        return removed
+
+
+_store: Optional[BaseTaskStore] = None
+
+
+def get_task_store() -> BaseTaskStore:
+    """Get the process-wide task store (backend chosen by OCR_TASK_STORE)"""
+    global _store
+    if _store is None:
+        if TASK_STORE_BACKEND == "memory":
+            _store = MemoryTaskStore()
+        else:
+            _store = SQLiteTaskStore()
+        logger.info(f"OCR task store: {type(_store).__name__}")
+    return _store
@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Tests import backend modules the way main.py does (backend/ is the app root)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MockAPI:
+    """
+    Local stand-in for a vendor API. Each POST is answered by `respond`
+    (path, parsed JSON body) -> (status, JSON reply); requests are recorded.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.respond = lambda path, body: (200, {})
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        self.url = None
+
+
+@pytest.fixture
+def mock_api():
+    api = MockAPI()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with api.lock:
+                api.requests.append((self.path, dict(self.headers), body))
+                api.in_flight += 1
+                api.peak_in_flight = max(api.peak_in_flight, api.in_flight)
+            try:
+                status, reply = api.respond(self.path, body)
+            finally:
+                with api.lock:
+                    api.in_flight -= 1
+            data = json.dumps(reply).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    api.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield api
+    server.shutdown()
+    server.server_close()
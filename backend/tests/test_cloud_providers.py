@@ -0,0 +1,130 @@
+import time
+
+import numpy as np
+import pytest
+
+from providers import google_vision, groq_vision, http_client
+from providers.google_vision import GoogleVisionProvider
+from providers.groq_vision import GroqVisionProvider
+from providers.base import BaseOCRProvider
+from providers.multipage import MultiPagePromptMixin
+
+
+def _chat_reply(text):
+    return {"choices": [{"message": {"content": text}, "finish_reason": "stop"}]}
+
+
+def _pages(count):
+    return [np.full((40, 60, 3), 255, dtype=np.uint8) for _ in range(count)]
+
+
+def test_async_batch_goes_through_the_shared_client(mock_api, monkeypatch):
+    monkeypatch.setattr(groq_vision, "GROQ_API_URL", f"{mock_api.url}/openai/v1/chat/completions")
+    mock_api.respond = lambda path, body: (200, _chat_reply("page text"))
+
+    results = GroqVisionProvider().process_batch(_pages(3), {"api_key": "test-key"})
+
+    assert [r.status for r in results] == ["success"] * 3
+    assert [r.raw_text for r in results] == ["page text"] * 3
+    assert len(mock_api.requests) == 3
+    assert all(headers["Authorization"] == "Bearer test-key" for _, headers, _ in mock_api.requests)
+
+
+def test_in_flight_requests_stay_within_the_provider_limit(mock_api, monkeypatch):
+    monkeypatch.setattr(groq_vision, "GROQ_API_URL", f"{mock_api.url}/openai/v1/chat/completions")
+    monkeypatch.setenv("OCR_MAX_INFLIGHT_GROQ_VISION", "2")
+    monkeypatch.delitem(http_client._slots, "groq_vision", raising=False)
+
+    def slow_reply(path, body):
+        time.sleep(0.1)
+        return 200, _chat_reply("ok")
+
+    mock_api.respond = slow_reply
+
+    results = GroqVisionProvider().process_batch(_pages(6), {"api_key": "limit-key"})
+
+    assert all(r.status == "success" for r in results)
+    assert mock_api.peak_in_flight == 2
+    monkeypatch.delitem(http_client._slots, "groq_vision", raising=False)
+
+
+def test_vendor_errors_become_failed_results(mock_api, monkeypatch):
+    monkeypatch.setattr(groq_vision, "GROQ_API_URL", f"{mock_api.url}/openai/v1/chat/completions")
+    mock_api.respond = lambda path, body: (400, {"error": {"message": "bad image"}})
+
+    result = GroqVisionProvider().process(_pages(1)[0], {"api_key": "test-key"})
+
+    assert result.status == "failed"
+    assert "bad image" in result.error
+
+
+def test_truncated_multipage_reply_resends_its_last_page(mock_api, monkeypatch):
+    monkeypatch.setattr(groq_vision, "GROQ_API_URL", f"{mock_api.url}/openai/v1/chat/completions")
+
+    def reply(path, body):
+        images = [c for c in body["messages"][0]["content"] if c["type"] == "image_url"]
+        if len(images) > 1:
+            # Cut off at max_tokens in the middle of page 2
+            return 200, {"choices": [{
+                "message": {"content": "=== PAGE 1 ===\nfirst page\n=== PAGE 2 ===\nsecond pa"},
+                "finish_reason": "length"
+            }]}
+        return 200, _chat_reply("re-sent page")
+
+    mock_api.respond = reply
+
+    results = GroqVisionProvider().process_batch(_pages(3), {"api_key": "test-key", "multi_page": True})
+
+    assert [r.raw_text for r in results] == ["first page", "re-sent page", "re-sent page"]
+    assert len(mock_api.requests) == 3
+
+
+def _annotation(text):
+    return {"textAnnotations": [
+        {"description": text},
+        {"description": text, "boundingPoly": {"vertices": [{"x": 1, "y": 2}, {"x": 9, "y": 2}, {"x": 9, "y": 8}, {"x": 1, "y": 8}]}}
+    ]}
+
+
+def test_google_batch_demultiplexes_annotate_responses(mock_api, monkeypatch):
+    monkeypatch.setattr(google_vision, "GOOGLE_VISION_API_URL", f"{mock_api.url}/v1/images:annotate")
+    monkeypatch.setattr(google_vision, "MAX_IMAGES_PER_REQUEST", 2)
+    mock_api.respond = lambda path, body: (200, {
+        "responses": [_annotation(f"page {len(mock_api.requests)}.{i}") for i in range(len(body["requests"]))]
+    })
+
+    results = GoogleVisionProvider().process_batch(_pages(3), {"api_key": "test-key"})
+
+    # Three pages, at most two per call
+    assert sorted(len(body["requests"]) for _, _, body in mock_api.requests) == [1, 2]
+    assert all(path.startswith("/v1/images:annotate?key=test-key") for path, _, _ in mock_api.requests)
+    assert [r.status for r in results] == ["success"] * 3
+    assert all(r.details[0].box == [[1, 2], [9, 2], [9, 8], [1, 8]] for r in results)
+
+
+def test_google_batch_marks_pages_missing_from_the_response_failed(mock_api, monkeypatch):
+    monkeypatch.setattr(google_vision, "GOOGLE_VISION_API_URL", f"{mock_api.url}/v1/images:annotate")
+    mock_api.respond = lambda path, body: (200, {"responses": [_annotation("first"), {}]})
+
+    results = GoogleVisionProvider().process_batch(_pages(3), {"api_key": "test-key"})
+
+    assert [r.status for r in results] == ["success", "success", "failed"]
+    assert results[0].raw_text == "first"
+    assert results[1].raw_text == ""
+    assert "no response" in results[2].error
+
+
+def test_multipage_provider_must_implement_complete():
+    class Incomplete(MultiPagePromptMixin, BaseOCRProvider):
+        name = "incomplete"
+        display_name = "Incomplete"
+        requires_api_key = False
+
+        def get_config_schema(self):
+            return {}
+
+        def process(self, file_bytes, config):
+            return None
+
+    with pytest.raises(TypeError, match="_complete"):
+        Incomplete()
@@ -0,0 +1,26 @@
+import ocr_cache
+from ocr_cache import make_cache_key
+
+
+def test_pipeline_settings_change_the_cache_key():
+    config = {"lang": "en", "api_key": "secret"}
+    text_layer = make_cache_key("abc", "paddle_ocr", config, {"text_layer": True, "adaptive_dpi": True})
+    no_text_layer = make_cache_key("abc", "paddle_ocr", config, {"text_layer": False, "adaptive_dpi": True})
+    fixed_dpi = make_cache_key("abc", "paddle_ocr", config, {"text_layer": True, "adaptive_dpi": False})
+
+    assert len({text_layer, no_text_layer, fixed_dpi}) == 3
+    assert make_cache_key("abc", "paddle_ocr", config) == make_cache_key("abc", "paddle_ocr", config, None)
+
+
+def test_result_and_page_caches_share_one_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(ocr_cache, "CACHE_DISK_BYTES", 1000)
+    monkeypatch.setattr(ocr_cache, "CACHE_MEMORY_BYTES", 100)
+    monkeypatch.setattr(ocr_cache, "PAGE_CACHE_SHARE", 0.25)
+    monkeypatch.setattr(ocr_cache, "_cache", None)
+    monkeypatch.setattr(ocr_cache, "_page_cache", None)
+
+    results, pages = ocr_cache.get_result_cache(), ocr_cache.get_page_cache()
+
+    assert (results.disk_bytes, pages.disk_bytes) == (750, 250)
+    assert (results.memory_bytes, pages.memory_bytes) == (75, 25)
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import numpy as np
+
+from ocr_pipeline import combine_page_results, run_page_pipeline, split_result_pages, to_reference_dpi
+from providers.base import OCRResult, OCRTextBlock
+from utils.packing import ResultQuery, pack_result, unpack_result
+
+
+def _page(text, status="success"):
+    return OCRResult(
+        status=status,
+        raw_text=text,
+        details=[OCRTextBlock(text=text, confidence=0.9)] if text else [],
+        provider="stub",
+        error=None if status == "success" else "upstream error"
+    )
+
+
+def test_combined_result_reports_failed_pages():
+    combined = combine_page_results({0: _page("one"), 1: _page("", "failed")}, "stub", 3)
+
+    assert combined["status"] == "partial"
+    assert combined["failed_pages"] == [2, 3]
+
+
+def test_combined_result_succeeds_when_every_page_does():
+    combined = combine_page_results({0: _page("one"), 1: _page("two")}, "stub", 2)
+
+    assert combined["status"] == "success"
+    assert combined["failed_pages"] == []
+    assert combined["raw_text"] == "--- Page 1 ---\none\n\n--- Page 2 ---\ntwo"
+
+
+def test_split_pages_keep_provider_text():
+    text_layer = OCRResult(
+        status="success", raw_text="Total due: 42", provider="pdf_text_layer",
+        details=[OCRTextBlock(text="Total", confidence=1.0), OCRTextBlock(text="due:", confidence=1.0),
+                 OCRTextBlock(text="42", confidence=1.0)]
+    )
+    blockless = OCRResult(status="success", raw_text="Summary paragraph", details=[], provider="stub")
+    combined = combine_page_results({0: text_layer, 1: blockless, 2: _page("", "failed")}, "stub", 3)
+
+    pages = split_result_pages(combined)
+
+    assert pages[1]["raw_text"] == "Total due: 42"
+    assert pages[2]["raw_text"] == "Summary paragraph"
+    assert pages[3]["status"] == "failed"
+    assert pages[3]["error"] == "upstream error"
+
+
+def test_page_range_selection_keeps_stored_page_text():
+    combined = combine_page_results({0: _page("one"), 1: _page("two"), 2: _page("three")}, "stub", 3)
+
+    selected = unpack_result(pack_result(combined), "full", ResultQuery(start_page=2, end_page=3))
+
+    assert selected["raw_text"] == "--- Page 2 ---\ntwo\n\n--- Page 3 ---\nthree"
+    assert {page: result["raw_text"] for page, result in split_result_pages(selected, 2, 3).items()} == {
+        2: "two", 3: "three"
+    }
+
+
+def test_confidence_filter_rebuilds_text_from_blocks():
+    sure = OCRResult(
+        status="success", raw_text="Invoice 42", provider="stub",
+        details=[OCRTextBlock(text="Invoice", confidence=0.95), OCRTextBlock(text="42", confidence=0.4)]
+    )
+    combined = combine_page_results({0: sure, 1: _page("two")}, "stub", 2)
+
+    selected = unpack_result(pack_result(combined), "text", ResultQuery(start_page=1, end_page=1, min_confidence=0.9))
+
+    assert selected["raw_text"] == "--- Page 1 ---\nInvoice"
+    assert selected["text_source"] == "blocks"
+    assert [entry["page"] for entry in selected["page_info"]] == [1]
+
+
+def test_page_boxes_share_the_reference_dpi():
+    rendered = OCRResult(
+        status="success", raw_text="Total", provider="stub",
+        details=[OCRTextBlock(text="Total", confidence=0.9, box=[[300, 600], [600, 600], [600, 750], [300, 750]])]
+    )
+    geometry = {"dpi": 200, "render_dpi": 300, "width": 1700, "height": 2200}
+
+    scaled = to_reference_dpi(rendered, geometry)
+    pages = split_result_pages(combine_page_results({0: scaled}, "stub", 1, {0: geometry}))
+
+    assert scaled.details[0].box == [[200.0, 400.0], [400.0, 400.0], [400.0, 500.0], [200.0, 500.0]]
+    assert pages[1]["dpi"] == 200 and pages[1]["render_dpi"] == 300
+    assert (pages[1]["width"], pages[1]["height"]) == (1700, 2200)
+
+
+def _rendered_pages(count, rendered, delay=0.0):
+    for page_index in range(count):
+        time.sleep(delay)
+        rendered.append(page_index)
+        yield page_index, np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+def test_pipeline_bounds_pages_in_flight_independent_of_batch_size():
+    rendered = []
+    done = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def process_batch(batch):
+        with lock:
+            peak[0] = max(peak[0], len(rendered) - len(done))
+        time.sleep(0.01)
+        with lock:
+            done.extend(batch)
+        return [_page(f"page {i}") for i, _ in batch]
+
+    results = run_page_pipeline(
+        _rendered_pages(40, rendered), process_batch=process_batch, max_workers=2, prefetch=2, batch_size=16
+    )
+
+    assert sorted(results) == list(range(40))
+    # max_workers + prefetch slots, plus the page rendered while waiting for one
+    assert peak[0] <= 5
+
+
+def test_pipeline_recognises_before_a_short_document_is_fully_rendered():
+    rendered = []
+    rendered_when_recognised = []
+
+    def process_batch(batch):
+        rendered_when_recognised.append(len(rendered))
+        return [_page("text") for _ in batch]
+
+    results = run_page_pipeline(
+        _rendered_pages(5, rendered, delay=0.02), process_batch=process_batch, max_workers=2, batch_size=16
+    )
+
+    assert len(results) == 5
+    assert rendered_when_recognised[0] < 5
+
+
+def test_tiles_run_on_the_shared_page_workers():
+    from ocr_tiling import process_tiled
+
+    threads = set()
+
+    def recognize_batch(tiles, config):
+        threads.add(threading.current_thread().name)
+        return [_page("tile") for _ in tiles]
+
+    img = np.zeros((3000, 3000, 3), dtype=np.uint8)
+    result = process_tiled(img, {}, recognize_batch, workers=2, provider_name="stub")
+
+    assert result.status == "success"
+    assert threads and all(name.startswith("ocr-page") for name in threads)
+
+
+def test_cancel_is_checked_between_text_layer_pages():
+    import pytest
+    from providers.cancellation import CancelToken, TaskCancelledError, cancel_scope
+
+    token = CancelToken()
+    done = []
+
+    def pages():
+        for i in range(100):
+            if i == 3:
+                token.cancel()
+            yield i, _page(f"text {i}")
+
+    with cancel_scope(token), pytest.raises(TaskCancelledError):
+        run_page_pipeline(pages(), lambda i, img: _page("ocr"), on_page_done=lambda i, r, n: done.append(i))
+
+    assert done == [0, 1, 2]
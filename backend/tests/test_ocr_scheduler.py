@@ -0,0 +1,106 @@
+import threading
+import time
+
+from ocr_scheduler import OCRScheduler, QueuePolicy
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _blocked(scheduler, release):
+    """Occupy the only slot until release is set"""
+    started = threading.Event()
+    scheduler.submit(QueuePolicy(key_id="gate"), lambda: (started.set(), release.wait()))
+    assert started.wait(5)
+
+
+def test_keys_share_slots_by_weight():
+    scheduler = OCRScheduler(slots=1, reserved=0)
+    release = threading.Event()
+    _blocked(scheduler, release)
+    order = []
+
+    heavy = QueuePolicy(key_id="heavy", weight=2)
+    light = QueuePolicy(key_id="light", weight=1)
+    # The light key submits more jobs, but jobs submitted do not buy slots
+    futures = [scheduler.submit(heavy, order.append, "heavy") for _ in range(6)]
+    futures += [scheduler.submit(light, order.append, "light") for _ in range(12)]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    first = order[:6]
+    assert first.count("heavy") == 4
+    assert first.count("light") == 2
+
+
+def test_interactive_jobs_run_before_bulk():
+    scheduler = OCRScheduler(slots=1, reserved=0)
+    release = threading.Event()
+    _blocked(scheduler, release)
+    order = []
+
+    bulk = scheduler.submit(QueuePolicy(key_id="batch", priority="bulk"), order.append, "bulk")
+    interactive = scheduler.submit(QueuePolicy(key_id="user"), order.append, "interactive")
+    release.set()
+    bulk.result(timeout=5)
+    interactive.result(timeout=5)
+
+    assert order == ["interactive", "bulk"]
+
+
+def test_bulk_jobs_leave_reserved_slots_free():
+    scheduler = OCRScheduler(slots=3, reserved=1)
+    release = threading.Event()
+    bulk = [
+        scheduler.submit(QueuePolicy(key_id=f"batch{i}", priority="bulk"), release.wait)
+        for i in range(3)
+    ]
+    _wait_for(lambda: scheduler.stats()["running_bulk"] == 2)
+
+    stats = scheduler.stats()
+    assert stats["running"] == 2
+    assert stats["queued"] == 1
+    # The reserved slot still takes an interactive arrival at once
+    assert scheduler.submit(QueuePolicy(key_id="user"), lambda: "done").result(timeout=5) == "done"
+
+    release.set()
+    for future in bulk:
+        future.result(timeout=5)
+
+
+def test_key_runs_at_most_max_concurrent_jobs():
+    scheduler = OCRScheduler(slots=4, reserved=0)
+    release = threading.Event()
+    capped = QueuePolicy(key_id="capped", max_concurrent=2)
+    futures = [scheduler.submit(capped, release.wait) for _ in range(4)]
+    _wait_for(lambda: scheduler.stats()["running"] == 2)
+
+    assert scheduler.stats()["keys"]["capped"] == {"priority": "interactive", "weight": 1, "running": 2, "queued": 2}
+    # Free slots still go to other keys
+    assert scheduler.submit(QueuePolicy(key_id="other"), lambda: "done").result(timeout=5) == "done"
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+
+def test_running_bulk_released_after_key_changes_priority():
+    scheduler = OCRScheduler(slots=2, reserved=1)
+    release = threading.Event()
+
+    bulk = scheduler.submit(QueuePolicy(key_id="key", priority="bulk"), release.wait)
+    interactive = scheduler.submit(QueuePolicy(key_id="key", priority="interactive"), lambda: "done")
+    assert interactive.result(timeout=5) == "done"
+
+    release.set()
+    bulk.result(timeout=5)
+    scheduler._executor.shutdown(wait=True)
+
+    stats = scheduler.stats()
+    assert stats["running"] == 0
+    assert stats["running_bulk"] == 0
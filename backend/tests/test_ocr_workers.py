@@ -0,0 +1,11 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_worker_initializer_module_loads_no_providers():
+    # Spawned workers import it before the thread caps are set; providers would load PaddlePaddle early
+    code = "import sys, ocr_worker_init; sys.exit('providers' in sys.modules or 'paddle' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR).returncode == 0
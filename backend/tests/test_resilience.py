@@ -0,0 +1,41 @@
+import asyncio
+
+import httpx
+import pytest
+
+from providers import resilience
+from providers.resilience import send_with_resilience
+
+
+def _send(outcomes, calls):
+    async def send():
+        calls.append(1)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+    return send
+
+
+def test_read_timeouts_are_not_retried():
+    calls = []
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(send_with_resilience("stub_read", "key", _send([httpx.ReadTimeout("stalled")], calls)))
+    assert len(calls) == 1
+
+
+def test_connect_errors_are_retried():
+    calls = []
+    response = asyncio.run(send_with_resilience(
+        "stub_connect", "key", _send([httpx.ConnectError("refused"), 200], calls)
+    ))
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_retries_stop_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_DEADLINE", 0.0)
+    calls = []
+    response = asyncio.run(send_with_resilience("stub_deadline", "key", _send([503], calls)))
+    assert response.status_code == 503
+    assert len(calls) == 1
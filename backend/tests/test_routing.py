@@ -0,0 +1,88 @@
+import threading
+import time
+
+from providers.base import OCRResult
+from providers.cancellation import current_token
+from providers.routing import MIN_SAMPLES, HedgePolicy, ProviderRouter
+
+
+def _ok(provider):
+    return OCRResult(status="success", raw_text="text", details=[], provider=provider)
+
+
+def _warm_up(router, name, latency_per_page):
+    for _ in range(MIN_SAMPLES):
+        router._provider_stats(name).record(latency_per_page, True)
+
+
+def test_latency_is_recorded_per_page():
+    router = ProviderRouter(max_workers=2)
+
+    router.run("slow", lambda name: (time.sleep(0.2), [_ok(name)] * 4)[1], pages=4)
+
+    latency = router._provider_stats("slow")._recent()[0][1]
+    assert 0.04 <= latency < 0.1
+
+
+def test_hedge_cancels_the_losing_call_and_spends_budget_in_pages():
+    router = ProviderRouter(max_workers=4)
+    _warm_up(router, "primary", 0.05)
+    policy = HedgePolicy(fallback_provider="fallback", budget_per_hour=6, key_id="key")
+    primary_cancelled = threading.Event()
+
+    def call(name):
+        if name == "fallback":
+            return [_ok(name)] * 4
+        while not current_token().cancelled:
+            time.sleep(0.01)
+        primary_cancelled.set()
+        return [_ok(name)] * 4
+
+    result, served_by = router.run("primary", call, policy, pages=4)
+
+    assert served_by == "fallback"
+    assert primary_cancelled.wait(2)
+    # 4 of 6 pages spent: a second 4-page hedge does not fit
+    assert not router._take_hedge_budget(policy, 4)
+    assert router._take_hedge_budget(policy, 2)
+
+
+def _fail(provider):
+    return OCRResult(status="failed", raw_text="", details=[], provider=provider, error="down")
+
+
+def _make_unhealthy(router, name):
+    for _ in range(MIN_SAMPLES):
+        router._provider_stats(name).record(0.01, False)
+
+
+def test_reroute_around_unhealthy_primary_spends_budget():
+    router = ProviderRouter(max_workers=2)
+    _make_unhealthy(router, "primary")
+    policy = HedgePolicy(fallback_provider="fallback", budget_per_hour=6, key_id="key")
+    calls = []
+
+    def call(name):
+        calls.append(name)
+        return [_ok(name)] * 4
+
+    assert router.run("primary", call, policy, pages=4)[1] == "fallback"
+    # 2 pages left: the next 4-page call stays on the (unhealthy) primary
+    assert router.run("primary", call, policy, pages=4)[1] == "primary"
+    assert calls == ["fallback", "primary"]
+
+
+def test_failover_spends_budget_and_stops_when_spent():
+    router = ProviderRouter(max_workers=2)
+    policy = HedgePolicy(fallback_provider="fallback", budget_per_hour=4, key_id="key")
+    calls = []
+
+    def call(name):
+        calls.append(name)
+        return [_fail(name) if name == "primary" else _ok(name)] * 4
+
+    assert router.run("primary", call, policy, pages=4)[1] == "fallback"
+    result, served_by = router.run("primary", call, policy, pages=4)
+    assert served_by == "primary"
+    assert result[0].status == "failed"
+    assert calls == ["primary", "fallback", "primary"]
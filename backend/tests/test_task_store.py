@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from task_store import MemoryTaskStore, SQLiteTaskStore
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    return MemoryTaskStore()
+
+
+def test_cancel_survives_concurrent_progress_updates(store):
+    for trial in range(30):
+        task_id = f"task-{trial}"
+        store.create(task_id, {"filename": "doc.pdf"})
+        started = threading.Event()
+
+        def progress():
+            for page in range(1, 51):
+                store.update(task_id, status=f"processed {page}/50 pages", processed_pages=page)
+                started.set()
+
+        worker = threading.Thread(target=progress)
+        worker.start()
+        started.wait()
+        assert store.request_cancel(task_id)
+        worker.join()
+
+        task = store.get(task_id)
+        assert task["cancel_requested"] is True
+        assert task["status"] == "cancelled"
+        assert task["processed_pages"] == 50
+        assert task["filename"] == "doc.pdf"
+
+
+def test_cancel_does_not_override_result_or_finished_task(store):
+    store.create("running", {})
+    store.request_cancel("running")
+    store.set_result("running", {"raw_text": "late"})
+    assert store.get("running")["status"] == "cancelled"
+
+    store.create("done", {})
+    store.set_result("done", {"raw_text": "ok"})
+    assert not store.request_cancel("done")
+    assert store.get("done")["status"] == "completed"
+
+
+def test_evict_keeps_unfinished_tasks(store):
+    store.max_tasks = 2
+    store.create("queued", {})
+    store.create("running", {})
+    store.update("running", status="processing")
+    for i in range(5):
+        store.create(f"done-{i}", {})
+        store.set_result(f"done-{i}", {"raw_text": ""})
+
+    store.evict()
+
+    assert store.get("queued")["status"] == "pending"
+    assert store.get("running")["status"] == "processing"
+    assert [i for i in range(5) if store.get(f"done-{i}")] == []
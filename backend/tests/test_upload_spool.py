@@ -0,0 +1,68 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+import upload_spool
+from upload_spool import UploadSizeLimitMiddleware, spool_upload
+
+
+def _client(tmp_path, monkeypatch, max_bytes=1024, path_limits=None):
+    monkeypatch.setattr(upload_spool, "UPLOAD_DIR", str(tmp_path))
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=max_bytes, path_limits=path_limits)
+    seen = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        spooled = await spool_upload(file)
+        seen.append(spooled)
+        return {"size": spooled.size}
+
+    @app.post("/batch")
+    async def batch(files: list[UploadFile] = File(...)):
+        return {"files": len(files)}
+
+    return TestClient(app), seen
+
+
+def test_declared_content_length_over_limit_is_rejected_before_parsing(tmp_path, monkeypatch):
+    client, seen = _client(tmp_path, monkeypatch)
+
+    response = client.post("/upload", files={"file": ("a.png", b"x" * 4096)})
+
+    assert response.status_code == 413
+    assert seen == []
+
+
+def test_streamed_body_is_cut_off_at_the_limit(tmp_path, monkeypatch):
+    client, seen = _client(tmp_path, monkeypatch)
+
+    def body():
+        # Chunked, so there is no Content-Length to check up front
+        for _ in range(64):
+            yield b"x" * 512
+
+    response = client.post(
+        "/upload", content=body(),
+        headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+
+    assert response.status_code == 413
+    assert seen == []
+
+
+def test_path_limit_overrides_default(tmp_path, monkeypatch):
+    client, _ = _client(tmp_path, monkeypatch, path_limits={"/batch": 64 * 1024})
+
+    files = [("files", ("a.png", b"x" * 2048)), ("files", ("b.png", b"x" * 2048))]
+    assert client.post("/batch", files=files).json() == {"files": 2}
+    assert client.post("/upload", files={"file": ("a.png", b"x" * 2048)}).status_code == 413
+
+
+def test_upload_within_limit_is_spooled(tmp_path, monkeypatch):
+    client, seen = _client(tmp_path, monkeypatch, max_bytes=64 * 1024)
+
+    response = client.post("/upload", files={"file": ("a.pdf", b"%PDF-1.4 body")})
+
+    assert response.json() == {"size": 13}
+    assert seen[0].is_pdf
+    assert seen[0].path.read_bytes() == b"%PDF-1.4 body"
@@ -0,0 +1,200 @@
+"""
+Upload Spooling - Keep uploaded files on disk instead of in memory
+
+Size limits are enforced on the request body by UploadSizeLimitMiddleware,
+before the multipart parser has buffered anything: a declared Content-Length
+over the limit is rejected at once, and a body that grows past it is cut off
+with a 413 as soon as it does. Single-file requests are limited to
+OCR_MAX_UPLOAD_MB; a batch request (several files) to OCR_MAX_BATCH_MB.
+
+The multipart parser keeps each file in an anonymous temporary file, which
+has no path. spool_upload copies it in fixed-size chunks to a named file in
+the spool directory, so a file is never held in memory as one bytes object:
+  - the SHA-256 used for result caching is computed on the way through
+  - downstream code gets the spooled path (pdf2image, pdfplumber, pikepdf)
+    and image decoding memory-maps the file
+
+A spooled upload belongs to the task it was queued for and is removed when
+the task finishes or is cancelled.
+
+Configure with:
+  OCR_UPLOAD_DIR       spool directory (default: <system temp>/ocr_uploads)
+  OCR_MAX_UPLOAD_MB    largest accepted upload (and single-file request body)
+  OCR_MAX_BATCH_MB     largest accepted batch request body
+"""
+import os
+import time
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+
+from typing import Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.environ.get("OCR_UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "ocr_uploads")
+MAX_UPLOAD_BYTES = int(float(os.environ.get("OCR_MAX_UPLOAD_MB", 200)) * 1024 * 1024)
+MAX_BATCH_BYTES = int(float(os.environ.get("OCR_MAX_BATCH_MB", 1024)) * 1024 * 1024)
+
+# Allowance for multipart boundaries, part headers and form fields in a request body
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Bytes copied per step
+CHUNK_SIZE = 1024 * 1024
+
+# Spooled files older than this were left behind by a crashed process
+STALE_SECONDS = 24 * 3600
+
+
+class SpooledUpload:
+    """An uploaded file spooled to disk"""
+
+    def __init__(self, path: Path, size: int, sha256: str, head: bytes):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.head = head
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.head.startswith(b'%PDF')
+
+    def discard(self):
+        """Remove the spooled file (safe to call more than once)"""
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not remove spooled upload {self.path}: {e}")
+
+
+def _too_large(max_bytes: int, what: str = "Request body") -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"{what} too large. Maximum is {max_bytes / (1024 * 1024):g} MB."
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping request bodies before they are parsed.
+
+    path_limits maps a path to its own limit (e.g. the batch endpoint);
+    every other request is capped at max_bytes.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+                 path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope["path"], self.max_bytes)
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            await self._reject(limit, scope, receive, send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the body parser; FastAPI turns it into the response
+                    raise _too_large(limit)
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            # Body read outside a route (e.g. by another middleware)
+            if e.status_code != 413 or started:
+                raise
+            await self._reject(limit, scope, receive, send)
+
+    @staticmethod
+    async def _reject(limit: int, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": _too_large(limit).detail})
+        await response(scope, receive, send)
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    """
+    Copy a parsed upload to a named file in the spool directory.
+
+    The request body was already capped by UploadSizeLimitMiddleware; the
+    per-file limit here matters for batch requests, whose body limit covers
+    several files.
+
+    Raises:
+        HTTPException 413 if the upload is larger than max_bytes
+    """
+    too_large = _too_large(max_bytes, f"File {file.filename}")
+    if getattr(file, "size", None) and file.size > max_bytes:
+        raise too_large
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    suffix = Path(file.filename or "").suffix[:10]
+    fd, name = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=UPLOAD_DIR)
+    path = Path(name)
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest(), head)
+
+
+def sweep_stale_uploads(max_age: float = STALE_SECONDS) -> int:
+    """Remove spooled files left behind by a process that died mid-task"""
+    spool_dir = Path(UPLOAD_DIR)
+    if not spool_dir.is_dir():
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in spool_dir.glob("upload_*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} stale spooled upload(s)")
+    return removed
+
@@ -1,13 +1,37 @@
 """
 Image utility functions for OCR preprocessing
 """
+import io
+import os
+import mmap
+import base64
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
 import cv2
 import numpy as np
-from pdf2image import convert_from_bytes
+from typing import Iterator, Optional, Tuple, Union
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_path
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Adaptive PDF rendering: probe at a low DPI, then render so that glyphs are
+# about TARGET_TEXT_HEIGHT pixels tall (~10pt text at 200 DPI)
+PROBE_DPI = 72
+TARGET_TEXT_HEIGHT = 20
+MIN_RENDER_DPI = 100
+MAX_RENDER_DPI = 400
+MAX_RENDER_SIDE = 4000
+
+# Image handed to a provider: encoded file bytes, an encoded file on disk
+# (Path, e.g. a spooled upload), or an already-decoded BGR image (ndarray,
+# or a memoryview over one) such as a rendered PDF page
+ImageInput = Union[bytes, memoryview, np.ndarray, Path]
+
+# PDF given as bytes or as a path to a file on disk
+PDFSource = Union[bytes, str, os.PathLike]
+
 
 def load_image_from_bytes(file_bytes: bytes, dpi: int = 200) -> np.ndarray:
     """
@@ -46,6 +70,59 @@ def load_image_from_bytes(file_bytes: bytes, dpi: int = 200) -> np.ndarray:
     return img
 
 
+def load_image_from_path(path: Union[str, os.PathLike], dpi: int = 200) -> np.ndarray:
+    """
+    Load an image file (or the first page of a PDF) from disk.
+    
+    The file is memory-mapped and decoded in place, so its encoded bytes are
+    never copied into the process heap.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Could not decode image (empty file)")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            img = cv2.imdecode(np.frombuffer(mapped, np.uint8), cv2.IMREAD_COLOR)
+            is_pdf_file = mapped[:4] == b'%PDF'
+    
+    if img is None:
+        if not is_pdf_file:
+            raise ValueError("Could not decode image (Not a valid Image or PDF)")
+        logger.info(f"Detected PDF file, converting to image with DPI {dpi}...")
+        img = render_pdf_page(str(path), 0, dpi)
+        if img is None:
+            raise ValueError("Could not convert PDF to image")
+    return img
+
+
+def load_image(image: ImageInput) -> np.ndarray:
+    """
+    Get a BGR image from a provider input without copying decoded buffers.
+    
+    Decoded images (ndarray, or a multi-dimensional memoryview over one) are
+    returned as-is; files on disk are decoded from a memory map; encoded
+    bytes are decoded with load_image_from_bytes.
+    """
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, Path):
+        return load_image_from_path(image)
+    if isinstance(image, memoryview):
+        if image.ndim >= 2:
+            return np.asarray(image)
+        image = image.tobytes()
+    return load_image_from_bytes(image)
+
+
+def get_image_size(source: Union[bytes, str, os.PathLike]) -> Optional[Tuple[int, int]]:
+    """(width, height) of an encoded image (bytes or file) from the header, without decoding pixels"""
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+            return img.size
+    except Exception:
+        return None
+
+
 def preprocess_for_ocr(img: np.ndarray, grayscale: bool = True) -> np.ndarray:
     """
     Apply preprocessing to improve OCR accuracy.
@@ -106,42 +183,124 @@ def encode_for_api(img: np.ndarray, format: str = "jpeg", quality: int = 85) ->
         return buffer.tobytes(), "image/png"
 
 
-def load_pdf_pages(file_bytes: bytes, dpi: int = 200, max_pages: int = 50) -> list:
+def encode_base64_for_api(image: ImageInput) -> str:
+    """
+    Encode an image as base64 JPEG for a cloud API (resized by encode_for_api
+    for faster transmission). Encoded bytes are decoded first; decoded pages
+    are compressed directly.
+    """
+    buffer, _ = encode_for_api(load_image(image))
+    return base64.b64encode(buffer).decode('utf-8')
+
+
+@contextmanager
+def spooled_pdf(file_bytes: PDFSource) -> Iterator[str]:
     """
-    Load all pages from a PDF file.
+    Yield a path to the PDF on disk.
     
-    Args:
-        file_bytes: Raw bytes of the PDF
-        dpi: DPI for rendering
-        max_pages: Maximum number of pages to process
-        
-    Returns:
-        List of OpenCV images (BGR format), one per page
+    A path is used as-is; bytes are written to a temp file once (removed on exit).
     """
+    if not isinstance(file_bytes, bytes):
+        with open(file_bytes, "rb") as f:
+            if f.read(4) != b'%PDF':
+                raise ValueError("Not a valid PDF file")
+        yield os.fspath(file_bytes)
+        return
+    
     if not file_bytes.startswith(b'%PDF'):
         raise ValueError("Not a valid PDF file")
     
-    logger.info(f"Converting PDF to images with DPI {dpi}...")
-    pil_images = convert_from_bytes(
-        file_bytes, 
-        dpi=dpi, 
-        thread_count=4
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(file_bytes)
+        pdf_path = tmp.name
+    try:
+        yield pdf_path
+    finally:
+        os.unlink(pdf_path)
+
+
+def get_pdf_page_count(file_bytes: PDFSource) -> int:
+    """Get the number of pages in a PDF without rendering it"""
+    with spooled_pdf(file_bytes) as pdf_path:
+        return int(pdfinfo_from_path(pdf_path).get("Pages", 0))
+
+
+def render_pdf_page(pdf_path: str, page_index: int, dpi: int = 200) -> Optional[np.ndarray]:
+    """Render a single PDF page (0-based) to an OpenCV image (BGR format)"""
+    pil_images = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_index + 1,
+        last_page=page_index + 1
     )
+    if not pil_images:
+        return None
+    return cv2.cvtColor(np.array(pil_images[0]), cv2.COLOR_RGB2BGR)
+
+
+def estimate_text_height(img: np.ndarray) -> Optional[float]:
+    """
+    Estimate the typical glyph height (pixels) of text in an image.
+    
+    Uses the median height of character-sized connected components of the
+    binarised image; returns None if no text-like components are found.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
     
-    # Limit pages
-    if len(pil_images) > max_pages:
-        logger.warning(f"PDF has {len(pil_images)} pages, limiting to {max_pages}")
-        pil_images = pil_images[:max_pages]
+    h, w = gray.shape[:2]
+    heights = []
+    for i in range(1, count):
+        comp_w, comp_h, area = stats[i, cv2.CC_STAT_WIDTH], stats[i, cv2.CC_STAT_HEIGHT], stats[i, cv2.CC_STAT_AREA]
+        # Skip specks, rules, borders and images
+        if comp_h < 3 or comp_h > h * 0.1 or comp_w > w * 0.2 or area < 4:
+            continue
+        if not 0.1 <= comp_w / comp_h <= 4.0:
+            continue
+        heights.append(comp_h)
     
-    logger.info(f"Extracted {len(pil_images)} page(s) from PDF")
+    if len(heights) < 10:
+        return None
+    return float(np.median(heights))
+
+
+def choose_render_dpi(probe_img: np.ndarray, probe_dpi: int = PROBE_DPI) -> int:
+    """
+    Choose the lowest DPI that renders text at TARGET_TEXT_HEIGHT pixels.
+    
+    Clamped to [MIN_RENDER_DPI, MAX_RENDER_DPI] and so that the longest page
+    side stays within MAX_RENDER_SIDE pixels.
+    """
+    text_height = estimate_text_height(probe_img)
+    if text_height is None:
+        # No detectable text (blank or pure image): render cheaply
+        dpi = MIN_RENDER_DPI
+    else:
+        dpi = probe_dpi * TARGET_TEXT_HEIGHT / text_height
     
-    # Convert to OpenCV format
-    images = []
-    for pil_image in pil_images:
-        img = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-        images.append(img)
+    page_side_inches = max(probe_img.shape[:2]) / probe_dpi
+    dpi = min(dpi, MAX_RENDER_SIDE / page_side_inches)
+    return int(max(MIN_RENDER_DPI, min(MAX_RENDER_DPI, dpi)))
+
+
+def render_pdf_page_adaptive(pdf_path: str, page_index: int) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Render a PDF page at a DPI chosen for its text size.
     
-    return images
+    A quick low-DPI probe render measures the text height, then the page is
+    rendered directly at the chosen DPI (no render-then-shrink).
+    
+    Returns:
+        Tuple of (OpenCV image in BGR format or None, DPI used)
+    """
+    probe = render_pdf_page(pdf_path, page_index, PROBE_DPI)
+    if probe is None:
+        return None, PROBE_DPI
+    dpi = choose_render_dpi(probe)
+    del probe
+    logger.info(f"Page {page_index + 1}: rendering at {dpi} DPI")
+    return render_pdf_page(pdf_path, page_index, dpi), dpi
 
 
 def is_pdf(file_bytes: bytes) -> bool:
@@ -0,0 +1,385 @@
+"""
+Compact serialisation helpers for stored OCR results
+
+OCR results are stored columnar rather than as one JSON document: the text
+blocks become a list of texts plus a float32 confidence array, an int32 page
+array and an int32 (N, 4, 2) box array. Each column is compressed on its own,
+so a text-only read decompresses just the small header and never builds the
+per-block dicts.
+"""
+import base64
+import json
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Result shapes served by the result endpoints
+OUTPUT_MODES = ("text", "lines", "full", "boxes")
+
+# Per-block fields a caller can select
+BLOCK_FIELDS = ("text", "confidence", "box", "page")
+
+_RESULT_MAGIC = b"OCRC1"
+_SECTION = struct.Struct("<I")
+
+# Box mask values
+_NO_BOX, _QUAD_BOX, _OTHER_BOX = 0, 1, 2
+
+
+def pack_json(data: Any) -> bytes:
+    """Serialise data to compact, zlib-compressed JSON"""
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 6)
+
+
+def unpack_json(blob: Optional[bytes]) -> Any:
+    """Inverse of pack_json (None passes through)"""
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob).decode())
+
+
+@dataclass
+class ResultQuery:
+    """
+    Which blocks of a stored result to return.
+
+    Blocks are selected by page range, minimum confidence and a region
+    (x0, y0, x1, y1) their box must intersect; fields limits the keys of each
+    returned block. A page range keeps each page's stored text; with a
+    confidence or region filter raw_text is rebuilt from the matching blocks
+    (one line per block) and the result says so with text_source="blocks".
+    """
+    start_page: Optional[int] = None
+    end_page: Optional[int] = None
+    min_confidence: Optional[float] = None
+    region: Optional[Tuple[float, float, float, float]] = None
+    fields: Optional[Tuple[str, ...]] = None
+
+    @property
+    def selects_blocks(self) -> bool:
+        return (
+            self.start_page is not None or self.end_page is not None
+            or self.min_confidence is not None or self.region is not None
+        )
+
+    @property
+    def filters_blocks(self) -> bool:
+        """Whether blocks are filtered by content (confidence, region), not just by page"""
+        return self.min_confidence is not None or self.region is not None
+
+
+def _section(data: bytes) -> bytes:
+    compressed = zlib.compress(data, 6)
+    return _SECTION.pack(len(compressed)) + compressed
+
+
+def pack_result(result: Dict[str, Any]) -> bytes:
+    """Serialise an OCR result dict (OCRResult.to_dict / combined pages) in columnar form"""
+    details = result.get("details") or []
+    header = {k: v for k, v in result.items() if k != "details"}
+    header["blocks"] = len(details)
+    header["has_pages"] = any("page" in d for d in details)
+
+    texts = [d.get("text", "") for d in details]
+    confidences = np.array([d.get("confidence", 0.0) for d in details], dtype="<f4")
+    pages = np.array([d.get("page", 0) for d in details], dtype="<i4")
+
+    mask = np.zeros(len(details), dtype=np.uint8)
+    quads = np.zeros((len(details), 4, 2), dtype="<i4")
+    other_boxes = {}
+    for i, d in enumerate(details):
+        box = d.get("box")
+        if box is None:
+            continue
+        if len(box) == 4 and all(len(p) == 2 for p in box):
+            mask[i] = _QUAD_BOX
+            quads[i] = np.rint(np.asarray(box, dtype=np.float64))
+        else:
+            mask[i] = _OTHER_BOX
+            other_boxes[str(i)] = box
+
+    return _RESULT_MAGIC + b"".join([
+        _section(json.dumps(header, separators=(",", ":")).encode()),
+        _section(json.dumps({"texts": texts, "other_boxes": other_boxes}, separators=(",", ":")).encode()),
+        _section(confidences.tobytes() + pages.tobytes()),
+        _section(mask.tobytes() + quads.tobytes())
+    ])
+
+
+def _read_sections(blob: bytes, count: int) -> List[bytes]:
+    """Decompress the first `count` sections of a packed result"""
+    sections = []
+    offset = len(_RESULT_MAGIC)
+    for _ in range(count):
+        (length,) = _SECTION.unpack_from(blob, offset)
+        offset += _SECTION.size
+        sections.append(zlib.decompress(blob[offset:offset + length]))
+        offset += length
+    return sections
+
+
+def _select(
+    query: ResultQuery,
+    confidences: np.ndarray,
+    pages: Optional[np.ndarray],
+    mask: Optional[np.ndarray],
+    quads: Optional[np.ndarray]
+) -> np.ndarray:
+    """Indices of the blocks matching a query, in stored order"""
+    lo, hi = 0, len(confidences)
+    if pages is not None:
+        # Blocks are stored in page order, so a page range is a contiguous slice
+        if query.start_page is not None:
+            lo = int(np.searchsorted(pages, query.start_page, side="left"))
+        if query.end_page is not None:
+            hi = int(np.searchsorted(pages, query.end_page, side="right"))
+    keep = np.zeros(len(confidences), dtype=bool)
+    keep[lo:hi] = True
+
+    if query.min_confidence is not None:
+        keep &= confidences >= query.min_confidence
+    if query.region is not None:
+        x0, y0, x1, y1 = query.region
+        keep &= mask == _QUAD_BOX
+        keep &= (
+            (quads[:, :, 0].max(axis=1) >= x0) & (quads[:, :, 0].min(axis=1) <= x1)
+            & (quads[:, :, 1].max(axis=1) >= y0) & (quads[:, :, 1].min(axis=1) <= y1)
+        )
+    return np.flatnonzero(keep)
+
+
+def join_page_texts(page_texts: Iterable[Tuple[int, str]]) -> Tuple[str, Dict[int, List[int]]]:
+    """
+    raw_text of a multi-page result ("--- Page n ---" markers, blank line
+    between pages) and the [start, end) span of each page's text within it.
+    Pages without text get no marker and no span.
+    """
+    parts = []
+    spans: Dict[int, List[int]] = {}
+    offset = 0
+    for page, text in page_texts:
+        if not text:
+            continue
+        marker = f"--- Page {page} ---\n"
+        if parts:
+            offset += 2
+        start = offset + len(marker)
+        parts.append(marker + text)
+        offset = start + len(text)
+        spans[page] = [start, offset]
+    return "\n\n".join(parts), spans
+
+
+def _slice_page_info(header: Dict[str, Any], query: ResultQuery, block_text: Optional[Dict[int, str]] = None) -> None:
+    """
+    Narrow a combined result's raw_text and page_info to the query's page
+    range. Each page keeps its stored text, or gets block_text[page] when given.
+    """
+    lo = query.start_page or 1
+    hi = query.end_page if query.end_page is not None else 2 ** 31
+    stored = header.get("raw_text") or ""
+    info = [dict(entry) for entry in header["page_info"] if lo <= entry["page"] <= hi]
+
+    def page_text(entry):
+        if block_text is not None:
+            return block_text.get(entry["page"], "")
+        span = entry.get("text_span")
+        return stored[span[0]:span[1]] if span else ""
+
+    header["raw_text"], spans = join_page_texts((entry["page"], page_text(entry)) for entry in info)
+    for entry in info:
+        entry["text_span"] = spans.get(entry["page"])
+    header["page_info"] = info
+
+
+def _block_text_by_page(texts: List[str], pages: List[int]) -> Dict[int, str]:
+    """Text of each page rebuilt from its blocks, one line per block"""
+    by_page: Dict[int, List[str]] = {}
+    for text, page in zip(texts, pages):
+        if text:
+            by_page.setdefault(page, []).append(text)
+    return {page: "\n".join(lines) for page, lines in by_page.items()}
+
+
+def _selected_text(texts: List[str], pages: Optional[List[int]]) -> str:
+    """raw_text for a selection of blocks, with page markers as in combined results"""
+    if pages is None:
+        return "\n".join(t for t in texts if t)
+    return join_page_texts(_block_text_by_page(texts, pages).items())[0]
+
+
+def unpack_result(
+    blob: Optional[bytes],
+    mode: str = "full",
+    query: Optional[ResultQuery] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Inverse of pack_result, shaped for an output mode (see shape_result) and
+    narrowed by an optional query.
+
+    Only the columns a mode and query need are decompressed, and the query is
+    evaluated on the packed columns, so per-block dicts are built only for
+    the blocks returned. Blobs written by pack_json are also accepted.
+    """
+    if blob is None:
+        return None
+    if not blob.startswith(_RESULT_MAGIC):
+        legacy = unpack_json(blob)
+        if query is None:
+            return shape_result(legacy, mode)
+        return unpack_result(pack_result(legacy), mode, query)
+
+    selecting = query is not None and query.selects_blocks
+    needed = {"text": 1, "lines": 3}.get(mode, 4)
+    if selecting:
+        needed = max(needed, 4 if query.region is not None else 3)
+    sections = _read_sections(blob, needed)
+    header = json.loads(sections[0])
+    count = header.pop("blocks")
+    has_pages = header.pop("has_pages")
+    if needed == 1:
+        return header
+
+    columns = json.loads(sections[1])
+    texts = columns["texts"]
+    other_boxes = columns["other_boxes"]
+    confidences = np.frombuffer(sections[2], dtype="<f4", count=count)
+    pages = np.frombuffer(sections[2], dtype="<i4", count=count, offset=4 * count) if has_pages else None
+    mask = quads = None
+    if needed == 4:
+        mask = np.frombuffer(sections[3], dtype=np.uint8, count=count)
+        quads = np.frombuffer(sections[3], dtype="<i4", offset=count).reshape(count, 4, 2)
+
+    if selecting:
+        index = _select(query, confidences, pages, mask, quads)
+        index_list = index.tolist()
+        texts = [texts[i] for i in index_list]
+        other_boxes = {str(n): other_boxes[str(i)] for n, i in enumerate(index_list) if str(i) in other_boxes}
+        confidences = confidences[index]
+        pages = pages[index] if pages is not None else None
+        if mask is not None:
+            mask, quads = mask[index], quads[index]
+        page_list = pages.tolist() if pages is not None else None
+        if header.get("page_info") is not None:
+            # Page ranges keep the provider's page text; content filters can only rebuild it from blocks
+            block_text = _block_text_by_page(texts, page_list) if query.filters_blocks else None
+            _slice_page_info(header, query, block_text)
+            if query.filters_blocks:
+                header["text_source"] = "blocks"
+        else:
+            header["raw_text"] = _selected_text(texts, page_list)
+            header["text_source"] = "blocks"
+        header["matched_blocks"] = len(texts)
+
+    if mode == "text":
+        return header
+
+    if mode == "lines":
+        header["lines"] = _lines(texts, _confidence_list(confidences), pages.tolist() if pages is not None else None)
+        return header
+
+    if mode == "boxes":
+        header.update(_box_columns(texts, confidences, pages, mask, quads, other_boxes))
+        return header
+
+    fields = set(query.fields) if query is not None and query.fields else set(BLOCK_FIELDS)
+    quad_lists = quads.tolist() if "box" in fields else None
+    confidence_list = _confidence_list(confidences) if "confidence" in fields else None
+    page_list = pages.tolist() if pages is not None and "page" in fields else None
+    details = []
+    for i, text in enumerate(texts):
+        detail = {}
+        if "text" in fields:
+            detail["text"] = text
+        if confidence_list is not None:
+            detail["confidence"] = confidence_list[i]
+        if quad_lists is not None:
+            if mask[i] == _QUAD_BOX:
+                detail["box"] = quad_lists[i]
+            elif mask[i] == _OTHER_BOX:
+                detail["box"] = other_boxes[str(i)]
+            else:
+                detail["box"] = None
+        if page_list is not None:
+            detail["page"] = page_list[i]
+        details.append(detail)
+    header["details"] = details
+    return header
+
+
+def _confidence_list(confidences: np.ndarray) -> List[float]:
+    """float32 confidences as Python floats without float32 noise (0.9, not 0.8999999761)"""
+    return np.round(confidences.astype(np.float64), 4).tolist()
+
+
+def _lines(texts: List[str], confidences: List[float], pages: Optional[List[int]]) -> List[Dict[str, Any]]:
+    if pages is None:
+        return [{"text": t, "confidence": c} for t, c in zip(texts, confidences)]
+    return [{"text": t, "confidence": c, "page": p} for t, c, p in zip(texts, confidences, pages)]
+
+
+def _box_columns(
+    texts: List[str],
+    confidences: np.ndarray,
+    pages: Optional[np.ndarray],
+    mask: np.ndarray,
+    quads: np.ndarray,
+    other_boxes: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Packed-binary form: texts plus base64 little-endian arrays"""
+    encode = lambda arr: base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode()
+    columns = {
+        "texts": texts,
+        "confidences": encode(confidences.astype("<f4")),
+        "boxes": encode(quads.astype("<i4")),
+        "box_mask": encode(mask.astype(np.uint8)),
+        "other_boxes": other_boxes,
+        "encoding": {
+            "confidences": "float32[n]",
+            "boxes": "int32[n][4][2]",
+            "box_mask": "uint8[n] (0 = no box, 1 = quad in boxes, 2 = see other_boxes)",
+            "pages": "int32[n]",
+            "byteorder": "little"
+        }
+    }
+    if pages is not None:
+        columns["pages"] = encode(pages.astype("<i4"))
+    return columns
+
+
+def shape_result(
+    result: Optional[Dict[str, Any]],
+    mode: str = "full",
+    query: Optional[ResultQuery] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Shape a full result dict for an output mode:
+      - text: everything but the blocks
+      - lines: blocks as text/confidence (and page) without boxes
+      - full: unchanged
+      - boxes: blocks as packed little-endian arrays (base64)
+    """
+    if result is not None and query is not None:
+        return unpack_result(pack_result(result), mode, query)
+    if result is None or mode == "full":
+        return result
+    details = result.get("details") or []
+    shaped = {k: v for k, v in result.items() if k != "details"}
+    if mode == "text":
+        return shaped
+
+    has_pages = any("page" in d for d in details)
+    texts = [d.get("text", "") for d in details]
+    confidences = [d.get("confidence", 0.0) for d in details]
+    pages = [d.get("page", 0) for d in details] if has_pages else None
+    if mode == "lines":
+        shaped["lines"] = _lines(texts, confidences, pages)
+        return shaped
+
+    # Round-trip through the packed form so both paths produce identical columns
+    packed = unpack_result(pack_result(result), "boxes")
+    shaped.update({k: v for k, v in packed.items() if k not in shaped})
+    return shaped
@@ -0,0 +1,99 @@
+"""
+PDF text-layer extraction - skips rasterisation and OCR for digital PDFs
+"""
+import logging
+from typing import Optional
+
+import pdfplumber
+
+from providers.base import OCRResult, OCRTextBlock
+
+logger = logging.getLogger(__name__)
+
+# Provider name reported for pages read from the PDF text layer
+TEXT_LAYER_PROVIDER = "pdf_text_layer"
+
+# Pages with fewer non-whitespace characters than this are treated as image-only
+MIN_TEXT_CHARS = 25
+
+# A page mostly covered by images needs this much text to skip OCR
+# (e.g. a scan with a small printed header still goes to OCR)
+DENSE_TEXT_CHARS = 200
+IMAGE_COVERAGE_LIMIT = 0.5
+
+# Undecodable glyphs ("(cid:123)") above this share of words mean the layer is unusable
+MAX_CID_RATIO = 0.1
+
+
+def open_pdf(pdf_path: str):
+    """Open a PDF for text-layer extraction (use as a context manager)"""
+    return pdfplumber.open(pdf_path)
+
+
+def _image_coverage(page) -> float:
+    """Fraction of the page area covered by embedded images"""
+    page_area = float(page.width * page.height) or 1.0
+    covered = 0.0
+    for img in page.images:
+        width = max(0.0, min(img["x1"], page.width) - max(img["x0"], 0))
+        height = max(0.0, min(img["bottom"], page.height) - max(img["top"], 0))
+        covered += width * height
+    return min(1.0, covered / page_area)
+
+
+def extract_text_layer(pdf, page_index: int, dpi: int = 200) -> Optional[OCRResult]:
+    """
+    Read a page's native text layer in OCRResult shape.
+
+    Word boxes are scaled from PDF points to pixels at `dpi`, so they line up
+    with boxes OCR would have produced from a page rendered at that DPI.
+
+    Args:
+        pdf: Open pdfplumber document (see open_pdf)
+        page_index: 0-based page number
+        dpi: Render DPI the boxes should correspond to
+
+    Returns:
+        OCRResult, or None if the page has no usable text and needs OCR
+    """
+    page = pdf.pages[page_index]
+    try:
+        text = page.extract_text() or ""
+        char_count = len("".join(text.split()))
+        if char_count < MIN_TEXT_CHARS:
+            return None
+        if char_count < DENSE_TEXT_CHARS and _image_coverage(page) >= IMAGE_COVERAGE_LIMIT:
+            return None
+
+        words = page.extract_words(use_text_flow=True)
+        if not words:
+            return None
+        cid_words = sum(1 for w in words if "(cid:" in w["text"])
+        if cid_words / len(words) > MAX_CID_RATIO:
+            return None
+
+        scale = dpi / 72.0
+        details = []
+        for w in words:
+            x0, x1 = round(w["x0"] * scale, 1), round(w["x1"] * scale, 1)
+            top, bottom = round(w["top"] * scale, 1), round(w["bottom"] * scale, 1)
+            details.append(OCRTextBlock(
+                text=w["text"],
+                confidence=1.0,
+                box=[[x0, top], [x1, top], [x1, bottom], [x0, bottom]]
+            ))
+
+        return OCRResult(
+            status="success",
+            raw_text=text,
+            details=details,
+            provider=TEXT_LAYER_PROVIDER
+        )
+    except Exception as e:
+        logger.warning(f"Text layer extraction failed on page {page_index + 1}: {e}")
+        return None
+    finally:
+        # Release pdfplumber's per-page object cache
+        close = getattr(page, "close", None) or getattr(page, "flush_cache", None)
+        if close:
+            close()